@@ -0,0 +1,108 @@
+"""
+FTP provider benchmark: connect-per-operation vs the pooled FTPStorageProvider
+
+Starts a throwaway pyftpdlib server on localhost and pushes a batch of small
+files through both implementations, reporting wall time, files/s and how many
+control connections were opened. The legacy path mirrors the old provider:
+new connection + login + blind MKD per file, run directly on the event loop.
+
+Usage (from backend/):
+    pip install pyftpdlib
+    python -m benchmarks.bench_ftp --files 200 --size-kb 256 --concurrency 8
+"""
+import os
+import sys
+import time
+import ftplib
+import logging
+import asyncio
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.storage_service import FTPStorageProvider  # noqa: E402
+
+USER, PASSWORD = "bench", "bench"
+
+
+def start_server(root: str):
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+    from pyftpdlib.log import config_logging
+
+    config_logging(level=logging.WARNING)
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(USER, PASSWORD, root, perm="elradfmw")
+    handler = type("BenchHandler", (FTPHandler,), {"authorizer": authorizer})
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    server.max_cons = 256
+    threading.Thread(target=server.serve_forever, kwargs={"handle_exit": False}, daemon=True).start()
+    return server, server.address[1]
+
+
+async def legacy_upload(port, file_path, destination):
+    with ftplib.FTP() as ftp:
+        ftp.connect("127.0.0.1", port)
+        ftp.login(USER, PASSWORD)
+        try:
+            ftp.mkd(os.path.dirname(f"/uploads/{destination}"))
+        except ftplib.error_perm:
+            pass
+        with open(file_path, 'rb') as f:
+            ftp.storbinary(f'STOR /uploads/{destination}', f)
+
+
+async def run_batch(upload, jobs, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(args):
+        async with slots:
+            await upload(*args)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(args) for args in jobs))
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--size-kb', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as tmp:
+        # The legacy path only issues a single MKD, so it needs the parent to exist
+        os.makedirs(os.path.join(root, "uploads", "2026"))
+        server, port = start_server(root)
+        source = os.path.join(tmp, "src.bin")
+        with open(source, 'wb') as f:
+            f.write(os.urandom(args.size_kb * 1024))
+        jobs = [(source, f"2026/{n % 20}/file_{n}.bin") for n in range(args.files)]
+
+        legacy = await run_batch(lambda src, dest: legacy_upload(port, src, dest), jobs, args.concurrency)
+
+        provider = FTPStorageProvider(host="127.0.0.1", user=USER, password=PASSWORD, path="/uploads",
+                                      port=port, pool_size=args.concurrency)
+
+        async def pooled_upload(src, dest):
+            ok, _, error = await provider.upload_file(src, dest)
+            assert ok, error
+
+        pooled = await run_batch(pooled_upload, jobs, args.concurrency)
+        stats = provider.pool.get_stats()
+        provider.close()
+        server.close_all()
+
+    print(f"{'impl':>8} {'seconds':>8} {'files/s':>8} {'connections':>12}")
+    print(f"{'legacy':>8} {legacy:>8.2f} {args.files / legacy:>8.1f} {args.files:>12}")
+    print(f"{'pooled':>8} {pooled:>8.2f} {args.files / pooled:>8.1f} {stats['created']:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+LocalStorageProvider benchmark: read-all/write-all vs rename/link/kernel copy
+
+Each mode runs in a fresh interpreter so peak RSS (ru_maxrss) reflects that
+mode alone. "legacy" is the old aiofiles read-everything-then-write path;
+"copy" forces a kernel-side copy (hard links off); "link" and "move" are the
+same-filesystem fast paths. Pass --dest-dir on another filesystem (e.g.
+/dev/shm) to measure the cross-device copy_file_range/sendfile path.
+
+Usage (from backend/):
+    python -m benchmarks.bench_local_storage --size-mb 100
+    python -m benchmarks.bench_local_storage --size-mb 100 --dest-dir /dev/shm/rt-bench
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = ["legacy", "copy", "link", "move"]
+
+
+async def legacy_upload(file_path, dest_path):
+    import aiofiles
+
+    async with aiofiles.open(file_path, 'rb') as src:
+        content = await src.read()
+    async with aiofiles.open(dest_path, 'wb') as dst:
+        await dst.write(content)
+
+
+async def run_child(mode, source, dest_dir):
+    from services.storage_service import LocalStorageProvider
+
+    provider = LocalStorageProvider(base_path=dest_dir, hardlinks=(mode == "link"))
+    started = time.perf_counter()
+    if mode == "legacy":
+        await legacy_upload(source, os.path.join(dest_dir, "out.bin"))
+    else:
+        ok, _, error = await provider.upload_file(source, "out.bin", move=(mode == "move"))
+        assert ok, error
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=100)
+    parser.add_argument('--dest-dir', default=None)
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'SOURCE', 'DEST_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run_child(*args.child))
+        return
+
+    backend_dir = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory() as tmp:
+        dest_dir = args.dest_dir or os.path.join(tmp, "store")
+        os.makedirs(dest_dir, exist_ok=True)
+        print(f"{'mode':>7} {'MB/s':>9} {'peak RSS MB':>12}")
+        for mode in MODES:
+            source = os.path.join(tmp, f"src_{mode}.bin")
+            with open(source, 'wb') as f:
+                for _ in range(args.size_mb):
+                    f.write(os.urandom(1024 * 1024))
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_local_storage", "--child", mode, source, dest_dir],
+                cwd=backend_dir, capture_output=True, text=True, check=True
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{mode:>7} {args.size_mb / result['seconds']:>9.0f} {result['max_rss_kb'] / 1024:>12.1f}")
+            for leftover in (source, os.path.join(dest_dir, "out.bin")):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+OCRService benchmark: blocking client call inside async def vs the executor path
+
+A stub ImageAnnotatorClient sleeps for --latency-ms per call (the Vision
+network round-trip) and returns a plate annotation. N plate detections are
+started at once; "legacy" calls client.text_detection directly in the
+coroutine as the service used to, "executor" is the current OCRService. A
+heartbeat task ticking every 10 ms records the worst event loop stall, i.e.
+how long every other request on the worker would have been frozen.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ocr_concurrency
+    python -m benchmarks.bench_ocr_concurrency --requests 32 --latency-ms 300 --concurrency 8
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from google.cloud import vision  # noqa: E402
+
+from services.ocr_service import OCRService  # noqa: E402
+
+
+class StubVisionClient:
+    """Synchronous like the real client; blocks the calling thread for `latency` seconds"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def text_detection(self, image, timeout=None, **kwargs):
+        time.sleep(min(self.latency, timeout) if timeout else self.latency)
+        return vision.AnnotateImageResponse(text_annotations=[
+            vision.EntityAnnotation(description="34 ABC 123"),
+            vision.EntityAnnotation(description="34"),
+        ])
+
+
+class LegacyOCRService(OCRService):
+    """The previous implementation: the RPC runs on the event loop thread"""
+
+    async def _text_detection(self, image):
+        return self.client.text_detection(image=image)
+
+
+async def heartbeat(stalls, interval=0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+async def measure(service, requests):
+    stalls = []
+    ticker = asyncio.create_task(heartbeat(stalls))
+    await asyncio.sleep(0.02)
+    started = time.perf_counter()
+    results = await asyncio.gather(*[service.detect_license_plate(b"frame-%d" % i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.02)  # let the heartbeat record a stall that ended with the batch
+    ticker.cancel()
+    assert all(r.get("plate") == "34ABC123" for r in results), results[:1]
+    return elapsed, max(stalls, default=0.0)
+
+
+async def measure_cancel(service):
+    """A caller that gives up (client disconnect, outer timeout) is released immediately"""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(service.detect_license_plate(b"abandoned"), timeout=0.05)
+    except asyncio.TimeoutError:
+        pass
+    return time.perf_counter() - started
+
+
+async def main_async(args):
+    latency = args.latency_ms / 1000
+    services = {
+        "legacy": LegacyOCRService(client=StubVisionClient(latency)),
+        "executor": OCRService(client=StubVisionClient(latency), max_concurrency=args.concurrency),
+    }
+    print(f"{args.requests} concurrent plate detections, {args.latency_ms} ms per Vision call")
+    print(f"{'mode':>9} {'wall s':>8} {'req/s':>8} {'max loop stall ms':>18} {'cancel after ms':>16}")
+    for name, service in services.items():
+        elapsed, stall = await measure(service, args.requests)
+        cancel = await measure_cancel(service)
+        print(f"{name:>9} {elapsed:>8.2f} {args.requests / elapsed:>8.1f} {stall * 1000:>18.0f} {cancel * 1000:>16.0f}")
+    print(f"executor stats: {services['executor'].get_stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=16)
+    parser.add_argument('--latency-ms', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
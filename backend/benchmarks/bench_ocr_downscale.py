@@ -0,0 +1,96 @@
+"""
+Plate OCR benchmark: full-size submission vs downscaled (prepare_image) submission
+
+Generates a phone-sized JPEG (4000x3000 noise, EXIF-rotated, close to
+MAX_PHOTO_SIZE) and sends it through VisionAPIRest to a local images:annotate
+stub. The stub reads the whole body and then waits len(body) / --uplink-mbps
+to stand in for the upload to Google, so end-to-end latency includes the
+client-side base64/JSON work, the (simulated) transfer and, for "downscaled",
+the decode/resize/re-encode step. The result cache is disabled.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ocr_downscale
+    python -m benchmarks.bench_ocr_downscale --uplink-mbps 10 --long-edge 1280 --runs 5
+"""
+import io
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import services.ocr_service as ocr_module  # noqa: E402
+from services.ocr_cache import OCRResultCache  # noqa: E402
+from services.http_client import http_client  # noqa: E402
+
+
+def make_photo(width=4000, height=3000, quality=95):
+    from PIL import Image
+
+    img = Image.effect_noise((width, height), 40).convert('RGB')
+    exif = Image.Exif()
+    exif[0x0112] = 6  # taken in portrait, stored rotated
+    out = io.BytesIO()
+    img.save(out, 'JPEG', quality=quality, exif=exif)
+    return out.getvalue()
+
+
+async def start_stub(uplink_mbps, received):
+    async def annotate(request):
+        body = await request.read()
+        received.append(len(body))
+        await asyncio.sleep(len(body) * 8 / (uplink_mbps * 1_000_000))
+        return web.json_response({"responses": [{"textAnnotations": [{"description": "34 ABC 123"}]}]})
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/v1/images:annotate', annotate)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def main_async(args):
+    photo = make_photo()
+    received = []
+    runner, port = await start_stub(args.uplink_mbps, received)
+    vision = ocr_module.VisionAPIRest(api_key="bench", base_url=f"http://127.0.0.1:{port}/v1/images:annotate")
+    vision.batcher.window = 0
+    modes = {
+        "full": vision.detect_license_plate,
+        "downscaled": ocr_module.CachedOCR(vision, OCRResultCache(ttl=0), args.long_edge).detect_license_plate,
+    }
+    print(f"photo {len(photo) / 1e6:.1f} MB, uplink {args.uplink_mbps} Mbit/s, long edge {args.long_edge}px")
+    print(f"{'mode':>11} {'payload MB':>11} {'median ms':>10} {'min ms':>8}")
+    try:
+        for name, detect in modes.items():
+            timings = []
+            for _ in range(args.runs):
+                received.clear()
+                started = time.perf_counter()
+                result = await detect(photo)
+                timings.append(time.perf_counter() - started)
+                assert result.get("plate") == "34ABC123", result
+            print(f"{name:>11} {received[-1] / 1e6:>11.2f} {statistics.median(timings) * 1000:>10.0f} "
+                  f"{min(timings) * 1000:>8.0f}")
+    finally:
+        await http_client.close()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uplink-mbps', type=float, default=20.0)
+    parser.add_argument('--long-edge', type=int, default=ocr_module.OCR_MAX_LONG_EDGE)
+    parser.add_argument('--runs', type=int, default=3)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+S3 provider benchmark: blocking single-stream transfers vs S3StorageProvider
+
+Uploads and downloads a generated file against any S3-compatible endpoint
+(MinIO, `moto_server`, AWS) and reports throughput plus the worst event-loop
+stall seen while the transfer runs. The legacy path calls boto3 directly on
+the loop with multipart disabled, as the provider used to.
+
+Usage (from backend/):
+    moto_server -p 5000 &
+    S3_ENDPOINT_URL=http://localhost:5000 AWS_ACCESS_KEY_ID=test AWS_SECRET_ACCESS_KEY=test \\
+        S3_BUCKET_NAME=rt-bench python -m benchmarks.bench_s3 --size-mb 64 256
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.storage_service import S3StorageProvider  # noqa: E402
+
+
+async def watch_loop(stop: asyncio.Event, interval: float = 0.01):
+    """Largest gap (ms) between ticks that should arrive every `interval` seconds"""
+    worst = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        worst = max(worst, (now - last - interval) * 1000)
+        last = now
+    return worst
+
+
+async def measure(coro_factory):
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    started = time.perf_counter()
+    await coro_factory()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, await watcher
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, nargs='+', default=[16, 64])
+    args = parser.parse_args()
+
+    from boto3.s3.transfer import TransferConfig
+
+    provider = S3StorageProvider()
+    if not provider.client:
+        sys.exit("Set AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, S3_BUCKET_NAME (and S3_ENDPOINT_URL)")
+    try:
+        provider.client.create_bucket(Bucket=provider.bucket)
+    except provider.client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    single_stream = TransferConfig(multipart_threshold=1 << 40, use_threads=False)
+
+    async def legacy_upload(path, key):
+        provider.client.upload_file(path, provider.bucket, key, Config=single_stream)
+
+    async def legacy_download(key, path):
+        provider.client.download_file(provider.bucket, key, path, Config=single_stream)
+
+    async def provider_upload(path, key):
+        ok, _, error = await provider.upload_file(path, key)
+        assert ok, error
+
+    async def provider_download(key, path):
+        ok, error = await provider.download_file(key, path)
+        assert ok, error
+
+    print(f"{'size MB':>7} {'op':>9} {'impl':>8} {'MB/s':>8} {'max stall ms':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.size_mb:
+            source = os.path.join(tmp, f"src_{size_mb}.bin")
+            with open(source, 'wb') as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(1024 * 1024))
+            target = os.path.join(tmp, f"dst_{size_mb}.bin")
+            key = f"bench/{size_mb}.bin"
+
+            for name, upload, download in (("legacy", legacy_upload, legacy_download),
+                                           ("provider", provider_upload, provider_download)):
+                for op, factory in (("upload", lambda: upload(source, key)),
+                                    ("download", lambda: download(key, target))):
+                    elapsed, stall = await measure(factory)
+                    print(f"{size_mb:>7} {op:>9} {name:>8} {size_mb / elapsed:>8.1f} {stall:>13.1f}")
+            await provider.delete_file(key)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
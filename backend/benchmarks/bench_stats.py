@@ -0,0 +1,124 @@
+"""
+/api/stats benchmark: sequential count_documents loop vs the current handler
+
+Seeds a throwaway database with records spread over a growing number of
+branches and measures the admin dashboard latency of both implementations
+(the current handler reads materialized counters, see counter_service.py).
+
+Usage (from backend/):
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_stats
+    MONGO_URL=... python -m benchmarks.bench_stats --branches 5 20 50 --records 10000 100000
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ['DB_NAME'] = os.environ.get('BENCH_DB_NAME', 'rt_bench_stats')
+
+import server  # noqa: E402
+from services.counter_service import record_counters  # noqa: E402
+
+RECORD_TYPES = ["standard", "roadassist", "damaged", "pdi"]
+STATUSES = ["active"] * 8 + ["pending_review", "deleted"]
+ADMIN = {"id": "bench-admin", "role": "admin"}
+
+
+async def legacy_stats(db, branches):
+    """The original implementation: ~5 + 2 * len(branches) sequential round-trips"""
+    total = await db.uploads.count_documents({"status": "active"})
+    by_type = {}
+    for record_type in RECORD_TYPES:
+        by_type[record_type] = await db.uploads.count_documents({"status": "active", "record_type": record_type})
+    recent = await db.uploads.find({"status": "active"}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
+    branch_stats = []
+    for code in branches:
+        branch_total = await db.uploads.count_documents({"status": "active", "branch_code": code})
+        branch_staff = await db.users.find({"role": "staff", "branch_code": code}, {"_id": 0, "password": 0}).to_list(20)
+        branch_stats.append({"code": code, "total_records": branch_total, "staff_count": len(branch_staff)})
+    return {"total": total, "by_type": by_type, "recent": recent, "branches": branch_stats}
+
+
+async def seed(db, branch_count, record_count):
+    await db.uploads.drop()
+    await db.users.drop()
+    await db.record_counters.drop()
+    codes = [str(i) for i in range(1, branch_count + 1)]
+    server.BRANCHES.clear()
+    server.BRANCHES.update({c: {"code": c, "name": f"Şube {c}", "city": "Bench"} for c in codes})
+
+    users = [{
+        "id": str(uuid.uuid4()), "username": f"staff_{c}_{i}", "full_name": f"Staff {c}-{i}",
+        "role": "staff", "branch_code": c, "is_online": False, "last_seen": None,
+        "created_at": "2026-01-01T00:00:00+00:00"
+    } for c in codes for i in range(4)]
+    await db.users.insert_many(users)
+
+    batch = []
+    for n in range(record_count):
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "record_type": random.choice(RECORD_TYPES),
+            "branch_code": random.choice(codes),
+            "status": random.choice(STATUSES),
+            "case_key": f"BENCH-{n}",
+            "files_json": [],
+            "user_id": "bench",
+            "created_at": f"2026-01-01T00:00:{n % 60:02d}.{n:06d}",
+            "updated_at": "2026-01-01T00:00:00"
+        })
+        if len(batch) == 5000:
+            await db.uploads.insert_many(batch)
+            batch = []
+    if batch:
+        await db.uploads.insert_many(batch)
+
+    await db.uploads.create_index("status")
+    await db.uploads.create_index("branch_code")
+    await db.uploads.create_index([("status", 1), ("created_at", -1), ("id", -1)])
+    await db.users.create_index("branch_code")
+    await record_counters.ensure_indexes(db)
+    await record_counters.reconcile(db)
+    return codes
+
+
+async def timed(coro_factory, repeat):
+    await coro_factory()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--branches', type=int, nargs='+', default=[5, 20, 50])
+    parser.add_argument('--records', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args()
+
+    db = server.db
+    print(f"{'branches':>8} {'records':>9} {'legacy ms':>10} {'current ms':>10} {'speedup':>8}")
+    try:
+        for record_count in args.records:
+            for branch_count in args.branches:
+                codes = await seed(db, branch_count, record_count)
+                legacy = await timed(lambda: legacy_stats(db, codes), args.repeat)
+                current = await timed(lambda: server.get_stats(current_user=ADMIN), args.repeat)
+                print(f"{branch_count:>8} {record_count:>9} {legacy:>10.1f} {current:>10.1f} {legacy / current:>7.1f}x")
+    finally:
+        await server.client.drop_database(os.environ['DB_NAME'])
+        server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
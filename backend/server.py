@@ -1,21 +1,40 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Query
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Query, Response
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, RedirectResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict, Any
 import uuid
+import json
+import base64
 from datetime import datetime, timezone
-import aiofiles
 import shutil
 from enum import Enum
-import bcrypt
 import jwt
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from services.user_cache import user_cache
+from services.presence_service import presence_tracker
+from services.password_service import password_hasher
+from services.search_service import record_search, SEARCH_FIELDS
+from services.counter_service import record_counters
+from services.upload_service import stream_upload_to_file, UploadTooLargeError
+from services.resumable_upload_service import resumable_uploads, ResumableUploadError
+from services.media_service import media_processor
+from services.storage_service import storage_manager
+from services.replication_service import storage_replicator
+from services.migration_service import storage_migrator, MigrationError
+from services.dedup_service import blob_store
+from services.phash_service import near_duplicates
+from services.ocr_cache import ocr_cache
+from services.http_client import http_client
+from pymongo import ReturnDocument
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -35,6 +54,15 @@ UPLOAD_DIR = ROOT_DIR / 'uploads'
 UPLOAD_DIR.mkdir(exist_ok=True)
 for subdir in ['standard', 'roadassist', 'damaged', 'pdi']:
     (UPLOAD_DIR / subdir).mkdir(exist_ok=True)
+# Resumable upload parts live on the same volume so the final move is a rename
+resumable_uploads.configure(UPLOAD_DIR / '.partial')
+# Thumbnails/previews are written next to the originals
+media_processor.configure(UPLOAD_DIR)
+# Uploads land here first and are replicated to the active remote provider in the background
+storage_manager.configure_local(str(UPLOAD_DIR))
+storage_replicator.configure(UPLOAD_DIR)
+# Identical uploads share one blob (per-record files are hard links into .blobs)
+blob_store.configure(UPLOAD_DIR)
 
 # File size limits (bytes)
 MAX_PHOTO_SIZE = 10 * 1024 * 1024  # 10MB
@@ -46,6 +74,12 @@ ALLOWED_PHOTO_EXT = {'.jpg', '.jpeg', '.png', '.webp'}
 ALLOWED_VIDEO_EXT = {'.mp4', '.mov', '.avi', '.webm'}
 ALLOWED_PDF_EXT = {'.pdf'}
 
+# Internal search index fields are never returned to clients
+RECORD_PROJECTION = {"_id": 0, "search_grams": 0, "search_text": 0}
+
+# Allowed sort fields for GET /api/records (each has a compound index, see startup)
+RECORD_SORT_FIELDS = ["created_at", "work_order", "plate"]
+
 # Şube tanımlamaları
 BRANCHES = {
     "1": {"code": "1", "name": "Bursa", "city": "Bursa"},
@@ -65,6 +99,21 @@ JOB_TITLES = {
 app = FastAPI(title="Renault Trucks Garanti Kayıt Sistemi")
 api_router = APIRouter(prefix="/api")
 
+# Fire-and-forget work (backfills, remote deletes). The event loop only keeps weak
+# references to tasks, so they are held here until done; failures are logged.
+background_tasks: set = set()
+
+def run_in_background(coro, name: str) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+def _background_task_done(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed", exc_info=task.exception())
+
 # Enums
 class RecordType(str, Enum):
     STANDARD = "standard"
@@ -143,7 +192,14 @@ class FileItem(BaseModel):
     media_type: str
     path: str
     size: int
+    sha256: Optional[str] = None
     thumb: Optional[str] = None
+    variants: Optional[Dict[str, str]] = None  # Arka planda üretilir (thumb_small, thumb, preview)
+    storage: Optional[Dict[str, Any]] = None  # Dosyanın tutulduğu sağlayıcı (provider, key, url, local)
+    blob: Optional[str] = None  # Paylaşılan içerik (SHA-256), aynı dosya tekrar yüklenirse diskte tek kopya
+    blob_copy: bool = False  # Sabit bağlantı kurulamadı, dosya blob'un ayrı bir kopyası
+    phash: Optional[str] = None  # Fotoğraf benzerlik özeti (dHash), arka planda hesaplanır
+    near_duplicate_of: Optional[str] = None  # Aynı kayıttaki çok benzer ilk fotoğrafın id'si
     uploaded_at: str
 
 class RecordCreate(BaseModel):
@@ -243,12 +299,12 @@ class SettingsResponse(BaseModel):
     onedrive_client_id: Optional[str] = None
     language: str = "tr"
 
-# Auth helpers
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+# Auth helpers (bcrypt runs on a worker pool, see services/password_service.py)
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
 def create_token(user_id: str, username: str, role: str, branch_code: str = None) -> str:
     payload = {
@@ -265,14 +321,14 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail="Kimlik doğrulama gerekli")
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
+        user = user_cache.get(payload['user_id'])
         if not user:
-            raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
-        # Update last seen
-        await db.users.update_one(
-            {"id": user['id']},
-            {"$set": {"last_seen": datetime.now(timezone.utc).isoformat(), "is_online": True}}
-        )
+            user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0, "password": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
+            user_cache.set(user['id'], user)
+        # Update last seen (buffered, flushed to db.users in batches)
+        presence_tracker.heartbeat(user['id'])
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token süresi dolmuş")
@@ -318,6 +374,67 @@ def generate_filename(record_type: str, identifier: str, seq: int, ext: str) ->
     date_str = now.strftime('%Y%m%d_%H%M')
     return f"{now.year}-{record_type}-{identifier}-{date_str}-{seq:03d}{ext}"
 
+# Keyset pagination cursor: opaque base64 of [sort value, record id]
+def encode_cursor(sort_value: Any, record_id: str) -> str:
+    raw = json.dumps([sort_value, record_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, record_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(record_id, str) or not isinstance(sort_value, (str, type(None))):
+            raise ValueError
+        return sort_value, record_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+
+def build_cursor_filter(sort_field: str, sort_direction: int, sort_value: Any, record_id: str) -> dict:
+    """
+    (sort_field, id) çiftine göre cursor'dan sonraki kayıtlar.
+    MongoDB null değerleri en küçük kabul eder: artan sıralamada başta, azalan sıralamada sonda.
+    """
+    op = "$gt" if sort_direction == 1 else "$lt"
+    if sort_value is None:
+        conditions = [{sort_field: None, "id": {op: record_id}}]
+        if sort_direction == 1:
+            conditions.append({sort_field: {"$ne": None}})
+    else:
+        conditions = [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "id": {op: record_id}}
+        ]
+        if sort_direction == -1:
+            conditions.append({sort_field: None})
+    return {"$or": conditions}
+
+# Upload size limits per media type
+MAX_MEDIA_SIZE = {
+    "photo": MAX_PHOTO_SIZE,
+    "video": MAX_VIDEO_SIZE,
+    "pdf": MAX_PDF_SIZE
+}
+
+def validate_media_type(media_type: str, ext: str) -> int:
+    """Medya tipi ve uzantıyı doğrula, izin verilen maksimum boyutu döndür"""
+    if media_type == "photo":
+        if ext not in ALLOWED_PHOTO_EXT:
+            raise HTTPException(status_code=400, detail=f"Geçersiz fotoğraf formatı. İzin verilen: {ALLOWED_PHOTO_EXT}")
+    elif media_type == "video":
+        if ext not in ALLOWED_VIDEO_EXT:
+            raise HTTPException(status_code=400, detail=f"Geçersiz video formatı. İzin verilen: {ALLOWED_VIDEO_EXT}")
+    elif media_type == "pdf":
+        if ext not in ALLOWED_PDF_EXT:
+            raise HTTPException(status_code=400, detail="Geçersiz PDF formatı")
+    else:
+        raise HTTPException(status_code=400, detail="Geçersiz medya tipi")
+    return MAX_MEDIA_SIZE[media_type]
+
+def media_too_large_message(media_type: str) -> str:
+    max_mb = MAX_MEDIA_SIZE[media_type] // (1024*1024)
+    label = {"photo": "Fotoğraf", "video": "Video", "pdf": "PDF"}[media_type]
+    return f"{label} çok büyük. Maksimum: {max_mb}MB"
+
 # Branches endpoint
 @api_router.get("/branches")
 async def get_branches():
@@ -348,7 +465,7 @@ async def register(user: UserCreate, current_user: dict = Depends(get_current_us
     user_doc = {
         "id": str(uuid.uuid4()),
         "username": user.username,
-        "password": hash_password(user.password),
+        "password": await hash_password(user.password),
         "full_name": user.full_name,
         "role": user.role,
         "branch_code": user.branch_code,
@@ -369,14 +486,19 @@ async def register(user: UserCreate, current_user: dict = Depends(get_current_us
 @api_router.post("/auth/login")
 async def login(user: UserLogin):
     db_user = await db.users.find_one({"username": user.username})
-    if not db_user or not verify_password(user.password, db_user['password']):
+    if not db_user or not await verify_password(user.password, db_user['password']):
         raise HTTPException(status_code=401, detail="Geçersiz kullanıcı adı veya şifre")
     
+    # BCRYPT_ROUNDS değiştiyse şifreyi yeni maliyetle yeniden hashle
+    if password_hasher.needs_rehash(db_user['password']):
+        await db.users.update_one(
+            {"id": db_user['id']},
+            {"$set": {"password": await hash_password(user.password)}}
+        )
+        password_hasher.rehashed += 1
+    
     # Update online status
-    await db.users.update_one(
-        {"id": db_user['id']},
-        {"$set": {"is_online": True, "last_seen": datetime.now(timezone.utc).isoformat()}}
-    )
+    presence_tracker.heartbeat(db_user['id'])
     
     token = create_token(db_user['id'], db_user['username'], db_user['role'], db_user.get('branch_code'))
     return {
@@ -401,11 +523,13 @@ async def logout(current_user: dict = Depends(get_current_user)):
         {"id": current_user['id']},
         {"$set": {"is_online": False, "last_seen": datetime.now(timezone.utc).isoformat()}}
     )
+    presence_tracker.mark_offline(current_user['id'])
+    user_cache.invalidate(current_user['id'])
     return {"success": True}
 
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_me(current_user: dict = Depends(get_current_user)):
-    return UserResponse(**current_user)
+    return UserResponse(**presence_tracker.apply(current_user))
 
 @api_router.put("/auth/profile", response_model=UserResponse)
 async def update_profile(update: UserUpdate, current_user: dict = Depends(get_current_user)):
@@ -420,9 +544,10 @@ async def update_profile(update: UserUpdate, current_user: dict = Depends(get_cu
         {"id": current_user['id']},
         {"$set": update_data}
     )
+    user_cache.invalidate(current_user['id'])
     
     updated_user = await db.users.find_one({"id": current_user['id']}, {"_id": 0, "password": 0})
-    return UserResponse(**updated_user)
+    return UserResponse(**presence_tracker.apply(updated_user))
 
 # Staff Management (Admin only)
 @api_router.get("/staff", response_model=List[UserResponse])
@@ -443,7 +568,7 @@ async def get_staff(
         query["branch_code"] = branch_code
     
     staff = await db.users.find(query, {"_id": 0, "password": 0}).to_list(100)
-    return [UserResponse(**s) for s in staff]
+    return [UserResponse(**presence_tracker.apply(s)) for s in staff]
 
 @api_router.get("/staff/{user_id}", response_model=UserResponse)
 async def get_staff_member(user_id: str, current_user: dict = Depends(get_current_user)):
@@ -453,7 +578,7 @@ async def get_staff_member(user_id: str, current_user: dict = Depends(get_curren
     staff = await db.users.find_one({"id": user_id, "role": "staff"}, {"_id": 0, "password": 0})
     if not staff:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
-    return UserResponse(**staff)
+    return UserResponse(**presence_tracker.apply(staff))
 
 @api_router.put("/staff/{user_id}", response_model=UserResponse)
 async def update_staff(user_id: str, update: UserUpdate, current_user: dict = Depends(get_current_user)):
@@ -474,9 +599,10 @@ async def update_staff(user_id: str, update: UserUpdate, current_user: dict = De
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+    user_cache.invalidate(user_id)
     
     updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
-    return UserResponse(**updated_user)
+    return UserResponse(**presence_tracker.apply(updated_user))
 
 @api_router.delete("/staff/{user_id}")
 async def delete_staff(user_id: str, current_user: dict = Depends(get_current_user)):
@@ -486,6 +612,7 @@ async def delete_staff(user_id: str, current_user: dict = Depends(get_current_us
     result = await db.users.delete_one({"id": user_id, "role": "staff"})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+    user_cache.invalidate(user_id)
     return {"success": True}
 
 # Record Routes
@@ -560,8 +687,10 @@ async def create_record(record: RecordCreate, current_user: dict = Depends(get_c
         "updated_at": now,
         "status": initial_status
     }
+    record_doc.update(record_search.build_fields(record_doc))
     await db.uploads.insert_one(record_doc)
     del record_doc['_id']
+    await record_counters.record_created(db, record_doc)
     
     # Stajyer kayıt oluşturduğunda danışmanlara bildirim gönder
     if current_user.get('role') == 'apprentice':
@@ -589,6 +718,7 @@ async def create_record(record: RecordCreate, current_user: dict = Depends(get_c
 
 @api_router.get("/records", response_model=List[RecordResponse])
 async def get_records(
+    response: Response,
     record_type: Optional[str] = None,
     branch_code: Optional[str] = None,
     search: Optional[str] = None,
@@ -597,8 +727,14 @@ async def get_records(
     sort_order: str = "desc",
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    Sayfalama iki şekilde yapılabilir:
+    - page/limit (klasik, derin sayfalarda yavaşlar)
+    - cursor: bir önceki yanıtın X-Next-Cursor başlığındaki değer (keyset pagination)
+    """
     query = {"status": {"$in": ["active", "approved"]}}
     
     # Staff ve Apprentice kullanıcılar sadece kendi şubelerinin kayıtlarını görebilir
@@ -617,21 +753,26 @@ async def get_records(
         query["created_at"] = {"$gte": start_date, "$lte": end_date}
     
     if search:
-        query["$or"] = [
-            {"plate": {"$regex": search, "$options": "i"}},
-            {"work_order": {"$regex": search, "$options": "i"}},
-            {"vin": {"$regex": search, "$options": "i"}},
-            {"vin_last5": {"$regex": search, "$options": "i"}},
-            {"reference_no": {"$regex": search, "$options": "i"}},
-            {"case_key": {"$regex": search, "$options": "i"}}
-        ]
+        # n-gram index üzerinden arama (services/search_service.py)
+        query.update(record_search.build_query(search))
     
     # Sıralama - varsayılan olarak tarihe göre (yeni önce)
     sort_direction = -1 if sort_order == "desc" else 1
-    sort_field = sort_by if sort_by in ["created_at", "work_order", "plate"] else "created_at"
+    sort_field = sort_by if sort_by in RECORD_SORT_FIELDS else "created_at"
+    sort_spec = [(sort_field, sort_direction), ("id", sort_direction)]
+    
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        cursor_filter = build_cursor_filter(sort_field, sort_direction, sort_value, last_id)
+        query = {"$and": [query, cursor_filter]}
+        records = await db.uploads.find(query, RECORD_PROJECTION).sort(sort_spec).limit(limit).to_list(limit)
+    else:
+        skip = (page - 1) * limit
+        records = await db.uploads.find(query, RECORD_PROJECTION).sort(sort_spec).skip(skip).limit(limit).to_list(limit)
     
-    skip = (page - 1) * limit
-    records = await db.uploads.find(query, {"_id": 0}).sort(sort_field, sort_direction).skip(skip).limit(limit).to_list(limit)
+    if limit > 0 and len(records) == limit:
+        last = records[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.get(sort_field), last['id'])
     return [RecordResponse(**r) for r in records]
 
 # IMPORTANT: This route MUST be defined before /records/{record_id} to avoid route collision
@@ -649,7 +790,7 @@ async def get_pending_records(
     if current_user.get('role') == 'staff':
         query["branch_code"] = current_user.get('branch_code')
     
-    records = await db.uploads.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    records = await db.uploads.find(query, RECORD_PROJECTION).sort("created_at", -1).to_list(100)
     return records
 
 @api_router.get("/records/{record_id}", response_model=RecordResponse)
@@ -660,11 +801,24 @@ async def get_record(record_id: str, current_user: dict = Depends(get_current_us
     if current_user.get('role') == 'staff':
         query["branch_code"] = current_user.get('branch_code')
     
-    record = await db.uploads.find_one(query, {"_id": 0})
+    record = await db.uploads.find_one(query, RECORD_PROJECTION)
     if not record:
         raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
     return RecordResponse(**record)
 
+@api_router.get("/records/{record_id}/near-duplicates")
+async def get_near_duplicates(record_id: str, current_user: dict = Depends(get_current_user)):
+    """Groups of near-identical photos in the record and similar photos in other records of the plate"""
+    query = {"id": record_id}
+    
+    if current_user.get('role') == 'staff':
+        query["branch_code"] = current_user.get('branch_code')
+    
+    record = await db.uploads.find_one(query, {"_id": 0, "id": 1, "plate": 1, "files_json": 1})
+    if not record:
+        raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
+    return await near_duplicates.find(db, record)
+
 @api_router.put("/records/{record_id}", response_model=RecordResponse)
 async def update_record(record_id: str, update: RecordUpdate, current_user: dict = Depends(get_current_user)):
     query = {"id": record_id}
@@ -680,7 +834,9 @@ async def update_record(record_id: str, update: RecordUpdate, current_user: dict
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
     
-    record = await db.uploads.find_one({"id": record_id}, {"_id": 0})
+    record = await db.uploads.find_one({"id": record_id}, RECORD_PROJECTION)
+    if any(field in update_data for field in SEARCH_FIELDS):
+        await db.uploads.update_one({"id": record_id}, {"$set": record_search.build_fields(record)})
     return RecordResponse(**record)
 
 @api_router.put("/records/{record_id}/note")
@@ -705,12 +861,15 @@ async def delete_record(record_id: str, current_user: dict = Depends(get_current
     if current_user.get('role') == 'staff':
         query["branch_code"] = current_user.get('branch_code')
     
-    result = await db.uploads.update_one(
+    previous = await db.uploads.find_one_and_update(
         query,
-        {"$set": {"status": "deleted", "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"status": "deleted", "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "branch_code": 1, "record_type": 1, "status": 1, "created_at": 1},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.modified_count == 0:
+    if not previous:
         raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
+    await record_counters.status_changed(db, previous, previous.get('status'), "deleted")
     return {"success": True}
 
 # File Upload Routes
@@ -733,62 +892,166 @@ async def upload_file(
     # Get file extension
     ext = Path(file.filename).suffix.lower()
     
-    # Validate file type and size
-    content = await file.read()
-    file_size = len(content)
-    
-    if media_type == "photo":
-        if ext not in ALLOWED_PHOTO_EXT:
-            raise HTTPException(status_code=400, detail=f"Geçersiz fotoğraf formatı. İzin verilen: {ALLOWED_PHOTO_EXT}")
-        if file_size > MAX_PHOTO_SIZE:
-            raise HTTPException(status_code=400, detail=f"Fotoğraf çok büyük. Maksimum: {MAX_PHOTO_SIZE // (1024*1024)}MB")
-    elif media_type == "video":
-        if ext not in ALLOWED_VIDEO_EXT:
-            raise HTTPException(status_code=400, detail=f"Geçersiz video formatı. İzin verilen: {ALLOWED_VIDEO_EXT}")
-        if file_size > MAX_VIDEO_SIZE:
-            raise HTTPException(status_code=400, detail=f"Video çok büyük. Maksimum: {MAX_VIDEO_SIZE // (1024*1024)}MB")
-    elif media_type == "pdf":
-        if ext not in ALLOWED_PDF_EXT:
-            raise HTTPException(status_code=400, detail="Geçersiz PDF formatı")
-        if file_size > MAX_PDF_SIZE:
-            raise HTTPException(status_code=400, detail=f"PDF çok büyük. Maksimum: {MAX_PDF_SIZE // (1024*1024)}MB")
-    else:
-        raise HTTPException(status_code=400, detail="Geçersiz medya tipi")
+    # Validate file type (size is enforced while streaming to disk)
+    max_size = validate_media_type(media_type, ext)
     
     # Generate filename
     record_type = record['record_type']
-    identifier = record.get('work_order') or record.get('plate') or record.get('vin') or record.get('reference_no') or 'unknown'
-    files_count = len(record.get('files_json', []))
-    new_filename = generate_filename(record_type, identifier, files_count + 1, ext)
+    new_filename = generate_record_filename(record, ext)
     
-    # Save file
+    # Save file (chunked, bounded memory per upload)
     file_path = UPLOAD_DIR / record_type / new_filename
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
+    try:
+        file_size, checksum = await stream_upload_to_file(file, file_path, max_size)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=400, detail=media_too_large_message(media_type))
     
-    # Create file record
+    file_item = await add_file_to_record(record, new_filename, file.filename, media_type, file_size, checksum)
+    return {"success": True, "file": file_item}
+
+def generate_record_filename(record: dict, ext: str) -> str:
+    identifier = record.get('work_order') or record.get('plate') or record.get('vin') or record.get('reference_no') or 'unknown'
+    files_count = len(record.get('files_json', []))
+    return generate_filename(record['record_type'], identifier, files_count + 1, ext)
+
+async def add_file_to_record(record: dict, filename: str, original_name: str, media_type: str,
+                             size: int, checksum: str) -> dict:
+    """Diske yazılmış dosyayı kaydın files_json listesine ekle"""
+    record_type = record['record_type']
+    linked = await blob_store.ingest(db, UPLOAD_DIR / record_type / filename, checksum, size)
     file_item = {
         "id": str(uuid.uuid4()),
-        "filename": new_filename,
-        "original_name": file.filename,
+        "filename": filename,
+        "original_name": original_name,
         "media_type": media_type,
-        "path": f"/uploads/{record_type}/{new_filename}",
-        "size": file_size,
+        "path": f"/uploads/{record_type}/{filename}",
+        "size": size,
+        "sha256": checksum,
+        "blob": checksum,
+        "blob_copy": not linked,
         "thumb": None,
+        "storage": {"provider": "local", "key": f"{record_type}/{filename}", "local": True},
         "uploaded_at": datetime.now(timezone.utc).isoformat()
     }
     
     # Update record
     await db.uploads.update_one(
-        {"id": record_id},
+        {"id": record['id']},
         {
             "$push": {"files_json": file_item},
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
         }
     )
+    # Küçük resim / önizleme üretimi ve uzak depolamaya kopyalama arka planda
+    await media_processor.enqueue(db, record['id'], file_item)
+    await storage_replicator.enqueue(db, record['id'], file_item)
+    return file_item
+
+# Resumable (chunked) uploads for large videos over weak mobile links
+def resumable_error(e: ResumableUploadError) -> HTTPException:
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+@api_router.post("/records/{record_id}/uploads")
+async def init_resumable_upload(
+    record_id: str,
+    filename: str = Form(...),
+    media_type: str = Form(...),
+    total_size: int = Form(...),
+    sha256: Optional[str] = Form(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Parçalı yükleme oturumu başlat"""
+    query = {"id": record_id}
+    
+    if current_user.get('role') == 'staff':
+        query["branch_code"] = current_user.get('branch_code')
     
+    record = await db.uploads.find_one(query, {"_id": 0, "id": 1})
+    if not record:
+        raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
+    
+    max_size = validate_media_type(media_type, Path(filename).suffix.lower())
+    if total_size <= 0:
+        raise HTTPException(status_code=400, detail="Geçersiz dosya boyutu")
+    if total_size > max_size:
+        raise HTTPException(status_code=400, detail=media_too_large_message(media_type))
+    
+    session = await resumable_uploads.create(
+        db, record_id, current_user['id'], filename, media_type, total_size, sha256
+    )
+    return {
+        "upload_id": session['id'],
+        "offset": session['offset'],
+        "total_size": session['total_size'],
+        "chunk_size": resumable_uploads.chunk_size,
+        "expires_at": session['expires_at'].isoformat()
+    }
+
+@api_router.get("/uploads/{upload_id}")
+async def get_resumable_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Yükleme durumunu getir (bağlantı koptuktan sonra kaldığı yerden devam için)"""
+    try:
+        session = await resumable_uploads.get(db, upload_id, current_user['id'])
+    except ResumableUploadError as e:
+        raise resumable_error(e)
+    return {
+        "upload_id": session['id'],
+        "record_id": session['record_id'],
+        "offset": session['offset'],
+        "total_size": session['total_size'],
+        "chunk_size": resumable_uploads.chunk_size
+    }
+
+@api_router.put("/uploads/{upload_id}/chunk")
+async def append_resumable_chunk(
+    upload_id: str,
+    offset: int = Form(...),
+    checksum: Optional[str] = Form(None),
+    chunk: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Belirtilen offset'e bir parça ekle (checksum: parçanın SHA-256 değeri)"""
+    try:
+        session = await resumable_uploads.append_chunk(db, upload_id, current_user['id'], offset, chunk, checksum)
+    except ResumableUploadError as e:
+        raise resumable_error(e)
+    return {"upload_id": upload_id, "offset": session['offset'], "total_size": session['total_size']}
+
+@api_router.post("/uploads/{upload_id}/complete")
+async def complete_resumable_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Tüm parçalar alındıktan sonra dosyayı kayda ekle"""
+    try:
+        session = await resumable_uploads.get(db, upload_id, current_user['id'])
+    except ResumableUploadError as e:
+        raise resumable_error(e)
+    
+    record = await db.uploads.find_one({"id": session['record_id']}, RECORD_PROJECTION)
+    if not record:
+        raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
+    
+    new_filename = generate_record_filename(record, Path(session['filename']).suffix.lower())
+    try:
+        session, checksum = await resumable_uploads.complete(
+            db, upload_id, current_user['id'], UPLOAD_DIR / record['record_type'] / new_filename
+        )
+    except ResumableUploadError as e:
+        raise resumable_error(e)
+    
+    file_item = await add_file_to_record(
+        record, new_filename, session['filename'], session['media_type'], session['total_size'], checksum
+    )
     return {"success": True, "file": file_item}
 
+@api_router.delete("/uploads/{upload_id}")
+async def abort_resumable_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Yükleme oturumunu iptal et"""
+    try:
+        await resumable_uploads.abort(db, upload_id, current_user['id'])
+    except ResumableUploadError as e:
+        raise resumable_error(e)
+    return {"success": True}
+
 @api_router.delete("/records/{record_id}/files/{file_id}")
 async def delete_file(record_id: str, file_id: str, current_user: dict = Depends(get_current_user)):
     query = {"id": record_id}
@@ -813,6 +1076,12 @@ async def delete_file(record_id: str, file_id: str, current_user: dict = Depends
     file_path = ROOT_DIR / file_to_delete['path'].lstrip('/')
     if file_path.exists():
         file_path.unlink()
+    # Shared content is only removed with its last reference
+    if file_to_delete.get('blob'):
+        await blob_store.release(db, file_to_delete['blob'], file_to_delete.get('blob_copy', False))
+    media_processor.remove_variants(file_to_delete)
+    # Remote copy is removed in the background
+    run_in_background(storage_replicator.forget(db, record_id, file_to_delete), "storage_replicator.forget")
     
     # Update record
     await db.uploads.update_one(
@@ -822,6 +1091,8 @@ async def delete_file(record_id: str, file_id: str, current_user: dict = Depends
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
         }
     )
+    if file_to_delete.get('phash'):
+        await near_duplicates.remove(db, record_id, file_id)
     
     return {"success": True}
 
@@ -872,48 +1143,59 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
     if current_user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail="Yetkiniz yok")
     
-    total = await db.uploads.count_documents({"status": "active"})
-    standard = await db.uploads.count_documents({"status": "active", "record_type": "standard"})
-    roadassist = await db.uploads.count_documents({"status": "active", "record_type": "roadassist"})
-    damaged = await db.uploads.count_documents({"status": "active", "record_type": "damaged"})
-    pdi = await db.uploads.count_documents({"status": "active", "record_type": "pdi"})
+    # Tür ve şube sayıları sayaç koleksiyonundan; son kayıtlar ve personel paralel sorgulanır
+    staff_pipeline = [
+        {"$match": {"role": "staff", "branch_code": {"$in": list(BRANCHES.keys())}}},
+        {"$project": {"_id": 0, "password": 0}},
+        {"$group": {"_id": "$branch_code", "staff": {"$push": "$$ROOT"}}}
+    ]
+    counts, recent, staff_groups = await asyncio.gather(
+        record_counters.get_counts(db, ["active"]),
+        db.uploads.find({"status": "active"}, RECORD_PROJECTION).sort("created_at", -1).limit(5).to_list(5),
+        db.users.aggregate(staff_pipeline).to_list(None)
+    )
     
-    # Recent records
-    recent = await db.uploads.find({"status": "active"}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
+    type_counts = counts['by_type']
+    branch_counts = counts['by_branch']
+    staff_by_branch = {group['_id']: group['staff'] for group in staff_groups}
     
     # Branch stats
     branch_stats = []
     for code, branch in BRANCHES.items():
-        branch_total = await db.uploads.count_documents({"status": "active", "branch_code": code})
-        branch_staff = await db.users.find(
-            {"role": "staff", "branch_code": code}, 
-            {"_id": 0, "password": 0}
-        ).to_list(20)
-        
-        online_count = sum(1 for s in branch_staff if s.get('is_online'))
+        branch_staff = [presence_tracker.apply(s) for s in staff_by_branch.get(code, [])[:20]]
+        online_count = sum(1 for s in branch_staff if s['is_online'])
         
         branch_stats.append({
             "code": code,
             "name": branch["name"],
             "city": branch["city"],
-            "total_records": branch_total,
+            "total_records": branch_counts.get(code, 0),
             "staff": branch_staff,
             "staff_count": len(branch_staff),
             "online_count": online_count
         })
     
     return {
-        "total": total,
+        "total": sum(type_counts.values()),
         "by_type": {
-            "standard": standard,
-            "roadassist": roadassist,
-            "damaged": damaged,
-            "pdi": pdi
+            "standard": type_counts.get("standard", 0),
+            "roadassist": type_counts.get("roadassist", 0),
+            "damaged": type_counts.get("damaged", 0),
+            "pdi": type_counts.get("pdi", 0)
         },
         "recent": recent,
         "branches": branch_stats
     }
 
+@api_router.post("/stats/reconcile")
+async def reconcile_stats(current_user: dict = Depends(get_current_user)):
+    """Kayıt sayaçlarını uploads koleksiyonundan yeniden oluştur"""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+    
+    counters = await record_counters.reconcile(db)
+    return {"success": True, "counters": counters}
+
 # Staff dashboard (for staff users)
 @api_router.get("/my-stats")
 async def get_my_stats(current_user: dict = Depends(get_current_user)):
@@ -923,32 +1205,26 @@ async def get_my_stats(current_user: dict = Depends(get_current_user)):
     if branch_code:
         query["branch_code"] = branch_code
     
-    total = await db.uploads.count_documents(query)
-    
-    type_query = {**query}
-    standard = await db.uploads.count_documents({**type_query, "record_type": "standard"})
-    roadassist = await db.uploads.count_documents({**type_query, "record_type": "roadassist"})
-    damaged = await db.uploads.count_documents({**type_query, "record_type": "damaged"})
-    pdi = await db.uploads.count_documents({**type_query, "record_type": "pdi"})
+    # Sayılar sayaç koleksiyonundan, son kayıtlar bu şube için
+    counts, pending, recent = await asyncio.gather(
+        record_counters.get_counts(db, ["active", "approved"], branch_code),
+        record_counters.get_counts(db, ["pending_review"], branch_code),
+        db.uploads.find(query, RECORD_PROJECTION).sort("created_at", -1).limit(10).to_list(10)
+    )
+    type_counts = counts['by_type']
     
     # Pending review count for staff
     pending_count = 0
     if current_user.get('role') == 'staff' and branch_code:
-        pending_count = await db.uploads.count_documents({
-            "branch_code": branch_code,
-            "status": "pending_review"
-        })
-    
-    # Recent records for this branch
-    recent = await db.uploads.find(query, {"_id": 0}).sort("created_at", -1).limit(10).to_list(10)
+        pending_count = sum(pending['by_status'].values())
     
     return {
-        "total": total,
+        "total": sum(type_counts.values()),
         "by_type": {
-            "standard": standard,
-            "roadassist": roadassist,
-            "damaged": damaged,
-            "pdi": pdi
+            "standard": type_counts.get("standard", 0),
+            "roadassist": type_counts.get("roadassist", 0),
+            "damaged": type_counts.get("damaged", 0),
+            "pdi": type_counts.get("pdi", 0)
         },
         "pending_count": pending_count,
         "recent": recent,
@@ -985,7 +1261,7 @@ async def create_notification(
         raise HTTPException(status_code=403, detail="Yetkiniz yok")
     
     # Kayıt var mı kontrol et
-    record = await db.uploads.find_one({"id": notification.record_id}, {"_id": 0})
+    record = await db.uploads.find_one({"id": notification.record_id}, RECORD_PROJECTION)
     if not record:
         raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
     
@@ -1043,15 +1319,18 @@ async def approve_record(record_id: str, current_user: dict = Depends(get_curren
     if current_user.get('role') == 'staff':
         query["branch_code"] = current_user.get('branch_code')
     
-    record = await db.uploads.find_one(query, {"_id": 0})
+    record = await db.uploads.find_one(query, RECORD_PROJECTION)
     if not record:
         raise HTTPException(status_code=404, detail="Kayıt bulunamadı veya zaten onaylanmış")
     
     now = datetime.now(timezone.utc).isoformat()
-    await db.uploads.update_one(
-        {"id": record_id},
+    result = await db.uploads.update_one(
+        {"id": record_id, "status": "pending_review"},
         {"$set": {"status": "approved", "approved_by": current_user['id'], "approved_at": now, "updated_at": now}}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=404, detail="Kayıt bulunamadı veya zaten onaylanmış")
+    await record_counters.status_changed(db, record, "pending_review", "approved")
     
     # Stajyere bildirim gönder
     if record.get('user_id'):
@@ -1085,15 +1364,18 @@ async def reject_record(
     if current_user.get('role') == 'staff':
         query["branch_code"] = current_user.get('branch_code')
     
-    record = await db.uploads.find_one(query, {"_id": 0})
+    record = await db.uploads.find_one(query, RECORD_PROJECTION)
     if not record:
         raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
     
     now = datetime.now(timezone.utc).isoformat()
-    await db.uploads.update_one(
-        {"id": record_id},
+    result = await db.uploads.update_one(
+        {"id": record_id, "status": "pending_review"},
         {"$set": {"status": "rejected", "rejected_by": current_user['id'], "rejection_reason": reason, "updated_at": now}}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
+    await record_counters.status_changed(db, record, "pending_review", "rejected")
     
     # Stajyere bildirim gönder
     if record.get('user_id'):
@@ -1133,7 +1415,7 @@ async def get_apprentices(
         query["branch_code"] = branch_code
     
     apprentices = await db.users.find(query, {"_id": 0, "password": 0}).to_list(100)
-    return [UserResponse(**a) for a in apprentices]
+    return [UserResponse(**presence_tracker.apply(a)) for a in apprentices]
 
 # Health check
 @api_router.get("/")
@@ -1202,6 +1484,49 @@ async def ocr_detect_plate(
         logger.error(f"OCR plate error: {e}")
         return {"success": False, "error": str(e)}
 
+@api_router.post("/records/{record_id}/ocr")
+async def ocr_record_photos(
+    record_id: str,
+    mode: str = "text",
+    current_user: dict = Depends(get_current_user)
+):
+    """Kaydın tüm fotoğraflarında metin/plaka algılama; eşzamanlı istekler tek Vision çağrısında toplanır"""
+    if mode not in ("text", "plate"):
+        raise HTTPException(status_code=400, detail="Geçersiz mod")
+    query = {"id": record_id}
+    
+    if current_user.get('role') == 'staff':
+        query["branch_code"] = current_user.get('branch_code')
+    
+    record = await db.uploads.find_one(query, {"_id": 0, "id": 1, "files_json": 1})
+    if not record:
+        raise HTTPException(status_code=404, detail="Kayıt bulunamadı")
+    
+    from services.ocr_service import get_ocr_service, VISION_BATCH_MAX_IMAGES
+    ocr = get_ocr_service()
+    if not ocr:
+        return {"success": False, "error": "OCR not configured", "use_browser": True}
+    detect = ocr.detect_text if mode == "text" else ocr.detect_license_plate
+    # Enough in flight to fill a batch without holding every original in memory
+    reading = asyncio.Semaphore(VISION_BATCH_MAX_IMAGES)
+    
+    async def run(file_item):
+        async with reading:
+            # The 1280px preview is plenty for OCR and a fraction of the original's size
+            source = ROOT_DIR / (file_item.get('variants') or {}).get('preview', file_item['path']).lstrip('/')
+            if not source.exists():
+                source = ROOT_DIR / file_item['path'].lstrip('/')
+            if not source.exists():
+                source = await storage_replicator.restore(db, record_id, file_item)
+            if source is None:
+                return {"file_id": file_item['id'], "success": False, "error": "Dosya bulunamadı"}
+            content = await asyncio.to_thread(source.read_bytes)
+            return {"file_id": file_item['id'], "original_name": file_item['original_name'], **await detect(content)}
+    
+    photos = [f for f in record.get('files_json', []) if f.get('media_type') == 'photo']
+    results = await asyncio.gather(*[run(f) for f in photos])
+    return {"success": True, "record_id": record_id, "mode": mode, "count": len(results), "results": results}
+
 # ============ VOICE-TO-TEXT API ============
 
 @api_router.post("/voice/transcribe")
@@ -1267,11 +1592,64 @@ async def set_storage_provider(
                 {"$set": {"value": provider}},
                 upsert=True
             )
+            # Sadece yerelde duran dosyaları yeni sağlayıcıya kopyala
+            run_in_background(storage_replicator.enqueue_missing(db), "storage_replicator.enqueue_missing")
             return {"success": True, "active": provider}
         return {"success": False, "error": "Provider not configured"}
     except ImportError:
         return {"success": False, "error": "Storage service not available"}
 
+@api_router.post("/storage/migrations")
+async def start_storage_migration(
+    target: Optional[str] = Form(None),
+    delete_source: bool = Form(False),
+    current_user: dict = Depends(get_current_user)
+):
+    """Mevcut tüm dosyaları hedef sağlayıcıya taşı (varsayılan: aktif sağlayıcı)"""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+    
+    try:
+        return await storage_migrator.create(
+            db, target or storage_manager.active_provider, current_user['id'], delete_source
+        )
+    except MigrationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/storage/migrations")
+async def list_storage_migrations(current_user: dict = Depends(get_current_user)):
+    """Taşıma işlemleri (ilerleme, hız, tahmini bitiş)"""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+    return await storage_migrator.list_recent(db)
+
+@api_router.get("/storage/migrations/{migration_id}")
+async def get_storage_migration(migration_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+    
+    try:
+        return await storage_migrator.get(db, migration_id)
+    except MigrationError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@api_router.post("/storage/migrations/{migration_id}/cancel")
+async def cancel_storage_migration(migration_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+    
+    try:
+        return await storage_migrator.cancel(db, migration_id)
+    except MigrationError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@api_router.get("/storage/dedup-report")
+async def get_dedup_report(current_user: dict = Depends(get_current_user)):
+    """Tekilleştirme ile kazanılan disk alanı"""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Yetkiniz yok")
+    return await blob_store.report(db)
+
 # ============ SERVICE STATUS API (for admin) ============
 
 @api_router.get("/services/status")
@@ -1283,14 +1661,25 @@ async def get_services_status(current_user: dict = Depends(get_current_user)):
     status = {
         "ocr": {"configured": False, "provider": "browser"},
         "voice": {"configured": False, "provider": "browser"},
-        "storage": {"configured": True, "provider": "local", "providers": {"local": True}}
+        "storage": {"configured": True, "provider": "local", "providers": {"local": True}},
+        "user_cache": user_cache.get_stats(),
+        "ocr_cache": ocr_cache.get_stats(),
+        "http_client": http_client.get_stats(),
+        "presence": presence_tracker.get_stats(),
+        "password_hasher": password_hasher.get_stats(),
+        "media": await media_processor.get_stats(db),
+        "replication": await storage_replicator.get_stats(db)
     }
     
     try:
-        from services.ocr_service import get_ocr_service
+        from services.ocr_service import get_ocr_service, ocr_service, vision_api_rest
         ocr = get_ocr_service()
         if ocr:
             status["ocr"] = {"configured": True, "provider": "vision_api"}
+            if ocr_service.client:
+                status["ocr"]["client"] = ocr_service.get_stats()
+            elif vision_api_rest.is_configured():
+                status["ocr"]["batching"] = vision_api_rest.batcher.get_stats()
     except:
         pass
     
@@ -1309,13 +1698,45 @@ async def get_services_status(current_user: dict = Depends(get_current_user)):
             "provider": storage_manager.active_provider,
             "providers": storage_manager.get_configured_providers()
         }
+        gdrive_provider = storage_manager.providers['gdrive']
+        if gdrive_provider.service:
+            status["storage"]["gdrive"] = gdrive_provider.get_stats()
+        ftp_provider = storage_manager.providers['ftp']
+        if ftp_provider.is_configured():
+            status["storage"]["ftp_pool"] = ftp_provider.pool.get_stats()
     except:
         pass
     
     return status
 
+class UploadsStaticFiles(StaticFiles):
+    """/uploads, falling back to the remote provider for originals reclaimed from local disk.
+    Dot-prefixed paths (.partial uploads, .blobs, .migration work files) are internal and never served."""
+    
+    async def get_response(self, path: str, scope):
+        if any(part.startswith('.') for part in Path(path).parts):
+            raise StarletteHTTPException(status_code=404)
+        try:
+            return await super().get_response(path, scope)
+        except StarletteHTTPException as e:
+            if e.status_code != 404:
+                raise
+        located = await storage_replicator.locate(db, f"/uploads/{path}")
+        if located:
+            record_id, file_item = located
+            storage = file_item.get('storage') or {}
+            provider = storage_manager.providers.get(storage.get('provider'))
+            if provider and provider.serves_direct_urls:
+                url = await provider.get_file_url(storage['key'])
+                if url:
+                    return RedirectResponse(url, status_code=307)
+            restored = await storage_replicator.restore(db, record_id, file_item)
+            if restored:
+                return FileResponse(restored)
+        raise StarletteHTTPException(status_code=404)
+
 # Mount static files for uploads
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+app.mount("/uploads", UploadsStaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
 
 # Include router
 app.include_router(api_router)
@@ -1326,6 +1747,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Upload-Offset"],
 )
 
 logging.basicConfig(
@@ -1344,6 +1766,11 @@ async def startup():
     await db.uploads.create_index("vin_last5")
     await db.uploads.create_index("branch_code")
     await db.uploads.create_index("status")
+    await db.uploads.create_index("search_grams")
+    # GET /api/records: status/branch_code filters + (sort_field, id) keyset order
+    for sort_field in RECORD_SORT_FIELDS:
+        await db.uploads.create_index([("status", 1), (sort_field, -1), ("id", -1)])
+        await db.uploads.create_index([("branch_code", 1), ("status", 1), (sort_field, -1), ("id", -1)])
     await db.users.create_index("username", unique=True)
     await db.users.create_index("branch_code")
     await db.users.create_index("role")
@@ -1351,13 +1778,40 @@ async def startup():
     await db.notifications.create_index("is_read")
     await db.notifications.create_index([("recipient_id", 1), ("is_read", 1)])
     
+    await record_counters.ensure_indexes(db)
+    await resumable_uploads.ensure_indexes(db)
+    await media_processor.ensure_indexes(db)
+    await storage_replicator.ensure_indexes(db)
+    await storage_migrator.ensure_indexes(db)
+    await blob_store.ensure_indexes(db)
+    await near_duplicates.ensure_indexes(db)
+    await ocr_cache.ensure_indexes(db)
+    
+    # Restore the storage provider chosen in the admin panel
+    storage_setting = await db.settings.find_one({"key": "storage_provider"})
+    if storage_setting:
+        storage_manager.set_active_provider(storage_setting['value'])
+    
+    await http_client.start()
+    presence_tracker.start(db)
+    ocr_cache.configure(db)
+    resumable_uploads.start(db)
+    media_processor.start(db)
+    storage_replicator.start(db)
+    storage_migrator.start(db)
+    run_in_background(media_processor.enqueue_missing(db), "media_processor.enqueue_missing")
+    run_in_background(storage_replicator.enqueue_missing(db), "storage_replicator.enqueue_missing")
+    run_in_background(record_counters.reconcile_if_empty(db), "record_counters.reconcile_if_empty")
+    run_in_background(record_search.backfill(db), "record_search.backfill")
+    run_in_background(blob_store.backfill(db), "blob_store.backfill")
+    
     # Create default admin if not exists
     admin = await db.users.find_one({"username": "admin"})
     if not admin:
         admin_doc = {
             "id": str(uuid.uuid4()),
             "username": "admin",
-            "password": hash_password("admin123"),
+            "password": await hash_password("admin123"),
             "full_name": "Sistem Yöneticisi",
             "role": "admin",
             "branch_code": None,
@@ -1375,4 +1829,16 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await presence_tracker.stop()
+    await resumable_uploads.stop()
+    await media_processor.stop()
+    await storage_migrator.stop()
+    await storage_replicator.stop()
+    password_hasher.shutdown()
+    await http_client.close()
+    await storage_manager.providers['onedrive'].close()
+    await asyncio.to_thread(storage_manager.providers['ftp'].close)
     client.close()
@@ -0,0 +1,115 @@
+# Record Counter Service
+# Materialized record counts per (branch_code, record_type, status, year)
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+COUNTER_KEYS = ("branch_code", "record_type", "status", "year")
+
+
+def _record_year(record: Dict[str, Any]) -> int:
+    created_at = record.get('created_at') or ''
+    try:
+        return int(created_at[:4])
+    except ValueError:
+        return datetime.now(timezone.utc).year
+
+
+class RecordCounters:
+    """Keeps db.record_counters in step with db.uploads.
+
+    Handlers call `record_created` / `status_changed` after writing a record so
+    dashboards can sum a handful of counter documents instead of counting the
+    uploads collection. `reconcile` rebuilds every counter from scratch.
+    """
+
+    collection_name = "record_counters"
+
+    def _key(self, record: Dict[str, Any], status: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "branch_code": record.get('branch_code') or "0",
+            "record_type": record.get('record_type'),
+            "status": status or record.get('status'),
+            "year": _record_year(record)
+        }
+
+    async def ensure_indexes(self, db) -> None:
+        await db[self.collection_name].create_index([(k, 1) for k in COUNTER_KEYS], unique=True)
+
+    async def _inc(self, db, key: Dict[str, Any], delta: int) -> None:
+        await db[self.collection_name].update_one(key, {"$inc": {"count": delta}}, upsert=True)
+
+    async def record_created(self, db, record: Dict[str, Any]) -> None:
+        await self._inc(db, self._key(record), 1)
+
+    async def status_changed(self, db, record: Dict[str, Any], old_status: str, new_status: str) -> None:
+        if old_status == new_status:
+            return
+        await self._inc(db, self._key(record, old_status), -1)
+        await self._inc(db, self._key(record, new_status), 1)
+
+    async def get_counts(self, db, statuses: List[str], branch_code: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Summed counts for the given statuses: {"by_type": {...}, "by_branch": {...}, "by_status": {...}}"""
+        query = {"status": {"$in": statuses}}
+        if branch_code:
+            query["branch_code"] = branch_code
+
+        totals = {"by_type": {}, "by_branch": {}, "by_status": {}}
+        async for counter in db[self.collection_name].find(query, {"_id": 0}):
+            for group, field in (("by_type", "record_type"), ("by_branch", "branch_code"), ("by_status", "status")):
+                value = counter.get(field)
+                totals[group][value] = totals[group].get(value, 0) + counter.get('count', 0)
+        return totals
+
+    async def reconcile(self, db) -> int:
+        """Rebuild all counters from db.uploads. Returns the number of counter documents."""
+        from pymongo import UpdateOne
+
+        pipeline = [
+            {"$group": {
+                "_id": {
+                    "branch_code": {"$ifNull": ["$branch_code", "0"]},
+                    "record_type": "$record_type",
+                    "status": "$status",
+                    "year": {"$substrBytes": [{"$ifNull": ["$created_at", ""]}, 0, 4]}
+                },
+                "count": {"$sum": 1}
+            }}
+        ]
+        counts = {}
+        async for row in db.uploads.aggregate(pipeline, allowDiskUse=True):
+            key = dict(row['_id'])
+            key['year'] = _record_year({"created_at": key['year']})
+            key = tuple(key[k] for k in COUNTER_KEYS)
+            counts[key] = counts.get(key, 0) + row['count']
+
+        collection = db[self.collection_name]
+        operations = [
+            UpdateOne(dict(zip(COUNTER_KEYS, key)), {"$set": {"count": count}}, upsert=True)
+            for key, count in counts.items()
+        ]
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+
+        # Drop counters whose records no longer exist
+        stale = [
+            counter["_id"]
+            async for counter in collection.find({}, {"_id": 1, **{k: 1 for k in COUNTER_KEYS}})
+            if tuple(counter.get(k) for k in COUNTER_KEYS) not in counts
+        ]
+        if stale:
+            await collection.delete_many({"_id": {"$in": stale}})
+
+        logger.info(f"Record counters reconciled: {len(counts)} counters")
+        return len(counts)
+
+    async def reconcile_if_empty(self, db) -> None:
+        if await db[self.collection_name].estimated_document_count() == 0:
+            await self.reconcile(db)
+
+
+# Singleton instance
+record_counters = RecordCounters()
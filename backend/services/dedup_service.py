@@ -0,0 +1,168 @@
+# Deduplicated Media Store
+# Content-addressed blobs (keyed by SHA-256) with reference counts
+
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
+
+from services.storage_service import place_file
+from services.upload_service import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """One physical copy per distinct file content.
+
+    Every original is kept once under .blobs/<aa>/<sha256>; the per-record
+    file (/uploads/<record_type>/<filename>) is a hard link to that blob, so
+    URLs, thumbnails and replication keys stay per file while the bytes are
+    stored once. db.blobs counts the files_json entries pointing at each blob
+    (file_item["blob"] = sha256); the blob is unlinked with its last reference.
+    Where hard links fail (cross-device, no link support) the file keeps its
+    own copy: the entry gets blob_copy and the blob's `copies` count, so the
+    report never counts those bytes as saved.
+    """
+
+    collection_name = "blobs"
+
+    def __init__(self, upload_dir: Optional[Path] = None):
+        self.upload_dir = upload_dir
+
+    def configure(self, upload_dir: Path) -> None:
+        self.upload_dir = upload_dir
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def blob_dir(self) -> Path:
+        return self.upload_dir / '.blobs'
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+
+    async def ensure_indexes(self, db) -> None:
+        await db[self.collection_name].create_index("sha256", unique=True)
+
+    async def ingest(self, db, path: Path, sha256: str, size: int) -> bool:
+        """Register a freshly written file. Returns False if it had to stay a separate copy (blob_copy)."""
+        from pymongo import ReturnDocument
+
+        blob = await db[self.collection_name].find_one_and_update(
+            {"sha256": sha256},
+            {
+                "$inc": {"refcount": 1},
+                "$setOnInsert": {"size": size, "copies": 0, "created_at": datetime.now(timezone.utc).isoformat()}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        blob_path = self.blob_path(sha256)
+        if blob['refcount'] > 1 and blob_path.exists():
+            # Drop our copy and take a link to the stored blob instead
+            linked = await asyncio.to_thread(place_file, str(blob_path), str(path), False, True) == "link"
+        else:
+            linked = await asyncio.to_thread(place_file, str(path), str(blob_path), False, True) == "link"
+            if not linked:
+                # No hard links on this filesystem: a second copy would only cost space
+                blob_path.unlink(missing_ok=True)
+        if not linked:
+            await db[self.collection_name].update_one({"sha256": sha256}, {"$inc": {"copies": 1}})
+        return linked
+
+    async def release(self, db, sha256: str, copy: bool = False) -> int:
+        """Drop one reference (copy: a blob_copy entry); the blob goes with the last one.
+        Returns the remaining count."""
+        from pymongo import ReturnDocument
+
+        blob = await db[self.collection_name].find_one_and_update(
+            {"sha256": sha256},
+            {"$inc": {"refcount": -1, "copies": -1 if copy else 0}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None:
+            return 0
+        if blob['refcount'] > 0:
+            return blob['refcount']
+        await db[self.collection_name].delete_one({"sha256": sha256, "refcount": {"$lte": 0}})
+        self.blob_path(sha256).unlink(missing_ok=True)
+        return 0
+
+    def prune_local(self, sha256: str) -> None:
+        """Remove the local blob once no per-record link on this disk uses it (after reclaim)"""
+        path = self.blob_path(sha256)
+        try:
+            if path.stat().st_nlink <= 1:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+    async def backfill(self, db) -> int:
+        """Move files uploaded before the store existed into it (hashing those without sha256)"""
+        count = 0
+        async for record in db.uploads.find({"files_json": {"$elemMatch": {"blob": {"$exists": False}}}},
+                                            {"_id": 0, "id": 1, "files_json": 1}):
+            for file_item in record.get('files_json', []):
+                if 'blob' in file_item:
+                    continue
+                path = self.upload_dir / Path(file_item['path']).relative_to('/uploads')
+                if not path.exists():
+                    continue
+                try:
+                    sha256 = file_item.get('sha256') or await asyncio.to_thread(file_sha256, path)
+                    # Claim the entry first so a concurrent backfill cannot count it twice
+                    result = await db.uploads.update_one(
+                        {"id": record['id'], "files_json": {"$elemMatch": {"id": file_item['id'], "blob": {"$exists": False}}}},
+                        {"$set": {"files_json.$.blob": sha256, "files_json.$.sha256": sha256}}
+                    )
+                    if result.modified_count:
+                        if not await self.ingest(db, path, sha256, path.stat().st_size):
+                            await db.uploads.update_one(
+                                {"id": record['id'], "files_json.id": file_item['id']},
+                                {"$set": {"files_json.$.blob_copy": True}}
+                            )
+                        count += 1
+                except Exception as e:
+                    logger.error(f"Blob backfill failed for {file_item.get('path')}: {e}")
+        if count:
+            logger.info(f"Moved {count} existing files into the blob store")
+        return count
+
+    async def report(self, db) -> Dict[str, Any]:
+        """Logical vs physical bytes and the space saved by deduplication.
+
+        Linked references share one copy; each blob_copy reference stores its own.
+        """
+        copies = {"$ifNull": ["$copies", 0]}
+        linked = {"$subtract": ["$refcount", copies]}
+        pipeline = [{"$group": {
+            "_id": None,
+            "blobs": {"$sum": 1},
+            "references": {"$sum": "$refcount"},
+            "copied_references": {"$sum": copies},
+            "copied_bytes": {"$sum": {"$multiply": ["$size", copies]}},
+            "physical_bytes": {"$sum": {"$multiply": [
+                "$size", {"$add": [copies, {"$cond": [{"$gt": [linked, 0]}, 1, 0]}]}
+            ]}},
+            "logical_bytes": {"$sum": {"$multiply": ["$size", "$refcount"]}},
+            "duplicated_blobs": {"$sum": {"$cond": [{"$gt": [linked, 1]}, 1, 0]}}
+        }}]
+        totals = {"blobs": 0, "references": 0, "copied_references": 0, "copied_bytes": 0,
+                  "physical_bytes": 0, "logical_bytes": 0, "duplicated_blobs": 0}
+        async for row in db[self.collection_name].aggregate(pipeline):
+            totals = {k: row[k] for k in totals}
+        saved = totals['logical_bytes'] - totals['physical_bytes']
+        top = await db[self.collection_name].find(
+            {"refcount": {"$gt": 1}}, {"_id": 0, "sha256": 1, "size": 1, "refcount": 1, "copies": 1}
+        ).sort("refcount", -1).limit(10).to_list(10)
+        return {
+            **totals,
+            "saved_bytes": saved,
+            "saved_ratio": round(saved / totals['logical_bytes'], 4) if totals['logical_bytes'] else 0.0,
+            "top_duplicates": top
+        }
+
+
+# Singleton instance (upload_dir is set by server.py)
+blob_store = BlobStore()
@@ -0,0 +1,153 @@
+# Shared HTTP Client
+# One pooled aiohttp session for outbound API calls (Vision REST, Whisper, audio downloads)
+
+import os
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get('HTTP_MAX_CONNECTIONS_PER_HOST', '20'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '10'))  # seconds
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '60'))  # seconds between reads
+HTTP_TOTAL_TIMEOUT = float(os.environ.get('HTTP_TOTAL_TIMEOUT', '120'))  # seconds per attempt
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '2'))  # extra attempts after the first
+HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', '0.5'))  # seconds, doubled per attempt
+HTTP_KEEPALIVE_TIMEOUT = 60  # seconds an idle connection stays open
+
+# Worth another try: throttling and gateway errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Safe to send twice; anything else (POSTs to Whisper/Vision are billed) is only
+# retried when the server cannot have acted on it
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class HTTPClient:
+    """Process-wide aiohttp session with keep-alive pooling.
+
+    Started and closed from the FastAPI startup/shutdown hooks; used lazily
+    (e.g. from scripts) it creates the session on first request. Connections
+    are capped per process (HTTP_MAX_CONNECTIONS) and per host
+    (HTTP_MAX_CONNECTIONS_PER_HOST), DNS answers are cached, and `request`
+    retries with exponential backoff and jitter, honouring Retry-After.
+    Idempotent requests are retried on connection errors, timeouts and
+    RETRY_STATUSES; others only when the connection could not be opened or
+    on 429, since a timeout or 5xx may come after the work was done (and billed).
+    """
+
+    def __init__(self, max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+                 retries: int = HTTP_RETRIES, backoff: float = HTTP_RETRY_BACKOFF):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+
+    @property
+    def session(self):
+        return self._open()
+
+    def _open(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    limit_per_host=self.max_connections_per_host,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=HTTP_TOTAL_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT
+                )
+            )
+        return self._session
+
+    async def start(self) -> None:
+        self._open()
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return self.backoff * 2 ** attempt * (0.5 + random.random())
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, retries: Optional[int] = None,
+                      idempotent: Optional[bool] = None, **kwargs):
+        """`async with http_client.request(...) as response:`
+
+        The final response is yielded whatever its status. `data` may be a
+        callable returning a fresh body, for bodies that can only be sent once
+        (aiohttp.FormData); anything else is reused as is on every attempt.
+        `idempotent` defaults from the method; pass True to opt a POST in to
+        the full retry policy.
+        """
+        import aiohttp
+
+        retries = self.retries if retries is None else retries
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        if idempotent:
+            retry_errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+            retry_statuses = RETRY_STATUSES
+        else:
+            # Failed before anything was sent
+            retry_errors = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+            retry_statuses = frozenset({429})
+        data = kwargs.pop('data', None)
+        for attempt in range(retries + 1):
+            self.requests += 1
+            try:
+                response = await self.session.request(
+                    method, url, data=data() if callable(data) else data, **kwargs
+                )
+            except retry_errors as e:
+                if attempt >= retries:
+                    self.failures += 1
+                    raise
+                delay = self._delay(attempt)
+                logger.warning(f"{method} {url.split('?')[0]} failed ({e!r}), retrying in {delay:.1f}s")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.failures += 1
+                raise
+            else:
+                if response.status not in retry_statuses or attempt >= retries:
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                    return
+                delay = self._delay(attempt, response)
+                response.release()
+                logger.warning(f"{method} {url.split('?')[0]} returned {response.status}, retrying in {delay:.1f}s")
+            self.retried += 1
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "open": self._session is not None and not self._session.closed,
+            "max_connections": self.max_connections,
+            "max_connections_per_host": self.max_connections_per_host,
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures
+        }
+
+
+# Singleton instance (started/closed by server.py)
+http_client = HTTPClient()
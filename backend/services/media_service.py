@@ -0,0 +1,375 @@
+# Media Processing Service
+# Background generation of thumbnails, previews and video proxies for uploaded files
+
+import os
+import uuid
+import shutil
+import asyncio
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, Callable, Awaitable, Tuple
+
+from services.phash_service import dhash, near_duplicates
+
+logger = logging.getLogger(__name__)
+
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', '2'))
+MEDIA_JOB_MAX_ATTEMPTS = int(os.environ.get('MEDIA_JOB_MAX_ATTEMPTS', '3'))
+MEDIA_JOB_LEASE = int(os.environ.get('MEDIA_JOB_LEASE', '600'))  # seconds
+MEDIA_POLL_INTERVAL = 30  # seconds
+
+# Variant name -> longest edge in pixels. All image variants are WebP.
+IMAGE_VARIANTS = {
+    "thumb_small": 160,
+    "thumb": 320,
+    "preview": 1280
+}
+WEBP_QUALITY = int(os.environ.get('MEDIA_WEBP_QUALITY', '80'))
+
+# Video proxy: small H.264/AAC MP4 that starts playing before it is fully downloaded
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+VIDEO_PROXY_HEIGHT = int(os.environ.get('VIDEO_PROXY_HEIGHT', '480'))
+VIDEO_PROXY_MAXRATE = os.environ.get('VIDEO_PROXY_MAXRATE', '800k')
+VIDEO_TRANSCODE_CONCURRENCY = int(os.environ.get('VIDEO_TRANSCODE_CONCURRENCY', '1'))
+VIDEO_TRANSCODE_TIMEOUT = int(os.environ.get('VIDEO_TRANSCODE_TIMEOUT', '1800'))  # seconds
+
+# External tool each media type needs. Files processed while it was missing are
+# marked media_skipped (variants left unset) and requeued once it is installed.
+MEDIA_TOOLS = {
+    "pdf": "pdftoppm",
+    "video": FFMPEG_BINARY
+}
+
+
+def _available_tool_media_types():
+    return [media_type for media_type, tool in MEDIA_TOOLS.items() if shutil.which(tool)]
+
+
+def _render_image_variants(source: Path, sizes: Dict[str, int]) -> Tuple[Dict[str, Path], str]:
+    """Write one WebP per size next to source. Returns (variants, dhash). Runs in a worker thread."""
+    from PIL import Image, ImageOps
+
+    outputs = {}
+    largest = max(sizes.values())
+    with Image.open(source) as img:
+        # JPEG draft mode decodes at a reduced scale, far cheaper for 10MB photos
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        phash = dhash(img)
+
+        # Largest first, each smaller variant is resized from the previous one
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            dest = source.with_name(f"{source.stem}_{name}.webp")
+            img.save(dest, 'WEBP', quality=WEBP_QUALITY, method=4)
+            outputs[name] = dest
+    return outputs, phash
+
+
+def _render_pdf_first_page(source: Path, size: int) -> Optional[Path]:
+    """Rasterize page 1 with poppler's pdftoppm. Returns a temporary PNG path."""
+    pdftoppm = shutil.which('pdftoppm')
+    if not pdftoppm:
+        return None
+    out_prefix = Path(tempfile.mkdtemp(prefix='pdfpreview-')) / 'page'
+    try:
+        subprocess.run(
+            [pdftoppm, '-f', '1', '-l', '1', '-png', '-singlefile', '-scale-to', str(size), str(source), str(out_prefix)],
+            check=True, capture_output=True, timeout=120
+        )
+    except BaseException:
+        shutil.rmtree(out_prefix.parent, ignore_errors=True)
+        raise
+    return out_prefix.with_suffix('.png')
+
+
+async def _run_ffmpeg(args, timeout: int) -> None:
+    """Run ffmpeg as a subprocess (no thread needed), killing it on timeout or cancellation"""
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y', *args,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except BaseException:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({process.returncode}): {stderr.decode(errors='replace')[-500:]}")
+
+
+class MediaProcessor:
+    """Durable background queue for derived media (thumbnails, previews, video proxies).
+
+    Jobs are stored in db.media_jobs and claimed with a lease, so jobs from a
+    crashed or restarted process are picked up again once their lease expires.
+    Handlers are registered per media_type and return a variants map
+    (name -> absolute path) plus extra fields (e.g. a photo's phash); results
+    are written back onto the matching files_json entry. A handler whose
+    external tool is missing returns {"media_skipped": reason} instead, which
+    leaves variants unset so enqueue_missing can retry it later.
+    """
+
+    collection_name = "media_jobs"
+
+    def __init__(self, workers: int = MEDIA_WORKERS):
+        self.workers = max(1, workers)
+        self.upload_dir: Optional[Path] = None
+        self.handlers: Dict[str, Callable[[Path], Awaitable[Tuple[Dict[str, Path], Dict[str, Any]]]]] = {
+            "photo": self._process_photo,
+            "pdf": self._process_pdf,
+            "video": self._process_video
+        }
+        self._video_slots = asyncio.Semaphore(max(1, VIDEO_TRANSCODE_CONCURRENCY))
+        self._db = None
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self.processed = 0
+        self.failed = 0
+
+    def configure(self, upload_dir: Path) -> None:
+        self.upload_dir = upload_dir
+
+    async def ensure_indexes(self, db) -> None:
+        await db[self.collection_name].create_index([("record_id", 1), ("file_id", 1)], unique=True)
+        await db[self.collection_name].create_index([("status", 1), ("lease_until", 1)])
+
+    def start(self, db) -> None:
+        self._db = db
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def source_path(self, file_item: Dict[str, Any]) -> Path:
+        # files_json paths look like /uploads/<record_type>/<filename>
+        return self.upload_dir / Path(file_item['path']).relative_to('/uploads')
+
+    def public_path(self, path: Path) -> str:
+        return f"/uploads/{path.relative_to(self.upload_dir).as_posix()}"
+
+    async def enqueue(self, db, record_id: str, file_item: Dict[str, Any]) -> None:
+        if file_item.get('media_type') not in self.handlers:
+            return
+        now = datetime.now(timezone.utc)
+        await db[self.collection_name].update_one(
+            {"record_id": record_id, "file_id": file_item['id']},
+            {"$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "media_type": file_item['media_type'],
+                "path": file_item['path'],
+                "status": "pending",
+                "attempts": 0,
+                "lease_until": now,
+                "created_at": now.isoformat()
+            }},
+            upsert=True
+        )
+        self._wakeup.set()
+
+    async def enqueue_missing(self, db) -> int:
+        """Queue jobs for files uploaded before the pipeline (or photo hashing) existed,
+        and for files skipped because a tool that is now installed was missing"""
+        count = 0
+        retry_types = _available_tool_media_types()
+        query = {"files_json": {"$elemMatch": {"$or": [
+            {"media_type": {"$in": list(self.handlers)}, "variants": {"$exists": False}},
+            {"media_type": "photo", "phash": {"$exists": False}},
+            {"media_type": {"$in": retry_types}, "media_skipped": {"$exists": True}},
+            # Skips from before media_skipped existed were stored as empty variants
+            {"media_type": {"$in": retry_types}, "variants": {}}
+        ]}}}
+        async for record in db.uploads.find(query, {"_id": 0, "id": 1, "files_json": 1}):
+            for file_item in record.get('files_json', []):
+                media_type = file_item.get('media_type')
+                if media_type in self.handlers and (
+                    'variants' not in file_item or
+                    (media_type == 'photo' and 'phash' not in file_item) or
+                    (media_type in retry_types and ('media_skipped' in file_item or file_item['variants'] == {}))
+                ):
+                    await self.enqueue(db, record['id'], file_item)
+                    count += 1
+        if count:
+            logger.info(f"Queued {count} media jobs for existing files")
+        return count
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        from pymongo import ReturnDocument
+
+        now = datetime.now(timezone.utc)
+        return await self._db[self.collection_name].find_one_and_update(
+            {"status": {"$in": ["pending", "running"]}, "lease_until": {"$lte": now}},
+            {
+                "$set": {"status": "running", "lease_until": now + timedelta(seconds=MEDIA_JOB_LEASE)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("lease_until", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Media job claim error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=MEDIA_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job)
+
+    async def _renew_lease(self, job: Dict[str, Any]) -> None:
+        """Keep extending the lease while a long job (e.g. transcoding) is running"""
+        while True:
+            await asyncio.sleep(MEDIA_JOB_LEASE / 2)
+            await self._db[self.collection_name].update_one(
+                {"_id": job["_id"]},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=MEDIA_JOB_LEASE)}}
+            )
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        jobs = self._db[self.collection_name]
+        renewer = asyncio.create_task(self._renew_lease(job))
+        try:
+            source = self.source_path(job)
+            if not source.exists():
+                raise FileNotFoundError(str(source))
+            variants, fields = await self.handlers[job['media_type']](source)
+            if await self._save_variants(job, variants, fields) and fields.get('phash'):
+                await near_duplicates.add(self._db, job['record_id'], job['file_id'], fields['phash'])
+            await jobs.delete_one({"_id": job["_id"]})
+            self.processed += 1
+        except Exception as e:
+            logger.error(f"Media job {job['id']} ({job['path']}) failed: {e}")
+            exhausted = job.get('attempts', 0) >= MEDIA_JOB_MAX_ATTEMPTS or isinstance(e, FileNotFoundError)
+            await jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {
+                    "status": "failed" if exhausted else "pending",
+                    "lease_until": datetime.now(timezone.utc) + timedelta(seconds=30 * job.get('attempts', 1)),
+                    "error": str(e)
+                }}
+            )
+            if exhausted:
+                self.failed += 1
+        finally:
+            renewer.cancel()
+
+    async def _save_variants(self, job: Dict[str, Any], variants: Dict[str, Path], fields: Dict[str, Any]) -> bool:
+        public = {name: self.public_path(path) for name, path in variants.items()}
+        if fields.get('media_skipped'):
+            # Leave variants unset so the file is picked up again once the tool is installed
+            changes = {"$set": {"files_json.$.media_skipped": fields['media_skipped']}}
+        else:
+            update = {"files_json.$.variants": public}
+            if "thumb" in public:
+                update["files_json.$.thumb"] = public["thumb"]
+            update.update({f"files_json.$.{name}": value for name, value in fields.items()})
+            changes = {"$set": update, "$unset": {"files_json.$.media_skipped": ""}}
+        result = await self._db.uploads.update_one(
+            {"id": job['record_id'], "files_json.id": job['file_id']},
+            changes
+        )
+        if result.matched_count == 0:
+            # File was deleted while processing
+            self.remove_variants({"variants": public})
+            return False
+        return True
+
+    async def _process_photo(self, source: Path) -> Tuple[Dict[str, Path], Dict[str, Any]]:
+        variants, phash = await asyncio.to_thread(_render_image_variants, source, IMAGE_VARIANTS)
+        return variants, {"phash": phash}
+
+    async def _process_pdf(self, source: Path) -> Tuple[Dict[str, Path], Dict[str, Any]]:
+        page = await asyncio.to_thread(_render_pdf_first_page, source, max(IMAGE_VARIANTS.values()))
+        if page is None:
+            logger.warning("pdftoppm not installed, skipping PDF preview")
+            return {}, {"media_skipped": "pdftoppm not installed"}
+        try:
+            rendered, _ = await asyncio.to_thread(_render_image_variants, page, IMAGE_VARIANTS)
+            # Move the previews next to the original PDF
+            return {
+                name: Path(shutil.move(str(path), str(source.with_name(f"{source.stem}_{name}.webp"))))
+                for name, path in rendered.items()
+            }, {}
+        finally:
+            shutil.rmtree(page.parent, ignore_errors=True)
+
+    async def _process_video(self, source: Path) -> Tuple[Dict[str, Path], Dict[str, Any]]:
+        """Poster frame (as WebP image variants) plus a low-bitrate MP4 proxy"""
+        if not shutil.which(FFMPEG_BINARY):
+            logger.warning("ffmpeg not installed, skipping video poster/proxy")
+            return {}, {"media_skipped": "ffmpeg not installed"}
+
+        async with self._video_slots:
+            poster = source.with_name(f"{source.stem}_poster.jpg")
+            # thumbnail filter picks a representative frame instead of a black first frame
+            await _run_ffmpeg([
+                '-i', str(source), '-vf', f"thumbnail,scale='min({max(IMAGE_VARIANTS.values())},iw)':-2",
+                '-frames:v', '1', str(poster)
+            ], timeout=300)
+            try:
+                variants, _ = await asyncio.to_thread(_render_image_variants, poster, IMAGE_VARIANTS)
+            finally:
+                poster.unlink(missing_ok=True)
+
+            proxy = source.with_name(f"{source.stem}_proxy.mp4")
+            temp_proxy = proxy.with_name(proxy.stem + '.part.mp4')
+            try:
+                await _run_ffmpeg([
+                    '-i', str(source),
+                    '-vf', f"scale=-2:'min({VIDEO_PROXY_HEIGHT},ih)'",
+                    '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+                    '-maxrate', VIDEO_PROXY_MAXRATE, '-bufsize', VIDEO_PROXY_MAXRATE,
+                    '-pix_fmt', 'yuv420p',
+                    '-c:a', 'aac', '-b:a', '64k', '-ac', '1',
+                    '-movflags', '+faststart',
+                    str(temp_proxy)
+                ], timeout=VIDEO_TRANSCODE_TIMEOUT)
+                os.replace(temp_proxy, proxy)
+            finally:
+                temp_proxy.unlink(missing_ok=True)
+            variants["proxy"] = proxy
+        return variants, {}
+
+    def remove_variants(self, file_item: Dict[str, Any]) -> None:
+        """Delete the derived files of a files_json entry"""
+        for path in (file_item.get('variants') or {}).values():
+            try:
+                os.remove(self.upload_dir / Path(path).relative_to('/uploads'))
+            except (FileNotFoundError, ValueError):
+                pass
+
+    async def get_stats(self, db) -> Dict[str, Any]:
+        pending = await db[self.collection_name].count_documents({"status": {"$in": ["pending", "running"]}})
+        failed = await db[self.collection_name].count_documents({"status": "failed"})
+        return {
+            "workers": self.workers,
+            "queued": pending,
+            "failed_jobs": failed,
+            "processed": self.processed,
+            "failed": self.failed
+        }
+
+
+# Singleton instance (upload_dir is set by server.py)
+media_processor = MediaProcessor()
@@ -0,0 +1,386 @@
+# Storage Migration Service
+# Resumable bulk copy of every uploaded file from its current provider to a target provider
+
+import os
+import uuid
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List
+
+from services.storage_service import storage_manager, place_file
+from services.upload_service import file_sha256
+from services.replication_service import storage_replicator, storage_key
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_CONCURRENCY = int(os.environ.get('MIGRATION_CONCURRENCY', '4'))  # files in flight
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', '50'))  # records per checkpoint
+MIGRATION_VERIFY_REMOTE = os.environ.get('MIGRATION_VERIFY_REMOTE', 'true').lower() == 'true'
+MIGRATION_LEASE = 300  # seconds
+MIGRATION_MAX_ERRORS = 50  # most recent failures kept on the migration document
+
+
+class MigrationError(Exception):
+    """Raised for requests the migrator cannot start or find"""
+
+
+class StorageMigrator:
+    """Copies files_json entries to a target provider, one migration at a time.
+
+    Progress lives in db.storage_migrations: records are walked in `id` order in
+    batches of MIGRATION_BATCH_SIZE and `checkpoint` is the last fully processed
+    record id, so a restarted process resumes from there. Each file is hashed
+    against its recorded sha256 before upload and (with MIGRATION_VERIFY_REMOTE)
+    read back from the target and hashed again. Its `storage` entry is then
+    switched with a conditional update that only matches the location the copy
+    was made from, so concurrent changes are never overwritten.
+    """
+
+    collection_name = "storage_migrations"
+
+    def __init__(self, manager, replicator, concurrency: int = MIGRATION_CONCURRENCY):
+        self.manager = manager
+        self.replicator = replicator
+        self.concurrency = max(1, concurrency)
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self._owner = str(uuid.uuid4())
+
+    @property
+    def work_dir(self) -> Path:
+        return self.replicator.upload_dir / '.migration'
+
+    async def ensure_indexes(self, db) -> None:
+        await db[self.collection_name].create_index("id", unique=True)
+        await db[self.collection_name].create_index("status")
+
+    def start(self, db) -> None:
+        """Resume a migration left running by a stopped or crashed process"""
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._resume())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Hand the lease back so the next process can resume straight away
+            await self._db[self.collection_name].update_many(
+                {"owner": self._owner, "status": "running"},
+                {"$set": {"lease_until": datetime.now(timezone.utc)}}
+            )
+
+    async def _resume(self) -> None:
+        while True:
+            migration = await self._claim({"status": "running"})
+            if migration:
+                logger.info(f"Resuming storage migration {migration['id']} after {migration.get('checkpoint')}")
+                await self._run(migration)
+                return
+            # A crashed process may still hold the lease; wait for it to lapse
+            if not await self._db[self.collection_name].find_one({"status": "running"}, {"_id": 1}):
+                return
+            await asyncio.sleep(MIGRATION_LEASE / 5)
+
+    async def _claim(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        from pymongo import ReturnDocument
+
+        now = datetime.now(timezone.utc)
+        return await self._db[self.collection_name].find_one_and_update(
+            {**query, "$or": [{"lease_until": {"$lte": now}}, {"owner": self._owner}]},
+            {"$set": {
+                "owner": self._owner,
+                "lease_until": now + timedelta(seconds=MIGRATION_LEASE),
+                "run_started_at": now.isoformat(),
+                "run_bytes_start": None
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def _pending_provider(target: str) -> Dict[str, Any]:
+        # $ne also matches files without a storage entry (local-only uploads),
+        # which are already where a migration to local would put them
+        if target == 'local':
+            return {"$exists": True, "$ne": target}
+        return {"$ne": target}
+
+    @staticmethod
+    def _is_pending(file_item: Dict[str, Any], target: str) -> bool:
+        provider = (file_item.get('storage') or {}).get('provider')
+        if provider is None:
+            return target != 'local'
+        return provider != target
+
+    def _pending_query(self, target: str) -> Dict[str, Any]:
+        return {"files_json": {"$elemMatch": {"storage.provider": self._pending_provider(target)}}}
+
+    async def create(self, db, target: str, created_by: str, delete_source: bool = False) -> Dict[str, Any]:
+        provider = self.manager.providers.get(target)
+        if provider is None or not provider.is_configured():
+            raise MigrationError("Hedef depolama sağlayıcısı yapılandırılmamış")
+        if await db[self.collection_name].find_one({"status": "running"}, {"_id": 1}):
+            raise MigrationError("Devam eden bir taşıma işlemi var")
+
+        totals = {"files_total": 0, "bytes_total": 0}
+        pipeline = [
+            {"$match": self._pending_query(target)},
+            {"$unwind": "$files_json"},
+            {"$match": {"files_json.storage.provider": self._pending_provider(target)}},
+            {"$group": {"_id": None, "files_total": {"$sum": 1}, "bytes_total": {"$sum": "$files_json.size"}}}
+        ]
+        async for row in db.uploads.aggregate(pipeline, allowDiskUse=True):
+            totals = {"files_total": row['files_total'], "bytes_total": row['bytes_total']}
+
+        now = datetime.now(timezone.utc)
+        migration = {
+            "id": str(uuid.uuid4()),
+            "target": target,
+            "delete_source": delete_source,
+            "status": "running",
+            "checkpoint": None,
+            **totals,
+            "files_done": 0,
+            "files_skipped": 0,
+            "files_failed": 0,
+            "bytes_done": 0,
+            "errors": [],
+            "created_by": created_by,
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "finished_at": None,
+            "lease_until": now
+        }
+        await db[self.collection_name].insert_one(migration)
+        # Replication jobs for other providers would race the migration
+        await db[self.replicator.collection_name].delete_many({"provider": {"$ne": target}})
+
+        self._db = db
+        await self.stop()
+        claimed = await self._claim({"id": migration['id']})
+        self._task = asyncio.create_task(self._run(claimed))
+        return self._public(claimed)
+
+    async def cancel(self, db, migration_id: str) -> Dict[str, Any]:
+        result = await db[self.collection_name].find_one_and_update(
+            {"id": migration_id, "status": "running"},
+            {"$set": {"status": "cancelled", "finished_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        if not result:
+            raise MigrationError("Taşıma işlemi bulunamadı")
+        await self.stop()
+        return await self.get(db, migration_id)
+
+    async def _renew_lease(self, migration: Dict[str, Any]) -> None:
+        """Keep extending the lease while files are copied, however long a single file takes"""
+        while True:
+            await asyncio.sleep(MIGRATION_LEASE / 5)
+            await self._db[self.collection_name].update_one(
+                {"id": migration['id'], "status": "running", "owner": self._owner},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=MIGRATION_LEASE)}}
+            )
+
+    async def _run(self, migration: Dict[str, Any]) -> None:
+        migrations = self._db[self.collection_name]
+        slots = asyncio.Semaphore(self.concurrency)
+        target = migration['target']
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        await migrations.update_one({"id": migration['id']}, {"$set": {"run_bytes_start": migration['bytes_done']}})
+        renewer = asyncio.create_task(self._renew_lease(migration))
+        try:
+            checkpoint = migration.get('checkpoint')
+            while True:
+                query = self._pending_query(target)
+                if checkpoint:
+                    query["id"] = {"$gt": checkpoint}
+                records = await self._db.uploads.find(query, {"_id": 0, "id": 1, "files_json": 1}) \
+                    .sort("id", 1).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+                if not records:
+                    break
+
+                async def migrate(record_id, file_item):
+                    async with slots:
+                        await self._migrate_file(migration, record_id, file_item)
+
+                await asyncio.gather(*(
+                    migrate(record['id'], file_item)
+                    for record in records
+                    for file_item in record.get('files_json', [])
+                    if self._is_pending(file_item, target)
+                ))
+                checkpoint = records[-1]['id']
+                result = await migrations.update_one(
+                    {"id": migration['id'], "status": "running", "owner": self._owner},
+                    {"$set": {
+                        "checkpoint": checkpoint,
+                        "updated_at": datetime.now(timezone.utc).isoformat(),
+                        "lease_until": datetime.now(timezone.utc) + timedelta(seconds=MIGRATION_LEASE)
+                    }}
+                )
+                if result.matched_count == 0:
+                    logger.info(f"Storage migration {migration['id']} cancelled")
+                    return
+
+            await migrations.update_one(
+                {"id": migration['id'], "status": "running"},
+                {"$set": {"status": "completed", "finished_at": datetime.now(timezone.utc).isoformat()}}
+            )
+            logger.info(f"Storage migration {migration['id']} to {target} completed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Storage migration {migration['id']} failed: {e}")
+            await migrations.update_one(
+                {"id": migration['id']},
+                {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.now(timezone.utc).isoformat()}}
+            )
+        finally:
+            renewer.cancel()
+
+    async def _migrate_file(self, migration: Dict[str, Any], record_id: str, file_item: Dict[str, Any]) -> None:
+        migrations = self._db[self.collection_name]
+        try:
+            moved_bytes = await self._copy_file(migration, record_id, file_item)
+            if moved_bytes is None:
+                await migrations.update_one({"id": migration['id']}, {"$inc": {"files_skipped": 1}})
+            else:
+                await migrations.update_one(
+                    {"id": migration['id']},
+                    {"$inc": {"files_done": 1, "bytes_done": moved_bytes}}
+                )
+        except Exception as e:
+            logger.error(f"Migration of {file_item.get('path')} to {migration['target']} failed: {e}")
+            await migrations.update_one(
+                {"id": migration['id']},
+                {
+                    "$inc": {"files_failed": 1},
+                    "$push": {"errors": {"$each": [{
+                        "record_id": record_id,
+                        "file_id": file_item['id'],
+                        "path": file_item.get('path'),
+                        "error": str(e)
+                    }], "$slice": -MIGRATION_MAX_ERRORS}}
+                }
+            )
+
+    async def _copy_file(self, migration: Dict[str, Any], record_id: str, file_item: Dict[str, Any]) -> Optional[int]:
+        """Copy, verify and switch one file. Returns bytes moved, or None if it vanished meanwhile."""
+        target_name = migration['target']
+        target = self.manager.providers[target_name]
+        storage = file_item.get('storage')
+        source_name = (storage or {}).get('provider', 'local')
+        key = storage_key(file_item)
+        local_path = self.replicator.local_path(file_item)
+        temp_paths: List[Path] = []
+
+        try:
+            # 1. Get the bytes onto local disk (the original, or a download from the source provider)
+            if local_path.exists():
+                source_path = local_path
+            else:
+                if source_name == 'local':
+                    raise FileNotFoundError(str(local_path))
+                source_path = self.work_dir / f"{uuid.uuid4().hex}.src"
+                temp_paths.append(source_path)
+                success, error = await self.manager.providers[source_name].download_file(
+                    (storage or {}).get('key', key), str(source_path)
+                )
+                if not success:
+                    raise RuntimeError(f"download from {source_name}: {error}")
+
+            # 2. Verify the source against the checksum recorded at upload time
+            checksum = await asyncio.to_thread(file_sha256, source_path)
+            size = source_path.stat().st_size
+            if file_item.get('sha256') and checksum != file_item['sha256']:
+                raise RuntimeError(f"checksum mismatch at source ({source_name})")
+
+            # 3. Copy to the target and verify what it now holds
+            if target_name == 'local':
+                if source_path != local_path:
+                    await asyncio.to_thread(place_file, str(source_path), str(local_path), True)
+                    temp_paths.remove(source_path)
+                new_storage = {"provider": "local", "key": key, "local": True}
+            else:
+                success, url, error = await target.upload_file(str(source_path), key)
+                if not success:
+                    raise RuntimeError(f"upload to {target_name}: {error}")
+                if MIGRATION_VERIFY_REMOTE:
+                    check_path = self.work_dir / f"{uuid.uuid4().hex}.chk"
+                    temp_paths.append(check_path)
+                    success, error = await target.download_file(key, str(check_path))
+                    if not success:
+                        raise RuntimeError(f"read-back from {target_name}: {error}")
+                    if await asyncio.to_thread(file_sha256, check_path) != checksum:
+                        await target.delete_file(key)
+                        raise RuntimeError(f"checksum mismatch at target ({target_name})")
+                new_storage = {
+                    "provider": target_name,
+                    "key": key,
+                    "url": url,
+                    "local": local_path.exists(),
+                    "replicated_at": datetime.now(timezone.utc).isoformat()
+                }
+
+            # 4. Switch the location only if nobody changed it while we copied
+            element = {"id": file_item['id']}
+            element["storage"] = storage if storage is not None else {"$exists": False}
+            update = {"files_json.$.storage": new_storage}
+            if not file_item.get('sha256'):
+                update["files_json.$.sha256"] = checksum
+            result = await self._db.uploads.update_one(
+                {"id": record_id, "files_json": {"$elemMatch": element}},
+                {"$set": update}
+            )
+            if result.matched_count == 0:
+                if target_name != 'local':
+                    await target.delete_file(key)
+                return None
+
+            if migration.get('delete_source') and source_name not in ('local', target_name):
+                success, error = await self.manager.providers[source_name].delete_file((storage or {}).get('key', key))
+                if not success:
+                    logger.warning(f"Could not delete migrated source {key} on {source_name}: {error}")
+            return size
+        finally:
+            for path in temp_paths:
+                path.unlink(missing_ok=True)
+
+    def _public(self, migration: Dict[str, Any]) -> Dict[str, Any]:
+        result = {k: v for k, v in migration.items() if k not in ('_id', 'owner', 'lease_until', 'run_bytes_start')}
+        throughput = None
+        eta_seconds = None
+        if migration.get('status') == 'running' and migration.get('run_started_at'):
+            elapsed = (datetime.now(timezone.utc) - datetime.fromisoformat(migration['run_started_at'])).total_seconds()
+            run_bytes = migration.get('bytes_done', 0) - (migration.get('run_bytes_start') or 0)
+            if elapsed > 0 and run_bytes > 0:
+                throughput = run_bytes / elapsed
+                remaining = max(migration.get('bytes_total', 0) - migration.get('bytes_done', 0), 0)
+                eta_seconds = round(remaining / throughput)
+        processed = migration.get('files_done', 0) + migration.get('files_skipped', 0) + migration.get('files_failed', 0)
+        result.update({
+            "files_processed": processed,
+            "progress": round(processed / migration['files_total'], 4) if migration.get('files_total') else 1.0,
+            "throughput_bytes_per_sec": round(throughput) if throughput else None,
+            "eta_seconds": eta_seconds
+        })
+        return result
+
+    async def get(self, db, migration_id: str) -> Dict[str, Any]:
+        migration = await db[self.collection_name].find_one({"id": migration_id})
+        if not migration:
+            raise MigrationError("Taşıma işlemi bulunamadı")
+        return self._public(migration)
+
+    async def list_recent(self, db, limit: int = 20) -> List[Dict[str, Any]]:
+        migrations = await db[self.collection_name].find().sort("created_at", -1).limit(limit).to_list(limit)
+        return [self._public(m) for m in migrations]
+
+
+# Singleton instance
+storage_migrator = StorageMigrator(storage_manager, storage_replicator)
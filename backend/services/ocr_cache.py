@@ -0,0 +1,188 @@
+# OCR Result Cache
+# Content-hash keyed cache of Vision API results (in-process LRU, optional Mongo TTL collection)
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_TTL = int(os.environ.get('OCR_CACHE_TTL', '86400'))  # seconds
+OCR_CACHE_MAX_SIZE = int(os.environ.get('OCR_CACHE_MAX_SIZE', '1000'))
+# Share results across worker processes and restarts via db.ocr_cache
+OCR_CACHE_PERSIST = os.environ.get('OCR_CACHE_PERSIST', 'false').lower() == 'true'
+
+
+class OCRResultCache:
+    """TTL + LRU cache of OCR results keyed by (kind, sha256 of the image bytes).
+
+    The same frame sent twice (PlateOCRModal retries, re-scans of a saved
+    photo) is answered without another Vision call. Only successful results
+    are stored. Identical requests that arrive while the first is still in
+    flight wait for it instead of calling the API again. With
+    OCR_CACHE_PERSIST, results are also written to db.ocr_cache, whose TTL
+    index lets MongoDB expire them.
+    """
+
+    collection_name = "ocr_cache"
+
+    def __init__(self, ttl: int = OCR_CACHE_TTL, max_size: int = OCR_CACHE_MAX_SIZE,
+                 persist: bool = OCR_CACHE_PERSIST):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.persist = persist
+        self._db = None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.persistent_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def is_enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def configure(self, db) -> None:
+        self._db = db
+
+    async def ensure_indexes(self, db) -> None:
+        if not self.persist:
+            return
+        await db[self.collection_name].create_index("key", unique=True)
+        await db[self.collection_name].create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    def make_key(kind: str, image_content: bytes) -> str:
+        return f"{kind}:{hashlib.sha256(image_content).hexdigest()}"
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _set_local(self, key: str, result: Dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _get_persistent(self, key: str) -> Optional[Dict[str, Any]]:
+        if not (self.persist and self._db is not None):
+            return None
+        try:
+            doc = await self._db[self.collection_name].find_one(
+                {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"_id": 0, "result": 1, "expires_at": 1}
+            )
+        except Exception as e:
+            logger.warning(f"OCR cache read failed: {e}")
+            return None
+        if not doc:
+            return None
+        expires_at = doc['expires_at']
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        # Keep the local copy no longer than the stored one
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining > 0:
+            self._set_local(key, doc['result'], remaining)
+        return doc['result']
+
+    async def _set_persistent(self, key: str, result: Dict[str, Any]) -> None:
+        if not (self.persist and self._db is not None):
+            return
+        try:
+            await self._db[self.collection_name].update_one(
+                {"key": key},
+                {"$set": {
+                    "result": result,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"OCR cache write failed: {e}")
+
+    async def get_or_compute(self, kind: str, image_content: bytes,
+                             compute: Callable[[bytes], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cached result for this image, calling compute(image_content) on a miss"""
+        if not self.is_enabled():
+            self.misses += 1
+            return await compute(image_content)
+
+        key = self.make_key(kind, image_content)
+        result = self._get_local(key)
+        if result is not None:
+            self.hits += 1
+            return {**result, "cached": True}
+
+        while key in self._inflight:
+            pending = self._inflight[key]
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                continue  # the first caller went away; one of the waiters takes over
+            self.coalesced += 1
+            return dict(result)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._get_persistent(key)
+            if result is not None:
+                self.persistent_hits += 1
+                result = {**result, "cached": True}
+            else:
+                self.misses += 1
+                result = await compute(image_content)
+                if result.get('success'):
+                    self._set_local(key, result, self.ttl)
+                    await self._set_persistent(key, result)
+            future.set_result(result)
+            return dict(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't warn about an unretrieved exception when there are none
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.persistent_hits + self.coalesced + self.misses
+        saved = self.hits + self.persistent_hits + self.coalesced
+        return {
+            "enabled": self.is_enabled(),
+            "persist": self.persist,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round(saved / lookups, 4) if lookups else 0.0
+        }
+
+
+# Singleton instance (db is set by server.py)
+ocr_cache = OCRResultCache()
@@ -2,21 +2,97 @@
 # Falls back to browser-based Tesseract.js if not configured
 
 import os
+import asyncio
 import logging
+import io
 import base64
-from typing import Optional, Dict, Any
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+
+from services.ocr_cache import ocr_cache
+from services.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
 GOOGLE_VISION_API_KEY = os.environ.get('GOOGLE_VISION_API_KEY')
+VISION_MAX_CONCURRENCY = int(os.environ.get('VISION_MAX_CONCURRENCY', '8'))  # parallel Vision calls per process
+VISION_TIMEOUT = float(os.environ.get('VISION_TIMEOUT', '15'))  # seconds per call
+# REST micro-batching: images:annotate takes up to 16 images and ~10 MB of JSON per request
+VISION_BATCH_WINDOW_MS = float(os.environ.get('VISION_BATCH_WINDOW_MS', '10'))
+VISION_BATCH_MAX_IMAGES = int(os.environ.get('VISION_BATCH_MAX_IMAGES', '16'))
+VISION_BATCH_MAX_BYTES = int(os.environ.get('VISION_BATCH_MAX_BYTES', str(8 * 1024 * 1024)))
+# Plate photos are downsized to this long edge (px) before upload; 0 sends them as is
+OCR_MAX_LONG_EDGE = int(os.environ.get('OCR_MAX_LONG_EDGE', '1600'))
+OCR_JPEG_QUALITY = int(os.environ.get('OCR_JPEG_QUALITY', '90'))
+
+
+def prepare_image(image_content: bytes, long_edge: int = OCR_MAX_LONG_EDGE,
+                  quality: int = OCR_JPEG_QUALITY) -> bytes:
+    """Upright, downsized JPEG for OCR. Runs in a worker thread.
+
+    Phone photos arrive at full sensor resolution (up to MAX_PHOTO_SIZE), often
+    rotated only through the EXIF orientation tag. A plate stays legible at
+    OCR_MAX_LONG_EDGE, and the re-encoded image is a fraction of the base64
+    payload. Images that are already small and upright, or that cannot be
+    decoded, are returned unchanged.
+    """
+    if long_edge <= 0:
+        return image_content
+    try:
+        from PIL import Image, ImageOps
+        
+        with Image.open(io.BytesIO(image_content)) as img:
+            orientation = img.getexif().get(0x0112, 1)  # EXIF Orientation
+            if max(img.size) <= long_edge and orientation == 1:
+                return image_content
+            # Let the JPEG decoder skip detail we are about to throw away
+            scale = min(1.0, long_edge / max(img.size))
+            img.draft('RGB', (round(img.width * scale), round(img.height * scale)))
+            upright = ImageOps.exif_transpose(img)
+            try:
+                if upright.mode not in ('RGB', 'L'):
+                    converted = upright.convert('RGB')
+                    upright.close()
+                    upright = converted
+                upright.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+                out = io.BytesIO()
+                upright.save(out, 'JPEG', quality=quality)
+            finally:
+                upright.close()
+        if orientation == 1 and out.tell() >= len(image_content):
+            return image_content
+        return out.getvalue()
+    except Exception as e:
+        logger.warning(f"OCR image preprocessing skipped: {e}")
+        return image_content
 
 
 class OCRService:
-    """OCR service using Google Cloud Vision API"""
+    """OCR service using Google Cloud Vision API
+
+    ImageAnnotatorClient is synchronous, so every call runs on a dedicated
+    thread pool (VISION_MAX_CONCURRENCY threads, the same bound as the
+    semaphore) and the event loop keeps serving other requests meanwhile.
+    Each call has a deadline (VISION_TIMEOUT) that is passed to the client and
+    enforced on the await. A cancelled or timed-out caller returns at once;
+    the abandoned RPC finishes on its thread within the client deadline and
+    holds its semaphore slot until then, so new calls never queue behind it
+    in the executor.
+    """
     
-    def __init__(self):
-        self.client = None
-        if self.is_configured():
+    def __init__(self, client=None, max_concurrency: int = VISION_MAX_CONCURRENCY,
+                 timeout: float = VISION_TIMEOUT):
+        self.client = client
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='vision')
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        if self.client is None and self.is_configured():
             try:
                 from google.cloud import vision
                 self.client = vision.ImageAnnotatorClient()
@@ -26,6 +102,33 @@ class OCRService:
     def is_configured(self) -> bool:
         return bool(GOOGLE_VISION_API_KEY) or bool(os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'))
     
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def _call_done(self, future) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+        if not future.cancelled():
+            future.exception()  # retrieved here when the caller has already given up
+
+    async def _text_detection(self, image):
+        """client.text_detection off the event loop, bounded and with a deadline"""
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        self.calls += 1
+        # The slot is released when the thread finishes, not when the caller stops waiting
+        call = asyncio.ensure_future(self._run(self.client.text_detection, image=image, timeout=self.timeout))
+        call.add_done_callback(self._call_done)
+        try:
+            return await asyncio.wait_for(asyncio.shield(call), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+    
     async def detect_text(self, image_content: bytes) -> Dict[str, Any]:
         """Detect text from image bytes"""
         if not self.client:
@@ -35,7 +138,7 @@ class OCRService:
             from google.cloud import vision
             
             image = vision.Image(content=image_content)
-            response = self.client.text_detection(image=image)
+            response = await self._text_detection(image)
             
             if response.error.message:
                 return {"success": False, "error": response.error.message}
@@ -48,6 +151,9 @@ class OCRService:
                     "words": [{"text": t.description, "confidence": 0.9} for t in texts[1:]]
                 }
             return {"success": True, "full_text": "", "words": []}
+        except asyncio.TimeoutError:
+            logger.warning(f"Vision API timed out after {self.timeout}s")
+            return {"success": False, "error": "Vision API timeout"}
         except Exception as e:
             logger.error(f"Vision API error: {e}")
             return {"success": False, "error": str(e)}
@@ -61,7 +167,7 @@ class OCRService:
             from google.cloud import vision
             
             image = vision.Image(content=image_content)
-            response = self.client.text_detection(image=image)
+            response = await self._text_detection(image)
             
             if response.error.message:
                 return {"success": False, "error": response.error.message}
@@ -85,6 +191,9 @@ class OCRService:
                     }
                 return {"success": True, "plate": None, "raw_text": full_text}
             return {"success": True, "plate": None, "raw_text": ""}
+        except asyncio.TimeoutError:
+            logger.warning(f"Vision API plate detection timed out after {self.timeout}s")
+            return {"success": False, "error": "Vision API timeout"}
         except Exception as e:
             logger.error(f"Vision API plate detection error: {e}")
             return {"success": False, "error": str(e)}
@@ -99,7 +208,7 @@ class OCRService:
             
             image = vision.Image()
             image.source.image_uri = image_url
-            response = self.client.text_detection(image=image)
+            response = await self._text_detection(image)
             
             if response.error.message:
                 return {"success": False, "error": response.error.message}
@@ -112,57 +221,151 @@ class OCRService:
                     "words": [{"text": t.description} for t in texts[1:]]
                 }
             return {"success": True, "full_text": "", "words": []}
+        except asyncio.TimeoutError:
+            logger.warning(f"Vision API URL detection timed out after {self.timeout}s")
+            return {"success": False, "error": "Vision API timeout"}
         except Exception as e:
             logger.error(f"Vision API URL error: {e}")
             return {"success": False, "error": str(e)}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled
+        }
+
+
+class VisionAPIError(Exception):
+    """images:annotate request rejected as a whole"""
+    pass
+
+
+class AnnotateBatcher:
+    """Micro-batching of images:annotate requests.
+
+    Requests submitted within VISION_BATCH_WINDOW_MS of each other are sent as
+    one `requests` array (at most VISION_BATCH_MAX_IMAGES images and
+    VISION_BATCH_MAX_BYTES of base64 content per call, the API's limits) and
+    each caller gets its own entry of `responses` back. A failed call fails
+    every request in it; per-image errors stay in that image's response.
+    """
+    
+    def __init__(self, send: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+                 window: float = VISION_BATCH_WINDOW_MS / 1000, max_images: int = VISION_BATCH_MAX_IMAGES,
+                 max_bytes: int = VISION_BATCH_MAX_BYTES):
+        self._send = send
+        self.window = window
+        self.max_images = max(1, max_images)
+        self.max_bytes = max_bytes
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._pending_bytes = 0
+        self._timer = None
+        self._dispatches = set()
+        self.batches = 0
+        self.images = 0
+    
+    async def submit(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        size = len(request.get('image', {}).get('content', ''))
+        if self._pending and self._pending_bytes + size > self.max_bytes:
+            self._flush()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future))
+        self._pending_bytes += size
+        if len(self._pending) >= self.max_images:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+    
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [(request, future) for request, future in self._pending if not future.done()]
+        self._pending, self._pending_bytes = [], 0
+        if batch:
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        self.batches += 1
+        self.images += len(batch)
+        try:
+            responses = await self._send([request for request, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(responses[index] if index < len(responses) else {})
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000,
+            "max_images": self.max_images,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0
+        }
 
 
 # Using REST API instead of client library (alternative method)
 class VisionAPIRest:
-    """Google Vision API using REST (no client library needed)"""
+    """Google Vision API using REST (no client library needed)
+    
+    Concurrent detect_text calls are coalesced by an AnnotateBatcher, so OCR
+    over many photos at once costs one round-trip per batch.
+    """
     
-    def __init__(self):
-        self.api_key = GOOGLE_VISION_API_KEY
-        self.base_url = "https://vision.googleapis.com/v1/images:annotate"
+    def __init__(self, api_key: str = None, base_url: str = None):
+        self.api_key = api_key or GOOGLE_VISION_API_KEY
+        self.base_url = base_url or "https://vision.googleapis.com/v1/images:annotate"
+        self.batcher = AnnotateBatcher(self._annotate)
     
     def is_configured(self) -> bool:
         return bool(self.api_key)
     
+    async def _annotate(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        async with http_client.request(
+            "POST",
+            f"{self.base_url}?key={self.api_key}",
+            json={"requests": requests}
+        ) as response:
+            if response.status == 200:
+                data = await response.json()
+                return data.get('responses', [])
+            error_data = await response.json(content_type=None)
+            raise VisionAPIError(error_data.get('error', {}).get('message', 'Unknown error'))
+    
     async def detect_text(self, image_content: bytes) -> Dict[str, Any]:
         """Detect text using REST API"""
         if not self.is_configured():
             return {"success": False, "error": "Vision API key not configured", "use_browser": True}
         
         try:
-            import aiohttp
-            
             image_base64 = base64.b64encode(image_content).decode('utf-8')
             
-            payload = {
-                "requests": [{
-                    "image": {"content": image_base64},
-                    "features": [{"type": "TEXT_DETECTION"}]
-                }]
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}?key={self.api_key}",
-                    json=payload
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        annotations = data.get('responses', [{}])[0].get('textAnnotations', [])
-                        if annotations:
-                            return {
-                                "success": True,
-                                "full_text": annotations[0].get('description', ''),
-                                "words": [{"text": a.get('description', '')} for a in annotations[1:]]
-                            }
-                        return {"success": True, "full_text": "", "words": []}
-                    else:
-                        error_data = await response.json()
-                        return {"success": False, "error": error_data.get('error', {}).get('message', 'Unknown error')}
+            result = await self.batcher.submit({
+                "image": {"content": image_base64},
+                "features": [{"type": "TEXT_DETECTION"}]
+            })
+            if result.get('error'):
+                return {"success": False, "error": result['error'].get('message', 'Unknown error')}
+            annotations = result.get('textAnnotations', [])
+            if annotations:
+                return {
+                    "success": True,
+                    "full_text": annotations[0].get('description', ''),
+                    "words": [{"text": a.get('description', '')} for a in annotations[1:]]
+                }
+            return {"success": True, "full_text": "", "words": []}
         except Exception as e:
             logger.error(f"Vision REST API error: {e}")
             return {"success": False, "error": str(e)}
@@ -190,15 +393,43 @@ class VisionAPIRest:
         return {"success": True, "plate": None, "raw_text": full_text}
 
 
+class CachedOCR:
+    """Answers repeated images from ocr_cache before calling the wrapped Vision service.
+    
+    Plate photos that miss the cache are passed through prepare_image first;
+    the cache key is the uploaded bytes, so hits skip the decode as well.
+    """
+    
+    def __init__(self, service, cache=ocr_cache, long_edge: int = OCR_MAX_LONG_EDGE):
+        self.service = service
+        self.cache = cache
+        self.long_edge = long_edge
+    
+    def is_configured(self) -> bool:
+        return self.service.is_configured()
+    
+    async def detect_text(self, image_content: bytes) -> Dict[str, Any]:
+        return await self.cache.get_or_compute("text", image_content, self.service.detect_text)
+    
+    async def detect_license_plate(self, image_content: bytes) -> Dict[str, Any]:
+        return await self.cache.get_or_compute("plate", image_content, self._detect_license_plate)
+    
+    async def _detect_license_plate(self, image_content: bytes) -> Dict[str, Any]:
+        prepared = await asyncio.to_thread(prepare_image, image_content, self.long_edge)
+        return await self.service.detect_license_plate(prepared)
+
+
 # Singleton instances
 ocr_service = OCRService()
 vision_api_rest = VisionAPIRest()
+cached_ocr_service = CachedOCR(ocr_service)
+cached_vision_api_rest = CachedOCR(vision_api_rest)
 
 
 def get_ocr_service():
-    """Get the best available OCR service"""
+    """Get the best available OCR service (behind the result cache)"""
     if ocr_service.is_configured():
-        return ocr_service
+        return cached_ocr_service
     if vision_api_rest.is_configured():
-        return vision_api_rest
+        return cached_vision_api_rest
     return None
@@ -0,0 +1,101 @@
+# Password Hashing Service
+# Runs bcrypt off the event loop on a dedicated, size-limited thread pool
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+
+class PasswordHasher:
+    """bcrypt hashing/verification on a bounded worker pool.
+
+    bcrypt releases the GIL while hashing, so a small thread pool gives real
+    parallelism without blocking the event loop. Callers beyond the pool size
+    wait in the queue; `queued` and `in_flight` show how deep it gets.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = BCRYPT_WORKERS):
+        self.rounds = rounds
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rehashed = 0
+        self._total_ms = 0.0
+        self._lock = threading.Lock()  # Counters are updated from worker threads
+
+    def _timed(self, func, *args):
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._total_ms += (time.perf_counter() - started) * 1000
+                self.in_flight -= 1
+                self.completed += 1
+
+    async def _run(self, func, *args):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._timed, func, *args)
+
+    def _hash_sync(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=self.rounds)).decode()
+
+    @staticmethod
+    def _verify_sync(password: str, hashed: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode(), hashed.encode())
+        except ValueError:
+            return False  # Malformed hash
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hash_sync, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self._verify_sync, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True if the hash was made with a different cost factor than BCRYPT_ROUNDS"""
+        try:
+            # Format: $2b$<cost>$<salt+hash>
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "rehashed": self.rehashed,
+            "avg_ms": round(self._total_ms / self.completed, 1) if self.completed else 0.0
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+password_hasher = PasswordHasher()
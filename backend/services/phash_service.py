@@ -0,0 +1,166 @@
+# Near-Duplicate Photo Service
+# 64-bit difference hashes (dHash) and a per-record / per-plate similarity index
+
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+from services.search_service import record_search
+
+logger = logging.getLogger(__name__)
+
+PHASH_BANDS = 8  # 8 bands of 8 bits
+# Max differing bits for two photos to count as the same shot (~10% of 64)
+PHASH_MAX_DISTANCE = int(os.environ.get('PHASH_MAX_DISTANCE', '6'))
+
+
+def dhash(img) -> str:
+    """Difference hash of a PIL image as 16 hex chars.
+
+    The image is shrunk to 9x8 greyscale and each bit records whether a pixel
+    is brighter than its right neighbour, so re-encoding, rescaling and small
+    exposure changes leave the hash (nearly) unchanged.
+    """
+    from PIL import Image
+
+    small = img.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def hash_bands(phash: str) -> List[str]:
+    """Band keys ("<band>:<hex>") for candidate lookup.
+
+    Two hashes within PHASH_MAX_DISTANCE (< PHASH_BANDS) bits must share at
+    least one identical 8-bit band, so an indexed $in on bands finds every
+    candidate without scanning; exact distance is checked afterwards.
+    """
+    width = len(phash) // PHASH_BANDS
+    return [f"{i}:{phash[i * width:(i + 1) * width]}" for i in range(PHASH_BANDS)]
+
+
+class NearDuplicateIndex:
+    """db.photo_hashes: one entry per photo with its plate, record and hash bands.
+
+    `add` links a new photo to the earliest similar photo in the same record
+    (files_json.$.near_duplicate_of) so the detail view can collapse repeated
+    shots; `find` also reports similar photos in other records of the plate.
+    """
+
+    collection_name = "photo_hashes"
+
+    async def ensure_indexes(self, db) -> None:
+        await db[self.collection_name].create_index([("record_id", 1), ("file_id", 1)], unique=True)
+        await db[self.collection_name].create_index([("plate_key", 1), ("bands", 1)])
+
+    async def _candidates(self, db, query: Dict[str, Any], phash: str) -> List[Dict[str, Any]]:
+        query = {**query, "bands": {"$in": hash_bands(phash)}}
+        matches = []
+        async for entry in db[self.collection_name].find(query, {"_id": 0}):
+            distance = hamming(phash, entry['phash'])
+            if distance <= PHASH_MAX_DISTANCE:
+                matches.append({**entry, "distance": distance})
+        return matches
+
+    async def add(self, db, record_id: str, file_id: str, phash: str) -> Optional[str]:
+        """Index a photo; returns the file id it duplicates within its record, if any.
+
+        Only photos uploaded earlier (earlier in files_json) can be the
+        original, so reprocessing or photos of one record handled by parallel
+        workers never link two photos to each other.
+        """
+        record = await db.uploads.find_one({"id": record_id}, {"_id": 0, "plate": 1, "files_json": 1})
+        if record is None:
+            return None
+        plate_key = record_search.normalize(record.get('plate')) or None
+        await db[self.collection_name].update_one(
+            {"record_id": record_id, "file_id": file_id},
+            {"$set": {
+                "plate_key": plate_key,
+                "phash": phash,
+                "bands": hash_bands(phash)
+            }, "$setOnInsert": {
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+
+        files = record.get('files_json', [])
+        position = {f['id']: i for i, f in enumerate(files)}
+        if file_id not in position:
+            return None
+        earlier = [
+            m for m in await self._candidates(db, {"record_id": record_id}, phash)
+            if position.get(m['file_id'], len(files)) < position[file_id]
+        ]
+        if not earlier:
+            return None
+        # Point at the group's primary (earliest photo), never at another duplicate
+        original = files[min(position[m['file_id']] for m in earlier)]
+        primary_id = original.get('near_duplicate_of') or original['id']
+        if primary_id == file_id or position.get(primary_id, len(files)) >= position[file_id]:
+            return None
+        await db.uploads.update_one(
+            {"id": record_id, "files_json.id": file_id},
+            {"$set": {"files_json.$.near_duplicate_of": primary_id}}
+        )
+        return primary_id
+
+    async def remove(self, db, record_id: str, file_id: str) -> None:
+        """Drop a deleted photo; its duplicates regroup under the earliest of them"""
+        await db[self.collection_name].delete_one({"record_id": record_id, "file_id": file_id})
+        record = await db.uploads.find_one({"id": record_id}, {"_id": 0, "files_json": 1})
+        followers = [f['id'] for f in (record or {}).get('files_json', []) if f.get('near_duplicate_of') == file_id]
+        if not followers:
+            return
+        new_primary, rest = followers[0], followers[1:]
+        await db.uploads.update_one(
+            {"id": record_id},
+            {"$unset": {"files_json.$[p].near_duplicate_of": ""},
+             "$set": {"files_json.$[d].near_duplicate_of": new_primary}},
+            array_filters=[{"p.id": new_primary}, {"d.id": {"$in": rest}}]
+        )
+
+    async def find(self, db, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Near-duplicate groups within the record and matches in other records of the same plate"""
+        photos = [f for f in record.get('files_json', []) if f.get('media_type') == 'photo' and f.get('phash')]
+        groups: Dict[str, List[str]] = {}
+        for photo in photos:
+            if photo.get('near_duplicate_of'):
+                groups.setdefault(photo['near_duplicate_of'], []).append(photo['id'])
+
+        plate_matches = []
+        plate_key = record_search.normalize(record.get('plate')) or None
+        if plate_key:
+            for photo in photos:
+                for match in await self._candidates(db, {"plate_key": plate_key, "record_id": {"$ne": record['id']}},
+                                                    photo['phash']):
+                    plate_matches.append({
+                        "file_id": photo['id'],
+                        "record_id": match['record_id'],
+                        "other_file_id": match['file_id'],
+                        "distance": match['distance']
+                    })
+
+        duplicates = sum(len(ids) for ids in groups.values())
+        return {
+            "groups": [{"primary": primary, "duplicates": ids} for primary, ids in groups.items()],
+            "duplicate_count": duplicates,
+            "duplicate_bytes": sum(
+                f.get('size', 0) for f in photos if f.get('near_duplicate_of')
+            ),
+            "plate_matches": plate_matches
+        }
+
+
+# Singleton instance
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,146 @@
+# Presence Service
+# Buffers user heartbeats in memory and flushes them to MongoDB in batches
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_FLUSH_INTERVAL = int(os.environ.get('PRESENCE_FLUSH_INTERVAL', '15'))  # seconds
+PRESENCE_ONLINE_WINDOW = int(os.environ.get('PRESENCE_ONLINE_WINDOW', '300'))  # seconds
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class PresenceTracker:
+    """Write-behind presence tracking for users.
+
+    Every authenticated request records a heartbeat in memory; a background task
+    writes the pending heartbeats as a single bulk_write every flush interval.
+    `is_online` is derived from how recent `last_seen` is, so a user who closes
+    the browser without logging out drops offline once the window passes.
+    """
+
+    def __init__(self, flush_interval: int = PRESENCE_FLUSH_INTERVAL,
+                 online_window: int = PRESENCE_ONLINE_WINDOW):
+        self.flush_interval = flush_interval
+        self.online_window = timedelta(seconds=online_window)
+        self._last_seen: Dict[str, datetime] = {}
+        self._pending: Dict[str, datetime] = {}
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_users = 0
+
+    def start(self, db) -> None:
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Presence flush error: {e}")
+
+    def heartbeat(self, user_id: str) -> None:
+        now = datetime.now(timezone.utc)
+        self._last_seen[user_id] = now
+        self._pending[user_id] = now
+
+    def mark_offline(self, user_id: str) -> None:
+        """Forget buffered heartbeats after an explicit logout (written directly by the caller)"""
+        self._last_seen.pop(user_id, None)
+        self._pending.pop(user_id, None)
+
+    async def flush(self) -> int:
+        if not self._pending or self._db is None:
+            return 0
+
+        from pymongo import UpdateOne
+
+        pending, self._pending = self._pending, {}
+        operations = []
+        for user_id, seen_at in pending.items():
+            last_seen = seen_at.isoformat()
+            # Only move last_seen forward; another worker may have flushed a newer heartbeat
+            operations.append(UpdateOne(
+                {"id": user_id, "$or": [{"last_seen": None}, {"last_seen": {"$lt": last_seen}}]},
+                {"$set": {"last_seen": last_seen, "is_online": True}}
+            ))
+
+        try:
+            await self._db.users.bulk_write(operations, ordered=False)
+        except Exception:
+            # Put heartbeats back so the next flush retries them
+            for user_id, seen_at in pending.items():
+                if user_id not in self._pending:
+                    self._pending[user_id] = seen_at
+            raise
+
+        self.flushes += 1
+        self.flushed_users += len(operations)
+        return len(operations)
+
+    def last_seen(self, user: Dict[str, Any]) -> Optional[datetime]:
+        stored = _parse_timestamp(user.get('last_seen'))
+        buffered = self._last_seen.get(user.get('id'))
+        if buffered and (stored is None or buffered > stored):
+            return buffered
+        return stored
+
+    def is_online(self, user: Dict[str, Any]) -> bool:
+        if user.get('id') not in self._last_seen and not user.get('is_online'):
+            return False  # Logged out and no heartbeat since
+        seen_at = self.last_seen(user)
+        if seen_at is None:
+            return False
+        return datetime.now(timezone.utc) - seen_at <= self.online_window
+
+    def apply(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a copy of a user document with live last_seen/is_online values"""
+        seen_at = self.last_seen(user)
+        return {
+            **user,
+            "last_seen": seen_at.isoformat() if seen_at else None,
+            "is_online": self.is_online(user)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_users": len(self._last_seen),
+            "pending": len(self._pending),
+            "flush_interval": self.flush_interval,
+            "online_window": int(self.online_window.total_seconds()),
+            "flushes": self.flushes,
+            "flushed_users": self.flushed_users
+        }
+
+
+# Singleton instance
+presence_tracker = PresenceTracker()
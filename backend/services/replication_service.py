@@ -0,0 +1,324 @@
+# Storage Replication Service
+# Write-through copy of uploaded originals from local disk to the active remote provider
+
+import os
+import uuid
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, Tuple
+
+from services.storage_service import storage_manager
+from services.dedup_service import blob_store
+
+logger = logging.getLogger(__name__)
+
+REPLICATION_WORKERS = int(os.environ.get('REPLICATION_WORKERS', '2'))
+REPLICATION_JOB_MAX_ATTEMPTS = int(os.environ.get('REPLICATION_JOB_MAX_ATTEMPTS', '5'))
+REPLICATION_JOB_LEASE = int(os.environ.get('REPLICATION_JOB_LEASE', '900'))  # seconds
+REPLICATION_POLL_INTERVAL = 30  # seconds
+
+# Delete local originals once they are safely on the remote provider
+STORAGE_RECLAIM_LOCAL = os.environ.get('STORAGE_RECLAIM_LOCAL', 'false').lower() == 'true'
+STORAGE_LOCAL_RETENTION_HOURS = int(os.environ.get('STORAGE_LOCAL_RETENTION_HOURS', '24'))
+RECLAIM_INTERVAL = 3600  # seconds
+
+
+def storage_key(file_item: Dict[str, Any]) -> str:
+    """Provider key for a file: its path below /uploads, e.g. standard/ABC_1.jpg"""
+    return Path(file_item['path']).relative_to('/uploads').as_posix()
+
+
+class StorageReplicator:
+    """Durable background replication of uploaded files to a remote provider.
+
+    Uploads are always written to local disk first; `enqueue` records a job in
+    db.replication_jobs for the provider that is active at that moment. Workers
+    claim jobs with a lease (same scheme as media_jobs), push the file and set
+    files_json.$.storage = {provider, key, url, local, replicated_at}. With
+    STORAGE_RECLAIM_LOCAL the local original is removed after the retention
+    period and fetched back from the provider on demand (`restore`).
+    """
+
+    collection_name = "replication_jobs"
+
+    def __init__(self, manager, workers: int = REPLICATION_WORKERS):
+        self.manager = manager
+        self.workers = max(1, workers)
+        self.upload_dir: Optional[Path] = None
+        self._db = None
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._restoring: Dict[str, asyncio.Lock] = {}
+        self.replicated = 0
+        self.failed = 0
+        self.reclaimed_bytes = 0
+
+    def configure(self, upload_dir: Path) -> None:
+        self.upload_dir = upload_dir
+
+    def local_path(self, file_item: Dict[str, Any]) -> Path:
+        return self.upload_dir / storage_key(file_item)
+
+    async def ensure_indexes(self, db) -> None:
+        await db[self.collection_name].create_index([("record_id", 1), ("file_id", 1)], unique=True)
+        await db[self.collection_name].create_index([("status", 1), ("lease_until", 1)])
+        await db.uploads.create_index("files_json.path")
+
+    def start(self, db) -> None:
+        self._db = db
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._reclaim_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def enqueue(self, db, record_id: str, file_item: Dict[str, Any], provider_name: str = None) -> None:
+        provider_name = provider_name or self.manager.active_provider
+        if provider_name == 'local':
+            return
+        now = datetime.now(timezone.utc)
+        await db[self.collection_name].update_one(
+            {"record_id": record_id, "file_id": file_item['id']},
+            {"$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "provider": provider_name,
+                "path": file_item['path'],
+                "status": "pending",
+                "attempts": 0,
+                "lease_until": now,
+                "created_at": now.isoformat()
+            }},
+            upsert=True
+        )
+        self._wakeup.set()
+
+    async def enqueue_missing(self, db) -> int:
+        """Queue files that are still only on local disk for the active provider"""
+        if self.manager.active_provider == 'local':
+            return 0
+        count = 0
+        local_only = {"$or": [{"storage": {"$exists": False}}, {"storage.provider": "local"}]}
+        async for record in db.uploads.find({"files_json": {"$elemMatch": local_only}},
+                                            {"_id": 0, "id": 1, "files_json": 1}):
+            for file_item in record.get('files_json', []):
+                if (file_item.get('storage') or {}).get('provider', 'local') == 'local':
+                    await self.enqueue(db, record['id'], file_item)
+                    count += 1
+        if count:
+            logger.info(f"Queued {count} files for replication to {self.manager.active_provider}")
+        return count
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        from pymongo import ReturnDocument
+
+        now = datetime.now(timezone.utc)
+        return await self._db[self.collection_name].find_one_and_update(
+            {"status": {"$in": ["pending", "running"]}, "lease_until": {"$lte": now}},
+            {
+                "$set": {"status": "running", "lease_until": now + timedelta(seconds=REPLICATION_JOB_LEASE)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("lease_until", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Replication job claim error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=REPLICATION_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job)
+
+    async def _renew_lease(self, job: Dict[str, Any]) -> None:
+        """Keep extending the lease while a large upload is running"""
+        while True:
+            await asyncio.sleep(REPLICATION_JOB_LEASE / 2)
+            await self._db[self.collection_name].update_one(
+                {"_id": job["_id"]},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=REPLICATION_JOB_LEASE)}}
+            )
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        jobs = self._db[self.collection_name]
+        renewer = asyncio.create_task(self._renew_lease(job))
+        try:
+            provider = self.manager.providers.get(job['provider'])
+            if provider is None or not provider.is_configured():
+                raise RuntimeError(f"Provider {job['provider']} not configured")
+            source = self.local_path(job)
+            if not source.exists():
+                raise FileNotFoundError(str(source))
+
+            key = storage_key(job)
+            success, url, error = await provider.upload_file(str(source), key)
+            if not success:
+                raise RuntimeError(error)
+
+            result = await self._db.uploads.update_one(
+                {"id": job['record_id'], "files_json.id": job['file_id']},
+                {"$set": {"files_json.$.storage": {
+                    "provider": job['provider'],
+                    "key": key,
+                    "url": url,
+                    "local": True,
+                    "replicated_at": datetime.now(timezone.utc).isoformat()
+                }}}
+            )
+            if result.matched_count == 0:
+                # File was deleted while uploading
+                await provider.delete_file(key)
+            await jobs.delete_one({"_id": job["_id"]})
+            self.replicated += 1
+        except Exception as e:
+            logger.error(f"Replication job {job['id']} ({job['path']} -> {job['provider']}) failed: {e}")
+            exhausted = job.get('attempts', 0) >= REPLICATION_JOB_MAX_ATTEMPTS or isinstance(e, FileNotFoundError)
+            await jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {
+                    "status": "failed" if exhausted else "pending",
+                    "lease_until": datetime.now(timezone.utc) + timedelta(seconds=60 * 2 ** job.get('attempts', 1)),
+                    "error": str(e)
+                }}
+            )
+            if exhausted:
+                self.failed += 1
+        finally:
+            renewer.cancel()
+
+    async def forget(self, db, record_id: str, file_item: Dict[str, Any]) -> None:
+        """File removed from its record: drop any pending job and the remote copy"""
+        await db[self.collection_name].delete_one({"record_id": record_id, "file_id": file_item['id']})
+        storage = file_item.get('storage') or {}
+        if storage.get('provider', 'local') == 'local':
+            return
+        provider = self.manager.providers.get(storage['provider'])
+        if provider is None:
+            return
+        success, error = await provider.delete_file(storage['key'])
+        if not success:
+            logger.warning(f"Remote delete of {storage['key']} on {storage['provider']} failed: {error}")
+
+    async def locate(self, db, path: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(record_id, file_item) for a /uploads/... path"""
+        record = await db.uploads.find_one({"files_json.path": path}, {"_id": 0, "id": 1, "files_json.$": 1})
+        if not record:
+            return None
+        return record['id'], record['files_json'][0]
+
+    async def restore(self, db, record_id: str, file_item: Dict[str, Any]) -> Optional[Path]:
+        """Fetch a reclaimed original back from its provider onto local disk"""
+        storage = file_item.get('storage') or {}
+        if storage.get('provider', 'local') == 'local':
+            return None
+        provider = self.manager.providers.get(storage['provider'])
+        if provider is None:
+            return None
+        destination = self.local_path(file_item)
+        lock = self._restoring.setdefault(file_item['id'], asyncio.Lock())
+        async with lock:
+            try:
+                if not destination.exists():
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    # The served path only appears once complete; a failed download leaves nothing behind
+                    partial = destination.with_suffix(destination.suffix + '.part')
+                    try:
+                        success, error = await provider.download_file(storage['key'], str(partial))
+                        if success:
+                            os.replace(partial, destination)
+                    finally:
+                        partial.unlink(missing_ok=True)
+                    if not success:
+                        logger.error(f"Restore of {storage['key']} from {storage['provider']} failed: {error}")
+                        return None
+                    await db.uploads.update_one(
+                        {"id": record_id, "files_json.id": file_item['id']},
+                        {"$set": {"files_json.$.storage.local": True,
+                                  "files_json.$.storage.restored_at": datetime.now(timezone.utc).isoformat()}}
+                    )
+            finally:
+                self._restoring.pop(file_item['id'], None)
+        return destination
+
+    async def _reclaim_loop(self) -> None:
+        while True:
+            try:
+                await self.reclaim(self._db)
+            except Exception as e:
+                logger.error(f"Local storage reclaim error: {e}")
+            await asyncio.sleep(RECLAIM_INTERVAL)
+
+    async def reclaim(self, db, retention_hours: int = STORAGE_LOCAL_RETENTION_HOURS) -> int:
+        """Remove local originals replicated (or restored) more than retention_hours ago"""
+        if not STORAGE_RECLAIM_LOCAL:
+            return 0
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=retention_hours)).isoformat()
+        candidate = {"storage.local": True, "storage.provider": {"$ne": "local"}}
+        count = 0
+        async for record in db.uploads.find({"files_json": {"$elemMatch": candidate}},
+                                            {"_id": 0, "id": 1, "files_json": 1}):
+            for file_item in record.get('files_json', []):
+                storage = file_item.get('storage') or {}
+                if storage.get('provider', 'local') == 'local' or not storage.get('local'):
+                    continue
+                if max(storage.get('replicated_at') or '', storage.get('restored_at') or '') > cutoff:
+                    continue
+                # Derived media is generated from the local original; keep it until that is done
+                if await db.media_jobs.count_documents(
+                    {"record_id": record['id'], "file_id": file_item['id'], "status": {"$in": ["pending", "running"]}},
+                    limit=1
+                ):
+                    continue
+                path = self.local_path(file_item)
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    self.reclaimed_bytes += size
+                except FileNotFoundError:
+                    pass
+                if file_item.get('blob'):
+                    blob_store.prune_local(file_item['blob'])
+                await db.uploads.update_one(
+                    {"id": record['id'], "files_json.id": file_item['id']},
+                    {"$set": {"files_json.$.storage.local": False}}
+                )
+                count += 1
+        if count:
+            logger.info(f"Reclaimed {count} local originals already stored remotely")
+        return count
+
+    async def get_stats(self, db) -> Dict[str, Any]:
+        pending = await db[self.collection_name].count_documents({"status": {"$in": ["pending", "running"]}})
+        failed = await db[self.collection_name].count_documents({"status": "failed"})
+        return {
+            "workers": self.workers,
+            "active_provider": self.manager.active_provider,
+            "queued": pending,
+            "failed_jobs": failed,
+            "replicated": self.replicated,
+            "failed": self.failed,
+            "reclaim_local": STORAGE_RECLAIM_LOCAL,
+            "reclaimed_bytes": self.reclaimed_bytes
+        }
+
+
+# Singleton instance (upload_dir is set by server.py)
+storage_replicator = StorageReplicator(storage_manager)
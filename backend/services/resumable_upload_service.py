@@ -0,0 +1,212 @@
+# Resumable Upload Service
+# init / append-chunk / complete protocol for large uploads over unreliable links
+
+import os
+import uuid
+import hashlib
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, Tuple
+
+import aiofiles
+
+from services.upload_service import file_sha256
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE_CHUNK_SIZE = int(os.environ.get('RESUMABLE_CHUNK_SIZE', str(5 * 1024 * 1024)))  # 5MB
+RESUMABLE_SESSION_TTL = int(os.environ.get('RESUMABLE_SESSION_TTL', str(24 * 3600)))  # seconds
+RESUMABLE_CLEANUP_INTERVAL = 3600  # seconds
+
+_READ_SIZE = 1024 * 1024
+
+
+class ResumableUploadError(Exception):
+    """Protocol error; status_code/detail map directly onto an HTTPException"""
+
+    def __init__(self, status_code: int, detail: str, offset: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.offset = offset
+
+
+class ResumableUploadManager:
+    """Upload sessions stored in db.upload_sessions with bytes in a .part file.
+
+    The session's `offset` is the number of bytes durably received. A chunk is
+    accepted only at exactly that offset, is verified against its SHA-256, and
+    the offset is advanced with a conditional update, so a retry after a dropped
+    connection just asks for the current offset and resends from there.
+    """
+
+    collection_name = "upload_sessions"
+
+    def __init__(self, partial_dir: Optional[Path] = None, chunk_size: int = RESUMABLE_CHUNK_SIZE,
+                 session_ttl: int = RESUMABLE_SESSION_TTL):
+        self.partial_dir = partial_dir
+        self.chunk_size = chunk_size
+        self.session_ttl = session_ttl
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, partial_dir: Path) -> None:
+        self.partial_dir = partial_dir
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.partial_dir / f"{upload_id}.part"
+
+    async def ensure_indexes(self, db) -> None:
+        await db[self.collection_name].create_index("id", unique=True)
+        await db[self.collection_name].create_index("expires_at")
+
+    def start(self, db) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, db) -> None:
+        while True:
+            try:
+                await self.cleanup_expired(db)
+            except Exception as e:
+                logger.error(f"Resumable upload cleanup error: {e}")
+            await asyncio.sleep(RESUMABLE_CLEANUP_INTERVAL)
+
+    async def create(self, db, record_id: str, user_id: str, filename: str, media_type: str,
+                     total_size: int, sha256: Optional[str] = None) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        session = {
+            "id": str(uuid.uuid4()),
+            "record_id": record_id,
+            "user_id": user_id,
+            "filename": filename,
+            "media_type": media_type,
+            "total_size": total_size,
+            "sha256": sha256.lower() if sha256 else None,
+            "offset": 0,
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "expires_at": now + timedelta(seconds=self.session_ttl)
+        }
+        self.part_path(session['id']).touch()
+        await db[self.collection_name].insert_one(session)
+        del session['_id']
+        return session
+
+    async def get(self, db, upload_id: str, user_id: str) -> Dict[str, Any]:
+        session = await db[self.collection_name].find_one({"id": upload_id, "user_id": user_id}, {"_id": 0})
+        if not session:
+            raise ResumableUploadError(404, "Yükleme oturumu bulunamadı")
+        return session
+
+    async def append_chunk(self, db, upload_id: str, user_id: str, offset: int, chunk,
+                           checksum: Optional[str] = None) -> Dict[str, Any]:
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            session = await self.get(db, upload_id, user_id)
+            if offset != session['offset']:
+                raise ResumableUploadError(409, "Geçersiz offset", offset=session['offset'])
+
+            written, digest = await self._write_chunk(self.part_path(upload_id), offset, chunk,
+                                                      session['total_size'] - offset)
+            if checksum and digest != checksum.lower():
+                await asyncio.to_thread(os.truncate, self.part_path(upload_id), offset)
+                raise ResumableUploadError(400, "Parça sağlama toplamı eşleşmiyor", offset=offset)
+
+            new_offset = offset + written
+            result = await db[self.collection_name].update_one(
+                {"id": upload_id, "offset": offset},
+                {"$set": {
+                    "offset": new_offset,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.session_ttl)
+                }}
+            )
+            if result.modified_count == 0:
+                current = await self.get(db, upload_id, user_id)
+                raise ResumableUploadError(409, "Geçersiz offset", offset=current['offset'])
+
+            session['offset'] = new_offset
+            return session
+
+    async def _write_chunk(self, path: Path, offset: int, chunk, remaining: int) -> Tuple[int, str]:
+        """Write the chunk at offset, discarding anything after it. Returns (bytes, sha256)."""
+        digest = hashlib.sha256()
+        written = 0
+        async with aiofiles.open(path, 'r+b') as out:
+            await out.seek(offset)
+            while True:
+                data = await chunk.read(_READ_SIZE)
+                if not data:
+                    break
+                written += len(data)
+                if written > self.chunk_size or written > remaining:
+                    await out.truncate(offset)
+                    raise ResumableUploadError(400, "Parça çok büyük", offset=offset)
+                digest.update(data)
+                await out.write(data)
+            await out.truncate(offset + written)
+        return written, digest.hexdigest()
+
+    async def complete(self, db, upload_id: str, user_id: str, dest_path: Path) -> Tuple[Dict[str, Any], str]:
+        """Verify the assembled file and move it to dest_path. Returns (session, sha256)."""
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            session = await self.get(db, upload_id, user_id)
+            if session['offset'] != session['total_size']:
+                raise ResumableUploadError(409, "Yükleme tamamlanmadı", offset=session['offset'])
+
+            part_path = self.part_path(upload_id)
+            checksum = await asyncio.to_thread(file_sha256, part_path)
+            if session.get('sha256') and checksum != session['sha256']:
+                # Start the session over so the client can resend instead of being stuck at offset == total
+                await asyncio.to_thread(os.truncate, part_path, 0)
+                await db[self.collection_name].update_one(
+                    {"id": upload_id},
+                    {"$set": {"offset": 0, "updated_at": datetime.now(timezone.utc).isoformat()}}
+                )
+                raise ResumableUploadError(400, "Dosya sağlama toplamı eşleşmiyor, yükleme baştan başlamalı", offset=0)
+
+            os.replace(part_path, dest_path)
+            await db[self.collection_name].delete_one({"id": upload_id})
+        self._locks.pop(upload_id, None)
+        return session, checksum
+
+    async def abort(self, db, upload_id: str, user_id: str) -> None:
+        await self.get(db, upload_id, user_id)
+        await db[self.collection_name].delete_one({"id": upload_id})
+        self._remove_part(upload_id)
+
+    def _remove_part(self, upload_id: str) -> None:
+        self._locks.pop(upload_id, None)
+        try:
+            os.remove(self.part_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    async def cleanup_expired(self, db) -> int:
+        expired = await db[self.collection_name].find(
+            {"expires_at": {"$lt": datetime.now(timezone.utc)}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        for session in expired:
+            self._remove_part(session['id'])
+        if expired:
+            await db[self.collection_name].delete_many({"id": {"$in": [s['id'] for s in expired]}})
+            logger.info(f"Removed {len(expired)} expired upload sessions")
+        return len(expired)
+
+
+# Singleton instance (partial_dir is set by server.py)
+resumable_uploads = ResumableUploadManager()
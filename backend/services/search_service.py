@@ -0,0 +1,88 @@
+# Record Search Index
+# Normalized n-gram tokens stored on each record so searches can use an index
+
+import os
+import re
+import logging
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+SEARCH_NGRAM_SIZE = int(os.environ.get('SEARCH_NGRAM_SIZE', '3'))
+
+# Fields matched by the search box on the records list
+SEARCH_FIELDS = ["plate", "work_order", "vin", "vin_last5", "reference_no", "case_key"]
+
+_NORMALIZE_RE = re.compile(r'[\W_]+')
+
+
+class RecordSearchIndex:
+    """Builds and queries the `search_grams` / `search_text` fields of uploads.
+
+    Every searchable value is normalized (upper-cased, punctuation and spaces
+    removed) and split into n-grams. The grams near the end of a value are
+    kept even when shorter than n, so any substring up to n characters is the
+    prefix of some gram and can be found with an anchored regex on the index.
+    Longer searches require all of their n-grams (`$all`), then `search_text`
+    confirms that they appear contiguously.
+    """
+
+    def __init__(self, ngram_size: int = SEARCH_NGRAM_SIZE):
+        self.ngram_size = max(2, ngram_size)
+
+    @staticmethod
+    def normalize(value: str) -> str:
+        return _NORMALIZE_RE.sub('', (value or '').upper())
+
+    def _grams(self, value: str) -> List[str]:
+        n = self.ngram_size
+        return [value[i:i + n] for i in range(len(value))]
+
+    def build_fields(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """search_grams/search_text values for a record document"""
+        values = [self.normalize(record.get(field)) for field in SEARCH_FIELDS]
+        values = [v for v in values if v]
+        grams = set()
+        for value in values:
+            grams.update(self._grams(value))
+        return {
+            "search_grams": sorted(grams),
+            "search_text": "|".join(values)
+        }
+
+    def build_query(self, search: str) -> Dict[str, Any]:
+        """Mongo filter equivalent to a case-insensitive substring search"""
+        term = self.normalize(search)
+        if not term:
+            return {}
+        if len(term) <= self.ngram_size:
+            return {"search_grams": {"$regex": f"^{re.escape(term)}"}}
+        return {
+            "search_grams": {"$all": sorted(set(self._grams(term)[:len(term) - self.ngram_size + 1]))},
+            "search_text": {"$regex": re.escape(term)}
+        }
+
+    async def backfill(self, db, batch_size: int = 500) -> int:
+        """Add search fields to records created before the index existed"""
+        from pymongo import UpdateOne
+
+        updated = 0
+        projection = {"_id": 1, **{field: 1 for field in SEARCH_FIELDS}}
+        while True:
+            batch = await db.uploads.find(
+                {"search_grams": {"$exists": False}}, projection
+            ).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            await db.uploads.bulk_write(
+                [UpdateOne({"_id": doc["_id"]}, {"$set": self.build_fields(doc)}) for doc in batch],
+                ordered=False
+            )
+            updated += len(batch)
+        if updated:
+            logger.info(f"Search index backfilled for {updated} records")
+        return updated
+
+
+# Singleton instance
+record_search = RecordSearchIndex()
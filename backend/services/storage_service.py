@@ -2,38 +2,71 @@
 # Supports: Local, S3, Google Drive, FTP, OneDrive
 
 import os
+import errno
+import shutil
 import logging
 import asyncio
+import ftplib
+import socket
+import threading
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple, Dict, Any
 from abc import ABC, abstractmethod
-from datetime import datetime, timezone
 import aiofiles
 import uuid
 
 logger = logging.getLogger(__name__)
 
 # Environment variables for storage providers
+LOCAL_STORAGE_HARDLINKS = os.environ.get('LOCAL_STORAGE_HARDLINKS', 'true').lower() == 'true'
+LOCAL_COPY_BLOCK = 64 * 1024 * 1024  # bytes per copy_file_range/sendfile call
+
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_REGION = os.environ.get('AWS_REGION', 'eu-central-1')
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None  # MinIO / moto server / other S3-compatible; unset or empty = AWS
+S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', str(8 * 1024 * 1024)))
+S3_PART_CONCURRENCY = int(os.environ.get('S3_PART_CONCURRENCY', '8'))  # parts in flight per transfer
+S3_MAX_TRANSFERS = int(os.environ.get('S3_MAX_TRANSFERS', '4'))  # concurrent transfers per process
 
 GOOGLE_DRIVE_CREDENTIALS = os.environ.get('GOOGLE_DRIVE_CREDENTIALS')
 GOOGLE_DRIVE_FOLDER_ID = os.environ.get('GOOGLE_DRIVE_FOLDER_ID')
+GOOGLE_DRIVE_CHUNK_SIZE = int(os.environ.get('GOOGLE_DRIVE_CHUNK_SIZE', str(8 * 1024 * 1024)))  # multiple of 256 KiB
+GOOGLE_DRIVE_MAX_TRANSFERS = int(os.environ.get('GOOGLE_DRIVE_MAX_TRANSFERS', '4'))
 
 FTP_HOST = os.environ.get('FTP_HOST')
 FTP_USER = os.environ.get('FTP_USER')
 FTP_PASSWORD = os.environ.get('FTP_PASSWORD')
 FTP_PATH = os.environ.get('FTP_PATH', '/uploads')
+FTP_PORT = int(os.environ.get('FTP_PORT', '21'))
+FTP_POOL_SIZE = int(os.environ.get('FTP_POOL_SIZE', '4'))  # max logged-in sessions / concurrent transfers
+FTP_TIMEOUT = int(os.environ.get('FTP_TIMEOUT', '30'))
+FTP_HEALTH_CHECK_AFTER = int(os.environ.get('FTP_HEALTH_CHECK_AFTER', '30'))  # NOOP sessions idle longer than this
+FTP_MAX_IDLE = int(os.environ.get('FTP_MAX_IDLE', '240'))  # close sessions idle longer (servers drop at ~300s)
 
 ONEDRIVE_CLIENT_ID = os.environ.get('ONEDRIVE_CLIENT_ID')
 ONEDRIVE_CLIENT_SECRET = os.environ.get('ONEDRIVE_CLIENT_SECRET')
 ONEDRIVE_FOLDER_PATH = os.environ.get('ONEDRIVE_FOLDER_PATH', '/RTKayit')
+ONEDRIVE_TENANT_ID = os.environ.get('ONEDRIVE_TENANT_ID', 'common')
+ONEDRIVE_DRIVE_PATH = os.environ.get('ONEDRIVE_DRIVE_PATH', '/me/drive')  # or /users/{id}/drive, /drives/{id}
+ONEDRIVE_AUTHORITY_URL = os.environ.get('ONEDRIVE_AUTHORITY_URL', 'https://login.microsoftonline.com')
+ONEDRIVE_GRAPH_URL = os.environ.get('ONEDRIVE_GRAPH_URL', 'https://graph.microsoft.com/v1.0')
+ONEDRIVE_SIMPLE_UPLOAD_MAX = 4 * 1024 * 1024  # Graph limit for a single PUT
+ONEDRIVE_CHUNK_SIZE = int(os.environ.get('ONEDRIVE_CHUNK_SIZE', str(32 * 320 * 1024)))  # multiple of 320 KiB
+ONEDRIVE_TOKEN_REFRESH_MARGIN = 300  # seconds before expiry
+ONEDRIVE_MAX_CONNECTIONS = int(os.environ.get('ONEDRIVE_MAX_CONNECTIONS', '16'))
 
 
 class StorageProvider(ABC):
     """Abstract base class for storage providers"""
     
+    # get_file_url returns a URL a browser can fetch the bytes from directly
+    serves_direct_urls = False
+    
     @abstractmethod
     async def upload_file(self, file_path: str, destination: str) -> Tuple[bool, Optional[str], Optional[str]]:
         """Upload a file. Returns (success, url, error)"""
@@ -60,26 +93,107 @@ class StorageProvider(ABC):
         pass
 
 
+def _copy_fd(in_fd: int, out_fd: int, size: int) -> None:
+    """Kernel-side copy: copy_file_range (reflink-capable), then sendfile, then userspace"""
+    offset = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(in_fd, out_fd, min(LOCAL_COPY_BLOCK, size - offset))
+                if copied == 0:
+                    break
+                offset += copied
+            if offset >= size:
+                return
+        except OSError as e:
+            # Unsupported for this pair of filesystems/kernel; resume where we got to
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                raise
+    try:
+        while offset < size:
+            sent = os.sendfile(out_fd, in_fd, offset, min(LOCAL_COPY_BLOCK, size - offset))
+            if sent == 0:
+                break
+            offset += sent
+        if offset >= size:
+            return
+    except OSError as e:
+        if e.errno not in (errno.EINVAL, errno.ENOSYS):
+            raise
+    os.lseek(in_fd, offset, os.SEEK_SET)
+    os.lseek(out_fd, offset, os.SEEK_SET)
+    with open(in_fd, 'rb', closefd=False) as src, open(out_fd, 'wb', closefd=False) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def place_file(src: str, dst: str, move: bool = False, link: bool = LOCAL_STORAGE_HARDLINKS) -> str:
+    """
+    Put src at dst atomically without passing the bytes through Python.
+
+    move: rename (same filesystem), else copy + unlink. Otherwise a hard link is
+    tried first when `link` is set (identical content, no extra space), falling
+    back to a kernel-side copy. dst only ever appears complete. Blocking - run it
+    in a thread. Returns the method used: "rename", "link" or "copy".
+    """
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    if move:
+        try:
+            os.replace(src, dst)
+            return "rename"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    
+    temp_path = f"{dst}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        if link and not move:
+            try:
+                os.link(src, temp_path)
+                os.replace(temp_path, dst)
+                return "link"
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+        with open(src, 'rb') as fsrc, open(temp_path, 'wb') as fdst:
+            _copy_fd(fsrc.fileno(), fdst.fileno(), os.fstat(fsrc.fileno()).st_size)
+        os.replace(temp_path, dst)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+    if move:
+        os.remove(src)
+    return "copy"
+
+
 class LocalStorageProvider(StorageProvider):
-    """Local file system storage"""
+    """Local file system storage.
+
+    Files are placed with `place_file`: rename for moves, hard links for copies
+    on the same filesystem and copy_file_range/sendfile across devices, always on
+    a worker thread so the event loop never touches file contents.
+    """
     
-    def __init__(self, base_path: str = "/app/uploads"):
+    def __init__(self, base_path: str = "/app/uploads", hardlinks: bool = LOCAL_STORAGE_HARDLINKS):
         self.base_path = base_path
+        self.hardlinks = hardlinks
         os.makedirs(base_path, exist_ok=True)
     
     def is_configured(self) -> bool:
         return True
     
-    async def upload_file(self, file_path: str, destination: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    async def upload_file(self, file_path: str, destination: str,
+                          move: bool = False) -> Tuple[bool, Optional[str], Optional[str]]:
+        """move=True hands file_path over to storage (renamed away instead of copied)"""
         try:
             dest_path = os.path.join(self.base_path, destination)
-            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-            
-            async with aiofiles.open(file_path, 'rb') as src:
-                content = await src.read()
-            async with aiofiles.open(dest_path, 'wb') as dst:
-                await dst.write(content)
-            
+            await asyncio.to_thread(place_file, file_path, dest_path, move, self.hardlinks)
             return True, f"/uploads/{destination}", None
         except Exception as e:
             logger.error(f"Local upload error: {e}")
@@ -88,10 +202,7 @@ class LocalStorageProvider(StorageProvider):
     async def download_file(self, file_key: str, destination: str) -> Tuple[bool, Optional[str]]:
         try:
             src_path = os.path.join(self.base_path, file_key)
-            async with aiofiles.open(src_path, 'rb') as src:
-                content = await src.read()
-            async with aiofiles.open(destination, 'wb') as dst:
-                await dst.write(content)
+            await asyncio.to_thread(place_file, src_path, destination, False, self.hardlinks)
             return True, None
         except Exception as e:
             logger.error(f"Local download error: {e}")
@@ -112,37 +223,79 @@ class LocalStorageProvider(StorageProvider):
 
 
 class S3StorageProvider(StorageProvider):
-    """AWS S3 storage provider"""
-    
-    def __init__(self):
+    """AWS S3 (or S3-compatible) storage provider.
+
+    boto3 is blocking, so every call runs on a dedicated executor sized by
+    S3_MAX_TRANSFERS. Uploads/downloads go through s3transfer: files above
+    S3_MULTIPART_THRESHOLD are split into parts and S3_PART_CONCURRENCY parts
+    are sent or fetched in parallel, streaming from/to disk. The single client
+    shares one urllib3 connection pool across all transfers.
+    """
+    
+    serves_direct_urls = True  # presigned GET
+    
+    def __init__(self, bucket: str = None, region: str = None, access_key: str = None,
+                 secret_key: str = None, endpoint_url: str = None):
+        self.bucket = bucket or S3_BUCKET_NAME
+        self.region = region or AWS_REGION
+        self.access_key = access_key or AWS_ACCESS_KEY_ID
+        self.secret_key = secret_key or AWS_SECRET_ACCESS_KEY
+        self.endpoint_url = endpoint_url or S3_ENDPOINT_URL or None
         self.client = None
+        self.transfer_config = None
+        self._executor = None
         if self.is_configured():
             try:
                 import boto3
+                from botocore.config import Config
+                from boto3.s3.transfer import TransferConfig
+                
                 self.client = boto3.client(
                     's3',
-                    region_name=AWS_REGION,
-                    aws_access_key_id=AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY
+                    region_name=self.region,
+                    endpoint_url=self.endpoint_url,
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    config=Config(
+                        max_pool_connections=S3_MAX_TRANSFERS * S3_PART_CONCURRENCY + 4,
+                        retries={'max_attempts': 5, 'mode': 'adaptive'}
+                    )
+                )
+                self.transfer_config = TransferConfig(
+                    multipart_threshold=S3_MULTIPART_THRESHOLD,
+                    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+                    max_concurrency=S3_PART_CONCURRENCY,
+                    use_threads=True
                 )
+                self._executor = ThreadPoolExecutor(max_workers=S3_MAX_TRANSFERS, thread_name_prefix='s3')
             except Exception as e:
                 logger.error(f"S3 client init error: {e}")
     
     def is_configured(self) -> bool:
-        return all([AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, S3_BUCKET_NAME])
+        return all([self.access_key, self.secret_key, self.bucket])
+    
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def _object_url(self, key: str) -> str:
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
     
     async def upload_file(self, file_path: str, destination: str) -> Tuple[bool, Optional[str], Optional[str]]:
         if not self.client:
             return False, None, "S3 not configured"
         try:
-            self.client.upload_file(
+            await self._run(
+                self.client.upload_file,
                 file_path,
-                S3_BUCKET_NAME,
+                self.bucket,
                 destination,
-                ExtraArgs={'ServerSideEncryption': 'AES256'}
+                ExtraArgs={'ServerSideEncryption': 'AES256'},
+                Config=self.transfer_config
             )
-            url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{destination}"
-            return True, url, None
+            return True, self._object_url(destination), None
         except Exception as e:
             logger.error(f"S3 upload error: {e}")
             return False, None, str(e)
@@ -151,7 +304,14 @@ class S3StorageProvider(StorageProvider):
         if not self.client:
             return False, "S3 not configured"
         try:
-            self.client.download_file(S3_BUCKET_NAME, file_key, destination)
+            # Ranged GETs written straight to disk; memory stays at a few parts
+            await self._run(
+                self.client.download_file,
+                self.bucket,
+                file_key,
+                destination,
+                Config=self.transfer_config
+            )
             return True, None
         except Exception as e:
             logger.error(f"S3 download error: {e}")
@@ -161,7 +321,7 @@ class S3StorageProvider(StorageProvider):
         if not self.client:
             return False, "S3 not configured"
         try:
-            self.client.delete_object(Bucket=S3_BUCKET_NAME, Key=file_key)
+            await self._run(self.client.delete_object, Bucket=self.bucket, Key=file_key)
             return True, None
         except Exception as e:
             logger.error(f"S3 delete error: {e}")
@@ -171,9 +331,11 @@ class S3StorageProvider(StorageProvider):
         if not self.client:
             return None
         try:
-            url = self.client.generate_presigned_url(
+            # Presigning is local (no network), but credential refresh can block
+            url = await self._run(
+                self.client.generate_presigned_url,
                 'get_object',
-                Params={'Bucket': S3_BUCKET_NAME, 'Key': file_key},
+                Params={'Bucket': self.bucket, 'Key': file_key},
                 ExpiresIn=expires_in
             )
             return url
@@ -183,45 +345,115 @@ class S3StorageProvider(StorageProvider):
 
 
 class GoogleDriveStorageProvider(StorageProvider):
-    """Google Drive storage provider"""
+    """Google Drive storage provider.
+
+    googleapiclient is blocking and its httplib2 transport is not thread-safe, so
+    calls run on a GOOGLE_DRIVE_MAX_TRANSFERS-thread executor (the transfer limit
+    shared by every request) and each worker thread builds its own Drive service.
+    Downloads are written chunk by chunk to a `.part` file next to the destination,
+    so memory stays at one GOOGLE_DRIVE_CHUNK_SIZE chunk per transfer; running
+    downloads and their progress are listed in /services/status.
+
+    Uploads are tagged with their destination as an appProperty, so keys
+    containing '/' are looked up by that tag; anything else is a Drive file id.
+    """
     
-    def __init__(self):
+    def __init__(self, chunk_size: int = GOOGLE_DRIVE_CHUNK_SIZE):
         self.service = None
+        self.credentials = None
+        self.chunk_size = chunk_size
+        self.transfers: Dict[str, Dict[str, Any]] = {}  # destination -> progress of running downloads
+        self._local = threading.local()
+        self._executor = None
         if self.is_configured():
             try:
                 from google.oauth2 import service_account
-                from googleapiclient.discovery import build
                 import json
                 
                 creds_dict = json.loads(GOOGLE_DRIVE_CREDENTIALS)
-                creds = service_account.Credentials.from_service_account_info(
+                self.credentials = service_account.Credentials.from_service_account_info(
                     creds_dict,
                     scopes=['https://www.googleapis.com/auth/drive.file']
                 )
-                self.service = build('drive', 'v3', credentials=creds)
+                self.service = self._build_service()
+                self._executor = ThreadPoolExecutor(max_workers=GOOGLE_DRIVE_MAX_TRANSFERS, thread_name_prefix='gdrive')
             except Exception as e:
                 logger.error(f"Google Drive init error: {e}")
     
     def is_configured(self) -> bool:
         return bool(GOOGLE_DRIVE_CREDENTIALS)
     
+    def _build_service(self):
+        from googleapiclient.discovery import build
+        return build('drive', 'v3', credentials=self.credentials, cache_discovery=False)
+    
+    def _thread_service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = self._build_service()
+        return service
+    
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def _upload(self, file_path: str, destination: str) -> Dict[str, Any]:
+        from googleapiclient.http import MediaFileUpload
+        
+        file_metadata = {
+            'name': os.path.basename(destination),
+            'parents': [GOOGLE_DRIVE_FOLDER_ID] if GOOGLE_DRIVE_FOLDER_ID else [],
+            'appProperties': {'rt_key': destination}
+        }
+        media = MediaFileUpload(file_path, chunksize=self.chunk_size, resumable=True)
+        return self._thread_service().files().create(
+            body=file_metadata,
+            media_body=media,
+            fields='id, webViewLink'
+        ).execute(num_retries=3)
+    
+    def _resolve(self, file_key: str) -> str:
+        if '/' not in file_key:
+            return file_key
+        escaped = file_key.replace('\\', '\\\\').replace("'", "\\'")
+        result = self._thread_service().files().list(
+            q=f"appProperties has {{ key='rt_key' and value='{escaped}' }} and trashed = false",
+            fields='files(id)', pageSize=1
+        ).execute()
+        files = result.get('files') or []
+        if not files:
+            raise FileNotFoundError(file_key)
+        return files[0]['id']
+    
+    def _download(self, file_key: str, destination: str) -> None:
+        from googleapiclient.http import MediaIoBaseDownload
+        
+        request = self._thread_service().files().get_media(fileId=self._resolve(file_key))
+        temp_path = f"{destination}.part"
+        state = self.transfers[destination] = {"file_key": file_key, "done": 0, "total": None}
+        try:
+            with open(temp_path, 'wb') as f:
+                downloader = MediaIoBaseDownload(f, request, chunksize=self.chunk_size)
+                done = False
+                while not done:
+                    status, done = downloader.next_chunk(num_retries=3)
+                    if status:
+                        state["done"], state["total"] = status.resumable_progress, status.total_size
+            os.replace(temp_path, destination)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        finally:
+            self.transfers.pop(destination, None)
+    
     async def upload_file(self, file_path: str, destination: str) -> Tuple[bool, Optional[str], Optional[str]]:
         if not self.service:
             return False, None, "Google Drive not configured"
         try:
-            from googleapiclient.http import MediaFileUpload
-            
-            file_metadata = {
-                'name': os.path.basename(destination),
-                'parents': [GOOGLE_DRIVE_FOLDER_ID] if GOOGLE_DRIVE_FOLDER_ID else []
-            }
-            media = MediaFileUpload(file_path, resumable=True)
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id, webViewLink'
-            ).execute()
-            
+            file = await self._run(self._upload, file_path, destination)
             return True, file.get('webViewLink'), None
         except Exception as e:
             logger.error(f"Google Drive upload error: {e}")
@@ -231,18 +463,7 @@ class GoogleDriveStorageProvider(StorageProvider):
         if not self.service:
             return False, "Google Drive not configured"
         try:
-            from googleapiclient.http import MediaIoBaseDownload
-            import io
-            
-            request = self.service.files().get_media(fileId=file_key)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            
-            async with aiofiles.open(destination, 'wb') as f:
-                await f.write(fh.getvalue())
+            await self._run(self._download, file_key, destination)
             return True, None
         except Exception as e:
             logger.error(f"Google Drive download error: {e}")
@@ -252,7 +473,7 @@ class GoogleDriveStorageProvider(StorageProvider):
         if not self.service:
             return False, "Google Drive not configured"
         try:
-            self.service.files().delete(fileId=file_key).execute()
+            await self._run(lambda: self._thread_service().files().delete(fileId=self._resolve(file_key)).execute())
             return True, None
         except Exception as e:
             logger.error(f"Google Drive delete error: {e}")
@@ -262,39 +483,206 @@ class GoogleDriveStorageProvider(StorageProvider):
         if not self.service:
             return None
         try:
-            file = self.service.files().get(fileId=file_key, fields='webViewLink').execute()
+            file = await self._run(
+                lambda: self._thread_service().files().get(fileId=self._resolve(file_key), fields='webViewLink').execute()
+            )
             return file.get('webViewLink')
         except Exception as e:
             logger.error(f"Google Drive URL error: {e}")
             return None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_transfers": GOOGLE_DRIVE_MAX_TRANSFERS,
+            "downloads": list(self.transfers.values())
+        }
+
+
+class FTPConnectionPool:
+    """Logged-in ftplib sessions reused across transfers.
+
+    Sessions are borrowed with `acquire` and handed back with `release`. One idle
+    for more than FTP_HEALTH_CHECK_AFTER gets a NOOP before reuse, and one idle for
+    more than FTP_MAX_IDLE is closed rather than risk a server-side timeout. The
+    control socket has SO_KEEPALIVE so dead peers are noticed. All methods block and
+    must run in a worker thread.
+    """
+    
+    def __init__(self, host: str, user: str, password: str, port: int = 21, timeout: int = FTP_TIMEOUT):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.port = port
+        self.timeout = timeout
+        self._idle = []  # [(ftp, last_used)]
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.health_failures = 0
+    
+    def _connect(self) -> ftplib.FTP:
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        ftp.login(self.user, self.password)
+        with self._lock:
+            self.created += 1
+        return ftp
+    
+    @staticmethod
+    def _close(ftp: ftplib.FTP) -> None:
+        try:
+            ftp.quit()
+        except Exception:
+            ftp.close()
+    
+    def acquire(self) -> ftplib.FTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                ftp, last_used = self._idle.pop()
+            idle_for = time.monotonic() - last_used
+            if idle_for > FTP_MAX_IDLE:
+                self._close(ftp)
+                continue
+            if idle_for > FTP_HEALTH_CHECK_AFTER:
+                try:
+                    ftp.voidcmd('NOOP')
+                except ftplib.all_errors:
+                    with self._lock:
+                        self.health_failures += 1
+                    ftp.close()
+                    continue
+            with self._lock:
+                self.reused += 1
+            return ftp
+        return self._connect()
+    
+    def release(self, ftp: ftplib.FTP, healthy: bool = True) -> None:
+        if not healthy:
+            ftp.close()
+            return
+        with self._lock:
+            self._idle.append((ftp, time.monotonic()))
+    
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for ftp, _ in idle:
+            self._close(ftp)
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "created": self.created,
+                "reused": self.reused,
+                "health_failures": self.health_failures
+            }
 
 
 class FTPStorageProvider(StorageProvider):
-    """FTP storage provider"""
+    """FTP storage provider.
+
+    Transfers run on an executor with FTP_POOL_SIZE threads, which also bounds the
+    number of sessions in the pool. Remote directories known to exist are cached
+    so an upload only issues MKD for path components it has not seen yet.
+    Downloads land in a `.part` file that is renamed into place when complete.
+    """
+    
+    def __init__(self, host: str = None, user: str = None, password: str = None,
+                 path: str = None, port: int = None, pool_size: int = FTP_POOL_SIZE):
+        self.host = host or FTP_HOST
+        self.user = user or FTP_USER
+        self.password = password or FTP_PASSWORD
+        self.path = (path or FTP_PATH).rstrip('/')
+        self.port = port or FTP_PORT
+        self.pool = FTPConnectionPool(self.host, self.user, self.password, self.port)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='ftp')
+        self._known_dirs = set()
     
     def is_configured(self) -> bool:
-        return all([FTP_HOST, FTP_USER, FTP_PASSWORD])
+        return all([self.host, self.user, self.password])
+    
+    def _remote_path(self, key: str) -> str:
+        return f"{self.path}/{key.lstrip('/')}"
+    
+    def _with_connection(self, func, *args):
+        """Run func(ftp, *args) on a pooled session; retry once on a dropped connection"""
+        for attempt in range(2):
+            ftp = self.pool.acquire()
+            try:
+                result = func(ftp, *args)
+            except (ftplib.error_perm, ftplib.error_temp):
+                # Server answered: the session itself is fine
+                self.pool.release(ftp)
+                raise
+            except ftplib.all_errors:
+                self.pool.release(ftp, healthy=False)
+                if attempt:
+                    raise
+                continue
+            self.pool.release(ftp)
+            return result
+    
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._with_connection, func, *args)
+    
+    def _ensure_dir(self, ftp: ftplib.FTP, remote_dir: str) -> None:
+        if not remote_dir or remote_dir in self._known_dirs:
+            return
+        current = ''
+        for part in remote_dir.strip('/').split('/'):
+            current = f"{current}/{part}"
+            if current in self._known_dirs:
+                continue
+            try:
+                ftp.mkd(current)
+            except ftplib.error_perm as e:
+                # 550/521 = already exists (or not permitted; STOR will report that)
+                if not str(e).startswith(('550', '521')):
+                    raise
+            self._known_dirs.add(current)
+    
+    def _store(self, ftp: ftplib.FTP, file_path: str, remote_path: str) -> None:
+        remote_dir = os.path.dirname(remote_path)
+        self._ensure_dir(ftp, remote_dir)
+        try:
+            with open(file_path, 'rb') as f:
+                ftp.storbinary(f'STOR {remote_path}', f)
+        except ftplib.error_perm:
+            # Directory may have been removed behind our back: forget it and retry once
+            if remote_dir not in self._known_dirs:
+                raise
+            for known in [d for d in self._known_dirs if remote_dir == d or remote_dir.startswith(d + '/')]:
+                self._known_dirs.discard(known)
+            self._ensure_dir(ftp, remote_dir)
+            with open(file_path, 'rb') as f:
+                ftp.storbinary(f'STOR {remote_path}', f)
+    
+    @staticmethod
+    def _retrieve(ftp: ftplib.FTP, remote_path: str, destination: str) -> None:
+        temp_path = f"{destination}.part"
+        try:
+            with open(temp_path, 'wb') as f:
+                ftp.retrbinary(f'RETR {remote_path}', f.write)
+            os.replace(temp_path, destination)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
     
     async def upload_file(self, file_path: str, destination: str) -> Tuple[bool, Optional[str], Optional[str]]:
         if not self.is_configured():
             return False, None, "FTP not configured"
         try:
-            import ftplib
-            
-            with ftplib.FTP(FTP_HOST) as ftp:
-                ftp.login(FTP_USER, FTP_PASSWORD)
-                
-                # Create directory if needed
-                remote_dir = os.path.dirname(f"{FTP_PATH}/{destination}")
-                try:
-                    ftp.mkd(remote_dir)
-                except:
-                    pass
-                
-                with open(file_path, 'rb') as f:
-                    ftp.storbinary(f'STOR {FTP_PATH}/{destination}', f)
-            
-            return True, f"ftp://{FTP_HOST}{FTP_PATH}/{destination}", None
+            remote_path = self._remote_path(destination)
+            await self._run(self._store, file_path, remote_path)
+            return True, f"ftp://{self.host}{remote_path}", None
         except Exception as e:
             logger.error(f"FTP upload error: {e}")
             return False, None, str(e)
@@ -303,12 +691,7 @@ class FTPStorageProvider(StorageProvider):
         if not self.is_configured():
             return False, "FTP not configured"
         try:
-            import ftplib
-            
-            with ftplib.FTP(FTP_HOST) as ftp:
-                ftp.login(FTP_USER, FTP_PASSWORD)
-                with open(destination, 'wb') as f:
-                    ftp.retrbinary(f'RETR {FTP_PATH}/{file_key}', f.write)
+            await self._run(self._retrieve, self._remote_path(file_key), destination)
             return True, None
         except Exception as e:
             logger.error(f"FTP download error: {e}")
@@ -318,100 +701,214 @@ class FTPStorageProvider(StorageProvider):
         if not self.is_configured():
             return False, "FTP not configured"
         try:
-            import ftplib
-            
-            with ftplib.FTP(FTP_HOST) as ftp:
-                ftp.login(FTP_USER, FTP_PASSWORD)
-                ftp.delete(f"{FTP_PATH}/{file_key}")
+            await self._run(lambda ftp, path: ftp.delete(path), self._remote_path(file_key))
             return True, None
         except Exception as e:
             logger.error(f"FTP delete error: {e}")
             return False, str(e)
     
     async def get_file_url(self, file_key: str, expires_in: int = 3600) -> Optional[str]:
-        return f"ftp://{FTP_HOST}{FTP_PATH}/{file_key}"
+        return f"ftp://{self.host}{self._remote_path(file_key)}"
+    
+    def close(self) -> None:
+        self.pool.close_all()
+        self._executor.shutdown(wait=False)
 
 
 class OneDriveStorageProvider(StorageProvider):
-    """OneDrive storage provider (Microsoft Graph API)"""
-    
-    def __init__(self):
-        self.access_token = None
-        if self.is_configured():
-            self._get_access_token()
+    """OneDrive storage provider (Microsoft Graph API).
+
+    The client-credentials token is fetched lazily, cached and refreshed
+    ONEDRIVE_TOKEN_REFRESH_MARGIN seconds before it expires (or after a 401).
+    Files up to 4 MB go up in one PUT; larger ones through an upload session in
+    ONEDRIVE_CHUNK_SIZE ranges, resuming from nextExpectedRanges after a failed
+    range. Downloads stream to a `.part` file that is renamed into place when
+    complete. All requests share one aiohttp connection pool (closed at shutdown).
+
+    Keys containing '/' or '.' are paths under ONEDRIVE_FOLDER_PATH, anything
+    else is a drive item id.
+    """
+    
+    def __init__(self, client_id: str = None, client_secret: str = None, tenant_id: str = None,
+                 folder_path: str = None, graph_url: str = None, authority_url: str = None,
+                 drive_path: str = None, chunk_size: int = ONEDRIVE_CHUNK_SIZE):
+        self.client_id = client_id or ONEDRIVE_CLIENT_ID
+        self.client_secret = client_secret or ONEDRIVE_CLIENT_SECRET
+        self.tenant_id = tenant_id or ONEDRIVE_TENANT_ID
+        self.folder_path = (folder_path or ONEDRIVE_FOLDER_PATH).rstrip('/')
+        self.graph_url = (graph_url or ONEDRIVE_GRAPH_URL).rstrip('/')
+        self.authority_url = (authority_url or ONEDRIVE_AUTHORITY_URL).rstrip('/')
+        self.drive_path = drive_path or ONEDRIVE_DRIVE_PATH
+        self.chunk_size = chunk_size
+        self._session = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
     
     def is_configured(self) -> bool:
-        return all([ONEDRIVE_CLIENT_ID, ONEDRIVE_CLIENT_SECRET])
-    
-    def _get_access_token(self):
-        try:
-            import requests
-            
-            token_url = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
+        return all([self.client_id, self.client_secret])
+    
+    def _get_session(self):
+        import aiohttp
+        
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=ONEDRIVE_MAX_CONNECTIONS, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+            )
+        return self._session
+    
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _get_access_token(self, force_refresh: bool = False) -> str:
+        if not force_refresh and self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+        async with self._token_lock:
+            # Another request may have refreshed while we waited
+            if not force_refresh and self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+            token_url = f"{self.authority_url}/{self.tenant_id}/oauth2/v2.0/token"
             data = {
-                'client_id': ONEDRIVE_CLIENT_ID,
-                'client_secret': ONEDRIVE_CLIENT_SECRET,
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
                 'scope': 'https://graph.microsoft.com/.default',
                 'grant_type': 'client_credentials'
             }
-            response = requests.post(token_url, data=data)
-            if response.ok:
-                self.access_token = response.json().get('access_token')
-        except Exception as e:
-            logger.error(f"OneDrive token error: {e}")
+            async with self._get_session().post(token_url, data=data) as response:
+                payload = await response.json(content_type=None)
+                if response.status != 200 or 'access_token' not in payload:
+                    raise RuntimeError(f"OneDrive token error: {payload.get('error_description') or response.status}")
+            self._token = payload['access_token']
+            expires_in = int(payload.get('expires_in', 3600))
+            self._token_expires_at = time.monotonic() + max(expires_in - ONEDRIVE_TOKEN_REFRESH_MARGIN, 0)
+            return self._token
+    
+    async def _request(self, method: str, url: str, **kwargs):
+        """Authorized request; refreshes the token once on 401. Caller must release the response."""
+        for attempt in range(2):
+            token = await self._get_access_token(force_refresh=attempt > 0)
+            headers = {**kwargs.pop('headers', {}), 'Authorization': f'Bearer {token}'}
+            response = await self._get_session().request(method, url, headers=headers, **kwargs)
+            if response.status != 401 or attempt:
+                return response
+            response.release()
+    
+    def _item_url(self, key: str) -> str:
+        if '/' in key or '.' in key:
+            return f"{self.graph_url}{self.drive_path}/root:{self.folder_path}/{key.lstrip('/')}:"
+        return f"{self.graph_url}{self.drive_path}/items/{key}"
     
     async def upload_file(self, file_path: str, destination: str) -> Tuple[bool, Optional[str], Optional[str]]:
-        if not self.access_token:
+        if not self.is_configured():
             return False, None, "OneDrive not configured"
         try:
-            import requests
-            
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            upload_url = f"https://graph.microsoft.com/v1.0/me/drive/root:{ONEDRIVE_FOLDER_PATH}/{destination}:/content"
-            
-            with open(file_path, 'rb') as f:
-                response = requests.put(upload_url, headers=headers, data=f)
-            
-            if response.ok:
-                data = response.json()
-                return True, data.get('webUrl'), None
-            return False, None, response.text
+            size = os.path.getsize(file_path)
+            if size <= ONEDRIVE_SIMPLE_UPLOAD_MAX:
+                async with aiofiles.open(file_path, 'rb') as f:
+                    body = await f.read()
+                response = await self._request('PUT', f"{self._item_url(destination)}/content", data=body)
+                async with response:
+                    if response.status not in (200, 201):
+                        return False, None, await response.text()
+                    item = await response.json()
+            else:
+                item = await self._upload_session(file_path, destination, size)
+            return True, item.get('webUrl'), None
         except Exception as e:
             logger.error(f"OneDrive upload error: {e}")
             return False, None, str(e)
     
+    async def _upload_session(self, file_path: str, destination: str, size: int) -> Dict[str, Any]:
+        import aiohttp
+        
+        response = await self._request(
+            'POST', f"{self._item_url(destination)}/createUploadSession",
+            json={"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+        )
+        async with response:
+            if response.status != 200:
+                raise RuntimeError(await response.text())
+            upload_url = (await response.json())['uploadUrl']
+        
+        session = self._get_session()
+        offset = 0
+        failures = 0
+        try:
+            async with aiofiles.open(file_path, 'rb') as f:
+                while True:
+                    await f.seek(offset)
+                    chunk = await f.read(self.chunk_size)
+                    end = offset + len(chunk) - 1
+                    # The upload URL is pre-authorized; sending a bearer token is rejected
+                    try:
+                        async with session.put(upload_url, data=chunk, headers={
+                            'Content-Length': str(len(chunk)),
+                            'Content-Range': f"bytes {offset}-{end}/{size}"
+                        }) as chunk_response:
+                            if chunk_response.status in (200, 201):
+                                return await chunk_response.json()
+                            if chunk_response.status == 202:
+                                offset = end + 1
+                                failures = 0
+                                continue
+                            error = await chunk_response.text()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        error = str(e)
+                    failures += 1
+                    if failures > 3:
+                        raise RuntimeError(f"OneDrive upload session failed: {error}")
+                    # Ask the server where to resume
+                    await asyncio.sleep(2 ** failures)
+                    async with session.get(upload_url) as status:
+                        ranges = (await status.json()).get('nextExpectedRanges') or [f"{offset}-"]
+                    offset = int(ranges[0].split('-')[0])
+        except BaseException:
+            try:
+                async with session.delete(upload_url):
+                    pass
+            except Exception:
+                pass
+            raise
+    
     async def download_file(self, file_key: str, destination: str) -> Tuple[bool, Optional[str]]:
-        if not self.access_token:
+        if not self.is_configured():
             return False, "OneDrive not configured"
         try:
-            import requests
-            
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            url = f"https://graph.microsoft.com/v1.0/me/drive/items/{file_key}/content"
-            response = requests.get(url, headers=headers)
-            
-            if response.ok:
-                async with aiofiles.open(destination, 'wb') as f:
-                    await f.write(response.content)
-                return True, None
-            return False, response.text
+            # Graph answers with a 302 to a pre-authenticated URL; aiohttp drops the
+            # Authorization header when following it to another host
+            response = await self._request('GET', f"{self._item_url(file_key)}/content")
+            async with response:
+                if response.status != 200:
+                    return False, await response.text()
+                temp_path = f"{destination}.part"
+                try:
+                    async with aiofiles.open(temp_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(1024 * 1024):
+                            await f.write(chunk)
+                    os.replace(temp_path, destination)
+                except BaseException:
+                    try:
+                        os.remove(temp_path)
+                    except FileNotFoundError:
+                        pass
+                    raise
+            return True, None
         except Exception as e:
             logger.error(f"OneDrive download error: {e}")
             return False, str(e)
     
     async def delete_file(self, file_key: str) -> Tuple[bool, Optional[str]]:
-        if not self.access_token:
+        if not self.is_configured():
             return False, "OneDrive not configured"
         try:
-            import requests
-            
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            url = f"https://graph.microsoft.com/v1.0/me/drive/items/{file_key}"
-            response = requests.delete(url, headers=headers)
-            
-            if response.status_code in [200, 204]:
-                return True, None
-            return False, response.text
+            response = await self._request('DELETE', self._item_url(file_key))
+            async with response:
+                if response.status in [200, 204]:
+                    return True, None
+                return False, await response.text()
         except Exception as e:
             logger.error(f"OneDrive delete error: {e}")
             return False, str(e)
@@ -433,6 +930,10 @@ class StorageManager:
         }
         self.active_provider = 'local'  # Default
     
+    def configure_local(self, base_path: str) -> None:
+        """Point the local provider at the directory the API actually serves"""
+        self.providers['local'] = LocalStorageProvider(base_path)
+    
     def set_active_provider(self, provider_name: str) -> bool:
         if provider_name in self.providers:
             provider = self.providers[provider_name]
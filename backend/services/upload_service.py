@@ -0,0 +1,71 @@
+# Upload Service
+# Streams uploaded files to disk in fixed-size chunks with an incremental checksum
+
+import os
+import hashlib
+import logging
+from pathlib import Path
+from typing import Tuple
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))  # 1MB
+_READ_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload grows past its size limit while streaming"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"Upload exceeds {max_size} bytes")
+        self.max_size = max_size
+
+
+async def stream_upload_to_file(upload, dest_path: Path, max_size: int,
+                                chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """
+    Copy a FastAPI UploadFile to dest_path one chunk at a time.
+
+    At most one chunk is held in memory. Data is written to a `.part` file that
+    is renamed into place only after the whole upload fits within max_size, so a
+    rejected or interrupted upload never leaves a partial file behind.
+    Returns (size, sha256 hex digest).
+    """
+    # Starlette knows the spooled size up front; reject without reading anything
+    if getattr(upload, 'size', None) is not None and upload.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    temp_path = dest_path.with_name(dest_path.name + '.part')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, 'wb') as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(max_size)
+                digest.update(chunk)
+                await out.write(chunk)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return size, digest.hexdigest()
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 hex digest of a file on disk. Blocking - run it in a thread."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,88 @@
+# User Profile Cache
+# In-process TTL cache for authenticated user profiles (keyed by user_id)
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))  # seconds
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '5000'))
+
+
+class UserCache:
+    """TTL + LRU cache for user profiles used by get_current_user.
+
+    Profiles are stored without the password hash. Each worker process has its
+    own cache, so explicit invalidation only reaches the local process; the TTL
+    bounds how long other workers can serve a stale profile.
+    """
+
+    def __init__(self, ttl: int = USER_CACHE_TTL, max_size: int = USER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def is_enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        if not self.is_enabled():
+            self.misses += 1
+            return None
+
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        # Handlers receive a copy so they can't mutate the cached profile
+        return dict(user)
+
+    def set(self, user_id: str, user: Dict[str, Any]) -> None:
+        if not self.is_enabled():
+            return
+
+        profile = {k: v for k, v in user.items() if k not in ('_id', 'password')}
+        self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.is_enabled(),
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Singleton instance
+user_cache = UserCache()
@@ -6,6 +6,8 @@ import logging
 import tempfile
 from typing import Optional, Dict, Any
 
+from services.http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 # Emergent LLM Key (Universal Key for OpenAI/Gemini/Claude)
@@ -64,36 +66,30 @@ class VoiceToTextService:
         try:
             import aiohttp
             
-            # Save to temp file
-            with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as f:
-                f.write(audio_content)
-                temp_path = f.name
-            
-            try:
+            def form():
+                # A FormData body can only be sent once; built again for each retry
                 data = aiohttp.FormData()
-                data.add_field('file', open(temp_path, 'rb'), filename='audio.webm')
+                data.add_field('file', audio_content, filename='audio.webm')
                 data.add_field('model', 'whisper-1')
                 data.add_field('language', language)
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        'https://api.openai.com/v1/audio/transcriptions',
-                        headers={'Authorization': f'Bearer {self.api_key}'},
-                        data=data
-                    ) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            return {
-                                "success": True,
-                                "text": result.get("text", ""),
-                                "language": language
-                            }
-                        else:
-                            error = await response.text()
-                            return {"success": False, "error": error}
-            finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+                return data
+            
+            async with http_client.request(
+                "POST",
+                'https://api.openai.com/v1/audio/transcriptions',
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                data=form
+            ) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return {
+                        "success": True,
+                        "text": result.get("text", ""),
+                        "language": language
+                    }
+                else:
+                    error = await response.text()
+                    return {"success": False, "error": error}
                     
         except Exception as e:
             logger.error(f"Direct Whisper API error: {e}")
@@ -102,14 +98,13 @@ class VoiceToTextService:
     async def transcribe_from_url(self, audio_url: str, language: str = "tr") -> Dict[str, Any]:
         """Transcribe audio from URL"""
         try:
-            import aiohttp
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(audio_url) as response:
-                    if response.status == 200:
-                        audio_content = await response.read()
-                        return await self.transcribe_audio(audio_content, language)
+            async with http_client.request("GET", audio_url) as response:
+                if response.status == 200:
+                    audio_content = await response.read()
+                else:
                     return {"success": False, "error": f"Failed to download audio: {response.status}"}
+            # Connection goes back to the pool before the (slow) transcription
+            return await self.transcribe_audio(audio_content, language)
         except Exception as e:
             logger.error(f"Audio download error: {e}")
             return {"success": False, "error": str(e)}
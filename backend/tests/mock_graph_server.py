@@ -0,0 +1,176 @@
+"""
+Minimal in-memory Microsoft Graph / identity mock for OneDriveStorageProvider
+
+Implements just enough of the token endpoint, drive item content, upload
+sessions and deletes to exercise the provider offline. Point the provider at it
+with ONEDRIVE_AUTHORITY_URL and ONEDRIVE_GRAPH_URL, or use it from tests:
+
+    server = MockGraphServer()
+    await server.start()
+    provider = OneDriveStorageProvider(client_id="id", client_secret="secret", **server.provider_kwargs())
+
+Standalone (from backend/):
+    python tests/mock_graph_server.py --port 8765
+"""
+import re
+import uuid
+import asyncio
+import argparse
+
+from aiohttp import web
+
+ITEM_PATH = re.compile(r"^(?:root:(?P<path>.+?):|items/(?P<id>[^/]+))(?P<suffix>/.*)?$")
+
+
+class MockGraphServer:
+    def __init__(self, token_lifetime: int = 3600):
+        self.token_lifetime = token_lifetime
+        self.items = {}  # id -> {"path", "data"}
+        self.sessions = {}  # session id -> {"path", "data"}
+        self.valid_tokens = set()
+        self.token_requests = 0
+        self.fail_chunks = 0  # next N chunk PUTs answer 503 after storing nothing
+        self.chunk_requests = 0
+        self.truncate_downloads = 0  # next N downloads drop the connection halfway
+        self.base_url = None
+        self._runner = None
+
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.app.router.add_post("/{tenant}/oauth2/v2.0/token", self.token)
+        self.app.router.add_route("*", "/v1.0/me/drive/{rest:.*}", self.drive)
+        self.app.router.add_route("*", "/upload/{session}", self.upload_session)
+        self.app.router.add_get("/download/{item}", self.download)
+
+    # -- lifecycle --------------------------------------------------------
+
+    async def start(self, port: int = 0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def provider_kwargs(self):
+        return {"authority_url": self.base_url, "graph_url": f"{self.base_url}/v1.0", "drive_path": "/me/drive"}
+
+    def revoke_tokens(self):
+        """Simulate expiry: every issued token now gets a 401"""
+        self.valid_tokens.clear()
+
+    def find_by_path(self, path):
+        return next((item for item in self.items.values() if item["path"] == path), None)
+
+    # -- handlers ---------------------------------------------------------
+
+    async def token(self, request):
+        form = await request.post()
+        if form.get("grant_type") != "client_credentials" or not form.get("client_secret"):
+            return web.json_response({"error": "invalid_client", "error_description": "bad credentials"}, status=401)
+        self.token_requests += 1
+        token = f"token-{self.token_requests}"
+        self.valid_tokens.add(token)
+        return web.json_response({"access_token": token, "expires_in": self.token_lifetime, "token_type": "Bearer"})
+
+    def _item_json(self, item_id):
+        item = self.items[item_id]
+        return {"id": item_id, "name": item["path"].rsplit("/", 1)[-1], "size": len(item["data"]),
+                "webUrl": f"{self.base_url}/web{item['path']}"}
+
+    def _store(self, path, data):
+        existing = self.find_by_path(path)
+        item_id = existing["id"] if existing else uuid.uuid4().hex.upper()
+        self.items[item_id] = {"id": item_id, "path": path, "data": data}
+        return item_id
+
+    async def drive(self, request):
+        auth = request.headers.get("Authorization", "")
+        if auth.removeprefix("Bearer ") not in self.valid_tokens:
+            return web.json_response({"error": {"code": "InvalidAuthenticationToken"}}, status=401)
+
+        match = ITEM_PATH.match(request.match_info["rest"])
+        if not match:
+            return web.json_response({"error": {"code": "invalidRequest"}}, status=400)
+        path, item_id, suffix = match.group("path"), match.group("id"), match.group("suffix") or ""
+        if path and not item_id:
+            existing = self.find_by_path(path)
+            item_id = existing["id"] if existing else None
+
+        if request.method == "PUT" and suffix == "/content":
+            item_id = self._store(path, await request.read())
+            return web.json_response(self._item_json(item_id), status=201)
+        if request.method == "POST" and suffix == "/createUploadSession":
+            session_id = uuid.uuid4().hex
+            self.sessions[session_id] = {"path": path, "data": bytearray()}
+            return web.json_response({"uploadUrl": f"{self.base_url}/upload/{session_id}"})
+        if item_id not in self.items:
+            return web.json_response({"error": {"code": "itemNotFound"}}, status=404)
+        if request.method == "GET" and suffix == "/content":
+            # Like Graph, redirect to another origin so clients must drop the bearer token
+            raise web.HTTPFound(f"{self.base_url.replace('127.0.0.1', 'localhost')}/download/{item_id}")
+        if request.method == "DELETE" and not suffix:
+            del self.items[item_id]
+            return web.Response(status=204)
+        return web.json_response({"error": {"code": "invalidRequest"}}, status=400)
+
+    async def upload_session(self, request):
+        session = self.sessions.get(request.match_info["session"])
+        if session is None:
+            return web.json_response({"error": {"code": "itemNotFound"}}, status=404)
+        if "Authorization" in request.headers:
+            return web.json_response({"error": {"code": "unauthenticated"}}, status=401)
+
+        if request.method == "GET":
+            return web.json_response({"nextExpectedRanges": [f"{len(session['data'])}-"]})
+        if request.method == "DELETE":
+            del self.sessions[request.match_info["session"]]
+            return web.Response(status=204)
+
+        self.chunk_requests += 1
+        body = await request.read()
+        if self.fail_chunks:
+            self.fail_chunks -= 1
+            return web.json_response({"error": {"code": "serviceNotAvailable"}}, status=503)
+        start, end, total = map(int, re.match(r"bytes (\d+)-(\d+)/(\d+)", request.headers["Content-Range"]).groups())
+        if start != len(session["data"]) or end - start + 1 != len(body):
+            return web.json_response({"error": {"code": "invalidRange"}}, status=416)
+        session["data"].extend(body)
+        if len(session["data"]) < total:
+            return web.json_response({"nextExpectedRanges": [f"{len(session['data'])}-"]}, status=202)
+        item_id = self._store(session["path"], bytes(session["data"]))
+        del self.sessions[request.match_info["session"]]
+        return web.json_response(self._item_json(item_id), status=201)
+
+    async def download(self, request):
+        # Pre-authenticated URL: a forwarded bearer token means the client leaked it
+        if "Authorization" in request.headers:
+            return web.json_response({"error": {"code": "unauthenticated"}}, status=401)
+        item = self.items.get(request.match_info["item"])
+        if item is None:
+            return web.Response(status=404)
+        if self.truncate_downloads:
+            self.truncate_downloads -= 1
+            response = web.StreamResponse(headers={"Content-Length": str(len(item["data"]))})
+            await response.prepare(request)
+            await response.write(item["data"][:len(item["data"]) // 2])
+            request.transport.close()
+            return response
+        return web.Response(body=item["data"], content_type="application/octet-stream")
+
+
+async def _serve(port):
+    server = MockGraphServer()
+    await server.start(port)
+    print(f"ONEDRIVE_AUTHORITY_URL={server.base_url}")
+    print(f"ONEDRIVE_GRAPH_URL={server.base_url}/v1.0")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Microsoft Graph server for OneDrive tests")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(_serve(parser.parse_args().port))
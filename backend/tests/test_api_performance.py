@@ -0,0 +1,229 @@
+"""
+Renault Trucks Garanti Kayıt Sistemi - Performance Backlog API Tests
+Tests: Indexed record search, Keyset pagination, Resumable uploads
+"""
+import pytest
+import requests
+import os
+import uuid
+import hashlib
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://claim-visual-db.preview.emergentagent.com')
+
+# Test credentials
+ADMIN_CREDS = {"username": "admin", "password": "admin123"}
+
+
+class TestRecordSearch:
+    """Test /api/records search through the n-gram index"""
+
+    def test_search_matches_partial_plate_ignoring_case_and_spaces(self, admin_token, search_record):
+        """Lower-case partial plate with spaces should still find the record"""
+        plate = search_record["plate"]
+        term = f"{plate[2:5].lower()} {plate[5:8].lower()}"
+        response = requests.get(
+            f"{BASE_URL}/api/records",
+            params={"search": term, "limit": 100},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert any(r["id"] == search_record["id"] for r in data)
+        for record in data:
+            assert "search_grams" not in record
+            assert "search_text" not in record
+        print(f"✓ Search '{term}' found record {search_record['case_key']}")
+
+    def test_search_short_term(self, admin_token, search_record):
+        """Terms shorter than the n-gram size should still match"""
+        response = requests.get(
+            f"{BASE_URL}/api/records",
+            params={"search": search_record["plate"][-2:], "limit": 100},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert any(r["id"] == search_record["id"] for r in response.json())
+        print("✓ Short search term matched")
+
+    def test_search_no_match(self, admin_token):
+        """Unknown term should return an empty list"""
+        response = requests.get(
+            f"{BASE_URL}/api/records",
+            params={"search": "ZZQQXX999"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 200
+        assert response.json() == []
+        print("✓ Unknown search term returns empty list")
+
+
+class TestRecordsCursorPagination:
+    """Test /api/records keyset pagination via X-Next-Cursor"""
+
+    @pytest.mark.parametrize("sort_by,sort_order", [
+        ("created_at", "desc"),
+        ("plate", "asc"),
+        ("work_order", "desc"),
+    ])
+    def test_cursor_pages_do_not_overlap(self, admin_token, sort_by, sort_order):
+        """Walking pages with the cursor should never repeat a record"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        params = {"sort_by": sort_by, "sort_order": sort_order, "limit": 5}
+        seen = []
+        cursor = None
+        for _ in range(4):
+            if cursor:
+                params["cursor"] = cursor
+            response = requests.get(f"{BASE_URL}/api/records", params=params, headers=headers)
+            assert response.status_code == 200
+            page = response.json()
+            seen.extend(r["id"] for r in page)
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                assert len(page) < 5
+                break
+        assert len(seen) == len(set(seen)), "Cursor pagination returned duplicate records"
+        print(f"✓ Cursor pagination by {sort_by} {sort_order} - {len(seen)} unique records")
+
+    def test_cursor_matches_page_two(self, admin_token):
+        """First cursor page should equal page=2 when nothing is inserted in between"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        first = requests.get(f"{BASE_URL}/api/records", params={"limit": 3}, headers=headers)
+        assert first.status_code == 200
+        cursor = first.headers.get("X-Next-Cursor")
+        if not cursor:
+            pytest.skip("Not enough records for a second page")
+
+        by_cursor = requests.get(f"{BASE_URL}/api/records", params={"limit": 3, "cursor": cursor}, headers=headers)
+        by_page = requests.get(f"{BASE_URL}/api/records", params={"limit": 3, "page": 2}, headers=headers)
+        assert [r["id"] for r in by_cursor.json()] == [r["id"] for r in by_page.json()]
+        print("✓ Cursor page matches page=2")
+
+    def test_invalid_cursor_rejected(self, admin_token):
+        """Garbage cursor should return 400"""
+        response = requests.get(
+            f"{BASE_URL}/api/records",
+            params={"cursor": "not-a-cursor"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 400
+        print("✓ Invalid cursor rejected")
+
+
+class TestResumableUpload:
+    """Test init / chunk / complete resumable upload flow"""
+
+    def test_resumable_upload_with_retry(self, admin_token, search_record):
+        """Upload in two chunks, resend a stale chunk, then complete"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        content = os.urandom(300 * 1024)
+        first, second = content[:200 * 1024], content[200 * 1024:]
+
+        init = requests.post(
+            f"{BASE_URL}/api/records/{search_record['id']}/uploads",
+            data={
+                "filename": "clip.mp4",
+                "media_type": "video",
+                "total_size": len(content),
+                "sha256": hashlib.sha256(content).hexdigest()
+            },
+            headers=headers
+        )
+        assert init.status_code == 200
+        upload_id = init.json()["upload_id"]
+        assert init.json()["offset"] == 0
+
+        def send(offset, data):
+            return requests.put(
+                f"{BASE_URL}/api/uploads/{upload_id}/chunk",
+                data={"offset": offset, "checksum": hashlib.sha256(data).hexdigest()},
+                files={"chunk": ("chunk", data, "application/octet-stream")},
+                headers=headers
+            )
+
+        response = send(0, first)
+        assert response.status_code == 200
+        assert response.json()["offset"] == len(first)
+
+        # Client lost the response and resends the first chunk
+        retry = send(0, first)
+        assert retry.status_code == 409
+        assert retry.headers.get("Upload-Offset") == str(len(first))
+
+        status = requests.get(f"{BASE_URL}/api/uploads/{upload_id}", headers=headers)
+        assert status.json()["offset"] == len(first)
+
+        response = send(len(first), second)
+        assert response.status_code == 200
+        assert response.json()["offset"] == len(content)
+
+        complete = requests.post(f"{BASE_URL}/api/uploads/{upload_id}/complete", headers=headers)
+        assert complete.status_code == 200
+        file_item = complete.json()["file"]
+        assert file_item["size"] == len(content)
+        assert file_item["sha256"] == hashlib.sha256(content).hexdigest()
+        print(f"✓ Resumable upload completed: {file_item['filename']}")
+
+    def test_chunk_checksum_mismatch_rejected(self, admin_token, search_record):
+        """A corrupted chunk should be rejected without advancing the offset"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        init = requests.post(
+            f"{BASE_URL}/api/records/{search_record['id']}/uploads",
+            data={"filename": "clip.mp4", "media_type": "video", "total_size": 1024},
+            headers=headers
+        )
+        assert init.status_code == 200
+        upload_id = init.json()["upload_id"]
+
+        response = requests.put(
+            f"{BASE_URL}/api/uploads/{upload_id}/chunk",
+            data={"offset": 0, "checksum": "0" * 64},
+            files={"chunk": ("chunk", b"x" * 1024, "application/octet-stream")},
+            headers=headers
+        )
+        assert response.status_code == 400
+        assert response.headers.get("Upload-Offset") == "0"
+
+        requests.delete(f"{BASE_URL}/api/uploads/{upload_id}", headers=headers)
+        print("✓ Corrupted chunk rejected")
+
+    def test_init_rejects_oversized_video(self, admin_token, search_record):
+        """Declared size above MAX_VIDEO_SIZE should be rejected at init"""
+        response = requests.post(
+            f"{BASE_URL}/api/records/{search_record['id']}/uploads",
+            data={"filename": "clip.mp4", "media_type": "video", "total_size": 500 * 1024 * 1024},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == 400
+        print("✓ Oversized resumable upload rejected")
+
+
+# Fixtures
+@pytest.fixture
+def admin_token():
+    response = requests.post(f"{BASE_URL}/api/auth/login", json=ADMIN_CREDS)
+    if response.status_code != 200:
+        pytest.skip("Admin login failed - skipping authenticated tests")
+    return response.json()["token"]
+
+
+@pytest.fixture
+def search_record(admin_token):
+    plate = f"34{uuid.uuid4().hex[:6].upper()}"
+    response = requests.post(
+        f"{BASE_URL}/api/records",
+        json={"record_type": "roadassist", "plate": plate, "branch_code": "4"},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    if response.status_code != 200:
+        pytest.skip("Record creation failed")
+    record = response.json()
+    yield record
+    requests.delete(
+        f"{BASE_URL}/api/records/{record['id']}",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,114 @@
+"""
+Renault Trucks Garanti Kayıt Sistemi - Shared HTTP Client Tests
+Tests: Keep-alive reuse, Retry on 503 / Retry-After, One-shot FormData bodies, No retry on 4xx,
+       POSTs only retried on 429 unless idempotent
+Runs offline against a local aiohttp server
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+from aiohttp import web, FormData
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.http_client import HTTPClient  # noqa: E402
+
+
+def run_with_server(test, fail_times=0, status=503):
+    """Start a local server whose /flaky answers `status` fail_times times, run test(base_url, client, peers)"""
+    async def runner():
+        peers, failures = set(), {"left": fail_times}
+
+        async def ok(request):
+            peers.add(request.transport.get_extra_info('peername'))
+            return web.json_response({"ok": True})
+
+        async def flaky(request):
+            if request.content_type == 'multipart/form-data':
+                await request.post()
+            if failures["left"] > 0:
+                failures["left"] -= 1
+                return web.json_response({"error": "busy"}, status=status, headers={"Retry-After": "0"})
+            return web.json_response({"ok": True})
+
+        app = web.Application()
+        app.router.add_get('/ok', ok)
+        app.router.add_route('*', '/flaky', flaky)
+        runner_ = web.AppRunner(app)
+        await runner_.setup()
+        site = web.TCPSite(runner_, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        client = HTTPClient(retries=2, backoff=0.01)
+        try:
+            await test(f"http://127.0.0.1:{port}", client, peers)
+        finally:
+            await client.close()
+            await runner_.cleanup()
+    asyncio.run(runner())
+
+
+def test_sequential_requests_reuse_one_connection():
+    async def test(base, client, peers):
+        for _ in range(5):
+            async with client.request("GET", f"{base}/ok") as response:
+                assert (await response.json())["ok"]
+        assert len(peers) == 1
+    run_with_server(test)
+
+
+def test_retries_unavailable_then_succeeds():
+    async def test(base, client, peers):
+        async with client.request("GET", f"{base}/flaky") as response:
+            assert response.status == 200
+        assert client.get_stats()["retried"] == 2
+    run_with_server(test, fail_times=2)
+
+
+def test_gives_up_after_retries_and_returns_last_response():
+    async def test(base, client, peers):
+        async with client.request("GET", f"{base}/flaky") as response:
+            assert response.status == 503
+        assert client.get_stats()["requests"] == 3
+    run_with_server(test, fail_times=5)
+
+
+def test_form_body_factory_is_rebuilt_per_attempt():
+    async def test(base, client, peers):
+        built = []
+
+        def form():
+            data = FormData()
+            data.add_field('file', b'audio-bytes', filename='audio.webm')
+            built.append(data)
+            return data
+
+        async with client.request("POST", f"{base}/flaky", data=form) as response:
+            assert response.status == 200
+        assert len(built) == 2
+    run_with_server(test, fail_times=1, status=429)
+
+
+def test_post_is_not_retried_after_server_error():
+    async def test(base, client, peers):
+        async with client.request("POST", f"{base}/flaky", json={"a": 1}) as response:
+            assert response.status == 503
+        assert client.get_stats()["requests"] == 1
+    run_with_server(test, fail_times=1)
+
+
+def test_idempotent_post_opts_in_to_retries():
+    async def test(base, client, peers):
+        async with client.request("POST", f"{base}/flaky", json={"a": 1}, idempotent=True) as response:
+            assert response.status == 200
+        assert client.get_stats()["retried"] == 1
+    run_with_server(test, fail_times=1)
+
+
+def test_client_errors_are_not_retried():
+    async def test(base, client, peers):
+        async with client.request("GET", f"{base}/flaky") as response:
+            assert response.status == 400
+        assert client.get_stats()["retried"] == 0
+    run_with_server(test, fail_times=1, status=400)
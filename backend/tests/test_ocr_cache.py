@@ -0,0 +1,96 @@
+"""
+Renault Trucks Garanti Kayıt Sistemi - OCR Result Cache Tests
+Tests: Hits by image hash, LRU eviction, TTL expiry, In-flight coalescing, Failures not cached
+Runs offline (no Vision API, persistence disabled)
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ocr_cache import OCRResultCache  # noqa: E402
+
+
+class FakeVision:
+    """Counts calls; returns a plate per image after an optional delay"""
+
+    def __init__(self, delay=0.0, success=True):
+        self.calls = 0
+        self.delay = delay
+        self.success = success
+
+    async def detect_license_plate(self, image_content):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if not self.success:
+            return {"success": False, "error": "quota exceeded"}
+        return {"success": True, "plate": image_content.decode(), "raw_text": ""}
+
+
+def test_repeated_image_is_served_from_cache():
+    async def run():
+        cache, vision = OCRResultCache(ttl=60, max_size=10, persist=False), FakeVision()
+        first = await cache.get_or_compute("plate", b"34ABC123", vision.detect_license_plate)
+        second = await cache.get_or_compute("plate", b"34ABC123", vision.detect_license_plate)
+        assert vision.calls == 1
+        assert second["plate"] == first["plate"] and second["cached"] is True
+        assert "cached" not in first
+        # Same bytes, different operation: separate entry
+        await cache.get_or_compute("text", b"34ABC123", vision.detect_license_plate)
+        assert vision.calls == 2
+        stats = cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2 and stats["hit_rate"] == round(1 / 3, 4)
+    asyncio.run(run())
+
+
+def test_lru_eviction_and_ttl():
+    async def run():
+        cache, vision = OCRResultCache(ttl=60, max_size=2, persist=False), FakeVision()
+        for image in (b"a", b"b", b"a", b"c"):  # "b" is least recently used when "c" arrives
+            await cache.get_or_compute("plate", image, vision.detect_license_plate)
+        assert vision.calls == 3
+        await cache.get_or_compute("plate", b"b", vision.detect_license_plate)
+        assert vision.calls == 4
+
+        expiring = OCRResultCache(ttl=0.05, max_size=10, persist=False)
+        await expiring.get_or_compute("plate", b"a", vision.detect_license_plate)
+        await asyncio.sleep(0.1)
+        await expiring.get_or_compute("plate", b"a", vision.detect_license_plate)
+        assert vision.calls == 6
+    asyncio.run(run())
+
+
+def test_concurrent_identical_requests_share_one_call():
+    async def run():
+        cache, vision = OCRResultCache(ttl=60, max_size=10, persist=False), FakeVision(delay=0.05)
+        results = await asyncio.gather(*[
+            cache.get_or_compute("plate", b"34XYZ99", vision.detect_license_plate) for _ in range(5)
+        ])
+        assert vision.calls == 1
+        assert {r["plate"] for r in results} == {"34XYZ99"}
+        assert cache.get_stats()["coalesced"] == 4
+    asyncio.run(run())
+
+
+def test_cancelled_first_caller_hands_over_to_waiter():
+    async def run():
+        cache, vision = OCRResultCache(ttl=60, max_size=10, persist=False), FakeVision(delay=0.05)
+        first = asyncio.create_task(cache.get_or_compute("plate", b"x", vision.detect_license_plate))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get_or_compute("plate", b"x", vision.detect_license_plate))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert (await second)["plate"] == "x"
+        assert vision.calls == 2
+    asyncio.run(run())
+
+
+def test_failures_are_not_cached():
+    async def run():
+        cache, vision = OCRResultCache(ttl=60, max_size=10, persist=False), FakeVision(success=False)
+        for _ in range(2):
+            result = await cache.get_or_compute("plate", b"a", vision.detect_license_plate)
+            assert result["success"] is False
+        assert vision.calls == 2 and cache.get_stats()["size"] == 0
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+"""
+Renault Trucks Garanti Kayıt Sistemi - OCR Image Preprocessing Tests
+Tests: Downscale to long edge, EXIF orientation applied, Small/undecodable images passed through
+"""
+import io
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ocr_service import prepare_image  # noqa: E402
+
+
+def jpeg(size, orientation=None):
+    out = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.effect_noise(size, 40).convert('RGB').save(out, 'JPEG', quality=95, exif=exif)
+    return out.getvalue()
+
+
+def test_large_photo_is_downscaled_and_rotated_upright():
+    original = jpeg((4000, 3000), orientation=6)
+    prepared = prepare_image(original, long_edge=1600)
+    with Image.open(io.BytesIO(prepared)) as img:
+        assert img.size == (1200, 1600)
+        assert img.getexif().get(0x0112, 1) == 1
+    assert len(prepared) < len(original) / 4
+
+
+def test_small_upright_photo_is_sent_unchanged():
+    original = jpeg((800, 600))
+    assert prepare_image(original, long_edge=1600) is original
+
+
+def test_small_rotated_photo_is_still_turned_upright():
+    with Image.open(io.BytesIO(prepare_image(jpeg((800, 600), orientation=8), long_edge=1600))) as img:
+        assert img.size == (600, 800)
+
+
+def test_disabled_or_undecodable_input_is_passed_through():
+    original = jpeg((4000, 3000))
+    assert prepare_image(original, long_edge=0) is original
+    assert prepare_image(b"not an image", long_edge=1600) == b"not an image"
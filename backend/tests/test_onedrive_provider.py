@@ -0,0 +1,144 @@
+"""
+Renault Trucks Garanti Kayıt Sistemi - OneDrive Storage Provider Tests
+Tests: Token caching/refresh, Simple upload, Chunked upload sessions, Streaming download, Delete
+Runs offline against tests/mock_graph_server.py
+"""
+import pytest
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.storage_service import OneDriveStorageProvider  # noqa: E402
+from mock_graph_server import MockGraphServer  # noqa: E402
+
+CHUNK_SIZE = 320 * 1024
+
+
+def run_with_provider(test, **server_kwargs):
+    """Start a mock Graph server, run test(server, provider), tear both down"""
+    async def runner():
+        server = MockGraphServer(**server_kwargs)
+        await server.start()
+        provider = OneDriveStorageProvider(
+            client_id="client", client_secret="secret", tenant_id="tenant",
+            folder_path="/RTKayit", chunk_size=CHUNK_SIZE, **server.provider_kwargs()
+        )
+        try:
+            await test(server, provider)
+        finally:
+            await provider.close()
+            await server.stop()
+    asyncio.run(runner())
+
+
+class TestOneDriveToken:
+    """Token is fetched lazily, cached, and refreshed on expiry or 401"""
+
+    def test_concurrent_requests_share_one_token(self, small_file):
+        async def test(server, provider):
+            results = await asyncio.gather(*(
+                provider.upload_file(small_file, f"2026/tok_{n}.jpg") for n in range(5)
+            ))
+            assert all(ok for ok, _, _ in results)
+            assert server.token_requests == 1
+        run_with_provider(test)
+
+    def test_token_refreshed_before_expiry(self, small_file):
+        async def test(server, provider):
+            assert (await provider.upload_file(small_file, "2026/a.jpg"))[0]
+            assert (await provider.upload_file(small_file, "2026/b.jpg"))[0]
+            # Lifetime is inside the refresh margin, so every call refreshes
+            assert server.token_requests == 2
+        run_with_provider(test, token_lifetime=60)
+
+    def test_revoked_token_retried_once(self, small_file):
+        async def test(server, provider):
+            assert (await provider.upload_file(small_file, "2026/a.jpg"))[0]
+            server.revoke_tokens()
+            ok, _, error = await provider.upload_file(small_file, "2026/b.jpg")
+            assert ok, error
+            assert server.token_requests == 2
+        run_with_provider(test)
+
+
+class TestOneDriveTransfers:
+    """Uploads, downloads and deletes against the mock drive"""
+
+    def test_small_file_uses_single_put(self, small_file):
+        async def test(server, provider):
+            ok, url, error = await provider.upload_file(small_file, "2026/small.jpg")
+            assert ok, error
+            assert url.endswith("/RTKayit/2026/small.jpg")
+            assert server.chunk_requests == 0
+            assert server.find_by_path("/RTKayit/2026/small.jpg")["data"] == Path(small_file).read_bytes()
+        run_with_provider(test)
+
+    def test_large_file_uses_upload_session(self, large_file):
+        async def test(server, provider):
+            ok, _, error = await provider.upload_file(large_file, "2026/large.mp4")
+            assert ok, error
+            size = os.path.getsize(large_file)
+            assert server.chunk_requests == -(-size // CHUNK_SIZE)
+            assert server.find_by_path("/RTKayit/2026/large.mp4")["data"] == Path(large_file).read_bytes()
+            assert not server.sessions
+        run_with_provider(test)
+
+    def test_upload_session_resumes_after_failed_chunk(self, large_file):
+        async def test(server, provider):
+            server.fail_chunks = 1
+            ok, _, error = await provider.upload_file(large_file, "2026/resumed.mp4")
+            assert ok, error
+            assert server.find_by_path("/RTKayit/2026/resumed.mp4")["data"] == Path(large_file).read_bytes()
+        run_with_provider(test)
+
+    def test_download_follows_redirect_without_bearer(self, large_file, tmp_path):
+        async def test(server, provider):
+            await provider.upload_file(large_file, "2026/dl.mp4")
+            item_id = server.find_by_path("/RTKayit/2026/dl.mp4")["id"]
+            for key in (item_id, "2026/dl.mp4"):
+                target = tmp_path / f"{key.replace('/', '_')}.out"
+                ok, error = await provider.download_file(key, str(target))
+                assert ok, error
+                assert target.read_bytes() == Path(large_file).read_bytes()
+        run_with_provider(test)
+
+    def test_interrupted_download_leaves_no_file(self, large_file, tmp_path):
+        async def test(server, provider):
+            await provider.upload_file(large_file, "2026/cut.mp4")
+            server.truncate_downloads = 1
+            target = tmp_path / "cut.out"
+            ok, _ = await provider.download_file("2026/cut.mp4", str(target))
+            assert not ok
+            assert list(tmp_path.glob("cut.out*")) == []
+            ok, error = await provider.download_file("2026/cut.mp4", str(target))
+            assert ok, error
+            assert target.read_bytes() == Path(large_file).read_bytes()
+        run_with_provider(test)
+
+    def test_delete_by_path(self, small_file):
+        async def test(server, provider):
+            await provider.upload_file(small_file, "2026/gone.jpg")
+            ok, error = await provider.delete_file("2026/gone.jpg")
+            assert ok, error
+            assert server.find_by_path("/RTKayit/2026/gone.jpg") is None
+            ok, _ = await provider.delete_file("2026/gone.jpg")
+            assert not ok
+        run_with_provider(test)
+
+
+@pytest.fixture
+def small_file(tmp_path):
+    path = tmp_path / "small.jpg"
+    path.write_bytes(os.urandom(64 * 1024))
+    return str(path)
+
+
+@pytest.fixture
+def large_file(tmp_path):
+    # Just over the 4 MB single-PUT limit, not a multiple of the chunk size
+    path = tmp_path / "large.mp4"
+    path.write_bytes(os.urandom(4 * 1024 * 1024 + 12345))
+    return str(path)
@@ -0,0 +1,87 @@
+"""
+Renault Trucks Garanti Kayıt Sistemi - Vision REST Micro-batching Tests
+Tests: Concurrent requests share one images:annotate call, Per-image errors, Batch size cap, Request errors
+Runs offline against a local images:annotate stub
+"""
+import asyncio
+import base64
+import sys
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ocr_service import VisionAPIRest  # noqa: E402
+from services.http_client import http_client  # noqa: E402
+
+
+def run_with_vision(test, reject=False):
+    """Stub answering each image with its own bytes as text ("bad" images get an error)"""
+    async def runner():
+        calls = []
+
+        async def annotate(request):
+            if reject:
+                return web.json_response({"error": {"message": "API key not valid"}}, status=400)
+            requests = (await request.json())["requests"]
+            calls.append(len(requests))
+            responses = []
+            for item in requests:
+                text = base64.b64decode(item["image"]["content"]).decode()
+                if text == "bad":
+                    responses.append({"error": {"message": "Bad image data"}})
+                else:
+                    responses.append({"textAnnotations": [{"description": text}, {"description": text}]})
+            return web.json_response({"responses": responses})
+
+        app = web.Application()
+        app.router.add_post('/v1/images:annotate', annotate)
+        runner_ = web.AppRunner(app)
+        await runner_.setup()
+        site = web.TCPSite(runner_, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        vision = VisionAPIRest(api_key="key", base_url=f"http://127.0.0.1:{port}/v1/images:annotate")
+        try:
+            await test(vision, calls)
+        finally:
+            await http_client.close()
+            await runner_.cleanup()
+    asyncio.run(runner())
+
+
+def test_concurrent_requests_are_one_call():
+    async def test(vision, calls):
+        results = await asyncio.gather(*[vision.detect_text(f"34 ABC {i}".encode()) for i in range(10)])
+        assert calls == [10]
+        assert [r["full_text"] for r in results] == [f"34 ABC {i}" for i in range(10)]
+        plate = await vision.detect_license_plate(b"34 ABC 123")
+        assert plate["plate"] == "34ABC123"
+    run_with_vision(test)
+
+
+def test_batches_are_capped_at_max_images():
+    async def test(vision, calls):
+        vision.batcher.max_images = 16
+        results = await asyncio.gather(*[vision.detect_text(b"photo %d" % i) for i in range(30)])
+        assert sorted(calls) == [14, 16]
+        assert all(r["success"] for r in results)
+        assert vision.batcher.get_stats()["avg_batch_size"] == 15
+    run_with_vision(test)
+
+
+def test_per_image_error_only_fails_that_image():
+    async def test(vision, calls):
+        good, bad = await asyncio.gather(vision.detect_text(b"34 XY 99"), vision.detect_text(b"bad"))
+        assert calls == [2]
+        assert good["success"] and good["full_text"] == "34 XY 99"
+        assert bad == {"success": False, "error": "Bad image data"}
+    run_with_vision(test)
+
+
+def test_rejected_request_fails_every_caller():
+    async def test(vision, calls):
+        results = await asyncio.gather(*[vision.detect_text(b"x%d" % i) for i in range(3)])
+        assert [r["error"] for r in results] == ["API key not valid"] * 3
+    run_with_vision(test, reject=True)
@@ -147,7 +147,8 @@ const translations = {
       "misc.pdf": "PDF",
       "misc.files": "Dosyalar",
       "misc.records": "Kayıt",
-      "misc.staff": "Personel"
+      "misc.staff": "Personel",
+      "misc.similarPhotos": "benzer fotoğraf"
     }
   },
   en: {
@@ -297,7 +298,8 @@ const translations = {
       "misc.pdf": "PDF",
       "misc.files": "Files",
       "misc.records": "Records",
-      "misc.staff": "Staff"
+      "misc.staff": "Staff",
+      "misc.similarPhotos": "similar photos"
     }
   }
 };
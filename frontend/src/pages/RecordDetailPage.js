@@ -37,6 +37,7 @@ const RecordDetailPage = () => {
   const [uploadProgress, setUploadProgress] = useState(0);
   const [noteText, setNoteText] = useState('');
   const [showDeleteConfirm, setShowDeleteConfirm] = useState(null);
+  const [expandedGroups, setExpandedGroups] = useState({});
   
   const fileInputRef = useRef(null);
   const chatEndRef = useRef(null);
@@ -180,6 +181,24 @@ const RecordDetailPage = () => {
     });
   };
 
+  // Photos marked near_duplicate_of another photo in this record stay hidden until their group is expanded;
+  // only a primary that is not itself a duplicate collapses a group, so nothing is hidden without a toggle
+  const files = record?.files_json || [];
+  const primaryIds = new Set(files.filter(f => !f.near_duplicate_of).map(f => f.id));
+  const similarCounts = {};
+  files.forEach(f => {
+    if (f.near_duplicate_of && primaryIds.has(f.near_duplicate_of)) {
+      similarCounts[f.near_duplicate_of] = (similarCounts[f.near_duplicate_of] || 0) + 1;
+    }
+  });
+  const visibleFiles = files.filter(f =>
+    !f.near_duplicate_of || !primaryIds.has(f.near_duplicate_of) || expandedGroups[f.near_duplicate_of]
+  );
+
+  const toggleGroup = (primaryId) => {
+    setExpandedGroups(prev => ({ ...prev, [primaryId]: !prev[primaryId] }));
+  };
+
   if (loading) {
     return (
       <div className="min-h-screen bg-[#09090b] flex items-center justify-center">
@@ -240,12 +259,12 @@ const RecordDetailPage = () => {
 
         {/* Files */}
         <div className="space-y-3">
-          {(record.files_json || []).map((file, index) => (
+          {visibleFiles.map((file, index) => (
             <div key={file.id} className="chat-bubble-user p-1 relative group">
               {/* Media preview */}
               {file.media_type === 'photo' && (
                 <img
-                  src={`${BACKEND_URL}${file.path}`}
+                  src={`${BACKEND_URL}${file.variants?.preview || file.path}`}
                   alt={file.original_name}
                   className="w-full max-w-xs rounded-xl"
                   loading="lazy"
@@ -253,7 +272,9 @@ const RecordDetailPage = () => {
               )}
               {file.media_type === 'video' && (
                 <video
-                  src={`${BACKEND_URL}${file.path}`}
+                  src={`${BACKEND_URL}${file.variants?.proxy || file.path}`}
+                  poster={file.variants?.preview ? `${BACKEND_URL}${file.variants.preview}` : undefined}
+                  preload="metadata"
                   className="w-full max-w-xs rounded-xl"
                   controls
                 />
@@ -265,7 +286,16 @@ const RecordDetailPage = () => {
                   rel="noopener noreferrer"
                   className="flex items-center gap-3 p-3 bg-black/20 rounded-xl"
                 >
-                  <FileText className="w-8 h-8" />
+                  {file.thumb ? (
+                    <img
+                      src={`${BACKEND_URL}${file.thumb}`}
+                      alt={file.original_name}
+                      className="w-12 h-16 object-cover rounded"
+                      loading="lazy"
+                    />
+                  ) : (
+                    <FileText className="w-8 h-8" />
+                  )}
                   <div className="flex-1 min-w-0">
                     <p className="font-medium truncate">{file.original_name}</p>
                     <p className="text-xs opacity-70">
@@ -284,6 +314,16 @@ const RecordDetailPage = () => {
                 <Trash2 className="w-4 h-4 text-white" />
               </button>
               
+              {/* Near-duplicate shots collapsed under the first one */}
+              {similarCounts[file.id] > 0 && (
+                <button
+                  onClick={() => toggleGroup(file.id)}
+                  className="text-xs opacity-80 px-2 mt-1 underline"
+                >
+                  {expandedGroups[file.id] ? '−' : '+'}{similarCounts[file.id]} {t('misc.similarPhotos')}
+                </button>
+              )}
+              
               {/* Time */}
               <p className="text-[10px] opacity-60 text-right mt-1 px-2">
                 {formatDate(file.uploaded_at)}